@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import decimal
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from aiohttp import web
+from sqlalchemy import text
+from config import (
+    get_db_engine, db_health, RESULTS_TOP_K, HISTOGRAM_BINS,
+    API_MAX_CONCURRENCY, API_LLM_CONCURRENCY, API_QUEUE_TIMEOUT, API_MAX_TOP_K,
+)
+from cohorts import cohort_cache_key
+from query import get_ranked_talent, get_match_scores, get_ranking_cache_stats, normalize_benchmark
+from prompt import generate_job_profile_gemini, generate_candidate_analysis, response_cache
+from scoring import TGV_GROUPS, rerank
+from tracing import span
+
+# --- HEADLESS MATCHING API ---
+# Endpoint HTTP (asyncio / aiohttp) di atas fungsi yang sama dengan dashboard,
+# untuk ATS dan batch job:
+#   POST /v1/rankings           {"benchmark_ids": [...], "cohort", "cohort_params", "top_k", "weights"}
+#   POST /v1/job-profile        {"role", "level", "purpose", "responsibilities", "competencies"}
+#   POST /v1/candidate-insight  {"candidate": {...satu baris hasil ranking...}}
+#   GET  /healthz               liveness
+#   GET  /readyz                database ping + status pool + statistik cache
+#
+# Ranking dikembalikan sebagai JSON, atau Arrow IPC stream kalau header
+# Accept = application/vnd.apache.arrow.stream.
+#
+# Request identik yang datang bersamaan (benchmark set dinormalisasi sama)
+# digabung jadi satu query in-flight (single-flight); total pekerjaan blocking
+# dibatasi semaphore, dan request yang antre lebih dari API_QUEUE_TIMEOUT
+# ditolak dengan 503.
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+
+class SingleFlight:
+    """Gabungkan pemanggilan bersamaan dengan key sama menjadi satu eksekusi"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: satu client yang disconnect tidak membatalkan hasil untuk yang lain
+            return await asyncio.shield(future)
+
+        self.executed += 1
+        future = asyncio.ensure_future(factory())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {"inflight": len(self._inflight), "executed": self.executed, "coalesced": self.coalesced}
+
+
+class Limiter:
+    """Semaphore + executor thread untuk fungsi blocking (DB / Gemini)"""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"api-{name}")
+        self.rejected = 0
+        self.in_use = 0
+
+    async def run(self, fn, *args):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=API_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise web.HTTPServiceUnavailable(reason=f"{self.name} queue is full")
+        self.in_use += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_use -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {"limit": self.limit, "in_use": self.in_use, "rejected": self.rejected}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _plain(value):
+    """Nilai hasil query (Decimal / numpy float32) -> tipe JSON; NaN -> null"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def _plain_column(series):
+    """Kolom -> list nilai JSON; float32 lewat desimal terpendek (87.12, bukan 87.12000274658203)"""
+    if series.dtype == np.float32:
+        return [None if np.isnan(v) else float(str(v)) for v in series.to_numpy()]
+    return [_plain(v) for v in series.to_numpy(dtype=object)]
+
+
+def _ranking_payload(df, is_fallback):
+    payload = {"is_fallback": is_fallback, "total_candidates": int(df.attrs.get("total_candidates", len(df)))}
+    if "histogram" in df.attrs:
+        counts, edges = df.attrs["histogram"]
+        payload["histogram"] = {"counts": [int(c) for c in counts], "edges": [float(e) for e in edges]}
+    columns = {col: _plain_column(df[col]) for col in df.columns}
+    payload["results"] = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    return payload
+
+
+def _arrow_response(df, is_fallback):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise web.HTTPNotAcceptable(reason="pyarrow is not installed on this server")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {b"is_fallback": json.dumps(is_fallback).encode(),
+                b"total_candidates": str(df.attrs.get("total_candidates", len(df))).encode()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return web.Response(body=sink.getvalue().to_pybytes(), content_type=ARROW_MIME)
+
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise web.HTTPBadRequest(reason="body must be JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(reason="body must be a JSON object")
+    return body
+
+
+def _parse_top_k(value):
+    """top_k request: bilangan bulat 1..API_MAX_TOP_K (kosong = RESULTS_TOP_K)"""
+    if value is None:
+        return RESULTS_TOP_K
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError("top_k must be an integer")
+    top_k = int(value)
+    if top_k != float(value) or not 1 <= top_k <= API_MAX_TOP_K:
+        raise ValueError(f"top_k must be an integer between 1 and {API_MAX_TOP_K}")
+    return top_k
+
+
+def _parse_weights(weights):
+    """weights request: {TGV group: angka >= 0}; group lain / nilai non-numerik ditolak"""
+    if weights is None:
+        return None
+    if not isinstance(weights, dict):
+        raise ValueError("weights must be an object of TGV group -> weight")
+    unknown = sorted(set(weights) - set(TGV_GROUPS))
+    if unknown:
+        raise ValueError(f"unknown TGV groups in weights: {', '.join(unknown)} (expected {', '.join(TGV_GROUPS)})")
+    parsed = {}
+    for group, value in weights.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+            raise ValueError(f"weights.{group} must be a non-negative number")
+        parsed[group] = float(value)
+    return parsed
+
+
+async def rankings(request):
+    body = await _json_body(request)
+    ids = body.get("benchmark_ids") or []
+    if isinstance(ids, str):
+        ids = ids.split(",")
+    try:
+        top_k = _parse_top_k(body.get("top_k"))
+        weights = _parse_weights(body.get("weights"))
+        ids = [str(x) for x in ids]
+        cohort, cohort_params = normalize_benchmark(ids, body.get("cohort"), body.get("cohort_params"))
+        key = ("rankings", cohort_cache_key(cohort, cohort_params), top_k,
+               tuple(sorted((weights or {}).items())))
+    except (TypeError, ValueError, OverflowError) as e:
+        raise web.HTTPBadRequest(reason=str(e))
+
+    app = request.app
+    if weights:
+        async def compute():
+            scores, is_fallback = await app["db"].run(get_match_scores, [], None, cohort, cohort_params)
+            if scores.empty:
+                return scores, is_fallback
+            return rerank(scores, weights, top_k=top_k, bins=HISTOGRAM_BINS), is_fallback
+    else:
+        async def compute():
+            return await app["db"].run(lambda: get_ranked_talent([], top_k=top_k, cohort=cohort, cohort_params=cohort_params))
+
+    with span("api.rankings", cohort=cohort):
+        df, is_fallback = await app["singleflight"].do(key, compute)
+
+    if ARROW_MIME in request.headers.get("Accept", ""):
+        return _arrow_response(df, is_fallback)
+    return web.json_response(_ranking_payload(df, is_fallback))
+
+
+async def job_profile(request):
+    body = await _json_body(request)
+    args = (body.get("role", ""), body.get("level", ""), body.get("purpose", ""),
+            body.get("responsibilities") or [], body.get("competencies") or [])
+    key = ("job-profile", json.dumps(args))
+    profile = await request.app["singleflight"].do(key, lambda: request.app["llm"].run(generate_job_profile_gemini, *args))
+    return web.json_response({"profile": profile})
+
+
+async def candidate_insight(request):
+    body = await _json_body(request)
+    candidate = body.get("candidate")
+    required = ["fullname", "final_match_rate", "strengths_list", "score_cognitive", "score_motivation", "score_leadership"]
+    if not isinstance(candidate, dict) or any(k not in candidate for k in required):
+        raise web.HTTPBadRequest(reason=f"candidate needs: {', '.join(required)}")
+    key = ("insight", json.dumps(candidate, sort_keys=True, default=str))
+    insight = await request.app["singleflight"].do(key, lambda: request.app["llm"].run(generate_candidate_analysis, candidate))
+    return web.json_response({"insight": insight})
+
+
+async def healthz(request):
+    return web.json_response({"status": "ok"})
+
+
+def _ping_database():
+    start = time.perf_counter()
+    with get_db_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _pool_status():
+    pool = get_db_engine().pool
+    status = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
+
+
+async def readyz(request):
+    app = request.app
+    ready = True
+    database = {"background_check": db_health()}
+    try:
+        database["ping_ms"] = await asyncio.wait_for(
+            asyncio.get_running_loop().run_in_executor(None, _ping_database), timeout=5)
+    except Exception as e:
+        ready = False
+        database["error"] = str(e)
+    try:
+        database["pool"] = _pool_status()
+    except RuntimeError:
+        # Database belum dikonfigurasi (get_db_engine): tetap 503 "unavailable", bukan 500
+        pass
+
+    payload = {
+        "status": "ready" if ready else "unavailable",
+        "database": database,
+        "limits": {"db": app["db"].stats(), "llm": app["llm"].stats()},
+        "singleflight": app["singleflight"].stats(),
+        "ranking_cache": get_ranking_cache_stats(),
+        "llm_cache": response_cache.stats(),
+    }
+    return web.json_response(payload, status=200 if ready else 503)
+
+
+async def _on_cleanup(app):
+    app["db"].shutdown()
+    app["llm"].shutdown()
+
+
+def create_app():
+    app = web.Application()
+    app["singleflight"] = SingleFlight()
+    app["db"] = Limiter("db", API_MAX_CONCURRENCY)
+    app["llm"] = Limiter("llm", API_LLM_CONCURRENCY)
+    app.router.add_post("/v1/rankings", rankings)
+    app.router.add_post("/v1/job-profile", job_profile)
+    app.router.add_post("/v1/candidate-insight", candidate_insight)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless talent matching API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
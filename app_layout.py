@@ -2,21 +2,27 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import numpy as np
+from config import HISTOGRAM_BINS
+from scoring import TGV_GROUPS, TGV_WEIGHTS, match_rate_histogram, normalize_weights
+from cohorts import BENCHMARK_COHORTS, CUSTOM_COHORT
 
-def manage_list_input(label, key_prefix):
-    """Helper function untuk membuat input list Add/Remove"""
-    if f'{key_prefix}_list' not in st.session_state:
-        st.session_state[f'{key_prefix}_list'] = []
+def _add_list_item(key_prefix):
+    new_item = st.session_state[f"{key_prefix}_input"].strip()
+    if new_item:
+        st.session_state[f'{key_prefix}_list'].append(new_item)
+    st.session_state[f"{key_prefix}_input"] = ""
+
+def _remove_list_item(key_prefix, index):
+    st.session_state[f'{key_prefix}_list'].pop(index)
 
-    # Input Field
+@st.fragment
+def _list_editor(label, key_prefix):
+    # Fragment: Add / hapus hanya me-rerun bagian ini, bukan seluruh script,
+    # jadi hasil analisis di halaman utama tidak dirender ulang.
+    # Callback on_click jalan sebelum rerun, jadi tidak perlu st.rerun()
     col1, col2 = st.columns([4, 1])
-    new_item = col1.text_input(f"Add {label}", key=f"{key_prefix}_input")
-    
-    if col2.button("Add", key=f"{key_prefix}_add"):
-        if new_item:
-            st.session_state[f'{key_prefix}_list'].append(new_item)
-            st.rerun() 
+    col1.text_input(f"Add {label}", key=f"{key_prefix}_input")
+    col2.button("Add", key=f"{key_prefix}_add", on_click=_add_list_item, args=(key_prefix,))
 
     # Display List with Delete Button
     if st.session_state[f'{key_prefix}_list']:
@@ -24,11 +30,15 @@ def manage_list_input(label, key_prefix):
         for i, item in enumerate(st.session_state[f'{key_prefix}_list']):
             c1, c2 = st.columns([4, 1])
             c1.markdown(f"- {item}")
-            if c2.button("🗑️", key=f"{key_prefix}_del_{i}"):
-                st.session_state[f'{key_prefix}_list'].pop(i)
-                st.rerun()
+            c2.button("🗑️", key=f"{key_prefix}_del_{i}", on_click=_remove_list_item, args=(key_prefix, i))
 
-    return st.session_state[f'{key_prefix}_list']
+def manage_list_input(label, key_prefix):
+    """Helper function untuk membuat input list Add/Remove"""
+    if f'{key_prefix}_list' not in st.session_state:
+        st.session_state[f'{key_prefix}_list'] = []
+    _list_editor(label, key_prefix)
+    # Dibaca dari session state: nilai return fragment tidak tersedia saat fragment rerun
+    return list(st.session_state[f'{key_prefix}_list'])
 
 def render_sidebar():
     with st.sidebar:
@@ -53,10 +63,36 @@ def render_sidebar():
         st.info("Input High Performer IDs (Max 3). Leave blank for Auto-Benchmark.")
         
         bench_input = st.text_input("Employee IDs (Optional)", placeholder="Contoh: EMP100005, EMP100008")
+
+        # Cohort untuk Auto-Benchmark (dievaluasi di database, lihat cohorts.py)
+        cohort_labels = {k: v["label"] for k, v in BENCHMARK_COHORTS.items() if k != CUSTOM_COHORT}
+        cohort = st.selectbox("Auto-Benchmark Cohort", list(cohort_labels), format_func=cohort_labels.get)
+        cohort_params = {}
+        if cohort == "rating5_year":
+            cohort_params["cohort_year"] = int(st.number_input("Performance Year", min_value=2000, max_value=2100, value=2024, step=1))
+        elif cohort == "consistent_high_performers":
+            cohort_params["cohort_window"] = int(st.number_input("Last N Years", min_value=1, max_value=10, value=3, step=1))
+            cohort_params["cohort_min_years"] = int(st.number_input("Min. Years with Rating 5", min_value=1, max_value=10, value=2, step=1))
+        elif cohort == "high_performers_grade":
+            cohort_params["cohort_grade"] = st.text_input("Grade ID").strip() or None
         
         btn_run = st.button("🚀 Analyze & Match", type="primary")
         
-    return role_name, job_level, role_purpose, resps, comps, bench_input, btn_run
+    return role_name, job_level, role_purpose, resps, comps, bench_input, cohort, cohort_params, btn_run
+
+def render_weight_sliders():
+    """Slider bobot TGV di sidebar; mengembalikan bobot yang sudah dinormalisasi (jumlah = 1)"""
+    with st.sidebar:
+        st.divider()
+        st.header("4. TGV Weights")
+        st.caption("Re-ranks the last analysis in-process. The first change loads the per-variable scores once.")
+        raw = {
+            group: st.slider(group.title(), 0, 100, int(round(TGV_WEIGHTS[group] * 100)), 5, key=f"weight_{group}")
+            for group in TGV_GROUPS
+        }
+    weights = normalize_weights(raw)
+    st.sidebar.caption(" · ".join(f"{g.title()} {w:.0%}" for g, w in weights.items()))
+    return weights
 
 def render_visualizations(df, best_candidate):
     
@@ -70,16 +106,20 @@ def render_visualizations(df, best_candidate):
         bench_pauli = best_candidate['bench_pauli'] if pd.notna(best_candidate['bench_pauli']) else 0
         bench_papi = best_candidate['bench_papi_n'] if pd.notna(best_candidate['bench_papi_n']) else 0
         
-        col_b1.metric("Target IQ (Min)", f"{bench_iq}")
-        col_b2.metric("Target Endurance (Pauli)", f"{bench_pauli}")
-        col_b3.metric("Target Hard Work (PAPI N)", f"{bench_papi}/9.0")
+        col_b1.metric("Target IQ (Min)", f"{bench_iq:.0f}")
+        col_b2.metric("Target Endurance (Pauli)", f"{bench_pauli:.0f}")
+        col_b3.metric("Target Hard Work (PAPI N)", f"{bench_papi:.1f}/9.0")
         
         st.caption("*These values are dynamically calculated from your selected Benchmark IDs.*")
 
 
     with st.expander("📈 Match Rate Distribution", expanded=False):
         # 1. Hitung Histogram Manual agar bisa dikasih warna beda-beda
-        counts, bin_edges = np.histogram(df['final_match_rate'], bins=15)
+        # (mode top-K: counts sudah dihitung di database untuk seluruh kandidat)
+        if "histogram" in df.attrs:
+            counts, bin_edges = df.attrs["histogram"]
+        else:
+            counts, bin_edges = match_rate_histogram(df['final_match_rate'], HISTOGRAM_BINS)
         bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
         
         # 2. Buat DataFrame Sementara
@@ -179,6 +219,12 @@ def render_visualizations(df, best_candidate):
         )
         
         st.plotly_chart(fig_bar, use_container_width=True)
+# Skor disimpan float32 (scoring.compact_frame); tampilkan dengan presisi ROUND di SQL
+SCORE_FORMATS = {
+    **{f"score_{g}": "%.1f" for g in TGV_GROUPS},
+    "bench_iq": "%.0f", "bench_pauli": "%.0f", "bench_papi_n": "%.1f",
+}
+
 def render_results_table(df):
     """Menampilkan Semua Tabel Tanpa Pagination"""
     
@@ -210,7 +256,12 @@ def render_results_table(df):
     
     info_cols = ["fullname", "final_match_rate", "role", "division", "department", "job_level"]
     available_cols = [c for c in info_cols if c in top_df.columns]
-    st.dataframe(top_df[available_cols], hide_index=True, use_container_width=True)
+    st.dataframe(
+        top_df[available_cols],
+        column_config={"final_match_rate": st.column_config.NumberColumn("Match %", format="%.2f")},
+        hide_index=True,
+        use_container_width=True
+    )
 
     st.divider()
 
@@ -220,7 +271,21 @@ def render_results_table(df):
     
     st.dataframe(
         top_df,
-        column_config={"final_match_rate": st.column_config.ProgressColumn("Match %", format="%.2f", min_value=0, max_value=100)},
+        column_config={
+            **{col: st.column_config.NumberColumn(format=fmt) for col, fmt in SCORE_FORMATS.items()},
+            "final_match_rate": st.column_config.ProgressColumn("Match %", format="%.2f", min_value=0, max_value=100),
+        },
         hide_index=True,
         use_container_width=True
     )
+
+def render_shortlist_insight_slots(shortlist_df):
+    """Placeholder AI insight per kandidat shortlist; diisi begitu masing-masing selesai"""
+    st.markdown("### AI Insights: Shortlist")
+    slots = {}
+    for i, (_, row) in enumerate(shortlist_df.iterrows()):
+        with st.container(border=True):
+            st.markdown(f"**#{i + 2} {row['fullname']}** · {row['final_match_rate']:.2f}%")
+            slots[i] = st.empty()
+            slots[i].caption("⏳ Generating insight...")
+    return slots
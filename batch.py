@@ -0,0 +1,154 @@
+import argparse
+import json
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from config import get_db_engine
+from scoring import (
+    BENCHMARK_FEATURE_QUERY, PAPI_SCALES, ExactTGV,
+    build_result_frame, compute_baseline, compute_tgv, final_match_rate,
+    iter_candidate_features, match_score_arrays, prepare_features,
+)
+
+# --- BATCH SCORING (SUCCESSION PLANNING) ---
+# Input: JSONL, satu vacancy per baris:
+#   {"vacancy_id": "VAC-001", "benchmark_ids": ["EMP100005", "EMP100008"]}
+# benchmark_ids kosong = Auto-Benchmark (semua High Performer), sama seperti UI.
+#
+# Feature data di-scan sekali per chunk; setiap chunk di-score terhadap semua
+# baseline sekaligus (matrix kandidat x vacancy), lalu top-N per vacancy
+# di-merge secara streaming. Memory ~ chunk_size x jumlah vacancy, bukan
+# jumlah employee.
+
+BASELINE_KEYS = ["base_iq", "base_pauli"] + [f"base_papi_{s}" for s in PAPI_SCALES]
+
+
+def read_vacancies(path):
+    """Baca file JSONL vacancy"""
+    vacancies = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if "vacancy_id" not in item:
+                raise ValueError(f"{path}:{line_no}: missing vacancy_id")
+            ids = item.get("benchmark_ids") or []
+            if isinstance(ids, str):
+                ids = ids.split(",")
+            vacancies.append({
+                "vacancy_id": str(item["vacancy_id"]),
+                "benchmark_ids": sorted({x.strip() for x in ids if x.strip()}),
+            })
+    return vacancies
+
+
+def load_benchmark_features(conn, vacancies):
+    """Feature row semua benchmark yang dibutuhkan batch (satu query)"""
+    ids = sorted({i for v in vacancies for i in v["benchmark_ids"]})
+    include_hp = any(not v["benchmark_ids"] for v in vacancies)
+    df = pd.read_sql(
+        text(BENCHMARK_FEATURE_QUERY), conn,
+        params={"benchmark_ids": ids, "include_high_performers": include_hp},
+    )
+    return prepare_features(df)
+
+
+def compute_baselines(bench_features, vacancies):
+    """Baseline semua vacancy sekaligus.
+
+    Mengembalikan (baselines, per_vacancy, exclude): dict array (V,) untuk
+    scoring vektor, list baseline scalar per vacancy, dan set ID benchmark
+    yang dikecualikan dari kandidat tiap vacancy.
+    """
+    hp_ids = bench_features.loc[bench_features["is_high_performer"], "employee_id"].tolist()
+    per_vacancy, exclude = [], []
+    for v in vacancies:
+        ids = v["benchmark_ids"] or hp_ids
+        per_vacancy.append(compute_baseline(bench_features, ids))
+        exclude.append(set(ids))
+
+    baselines = {k: np.array([b[k] for b in per_vacancy], dtype=float) for k in BASELINE_KEYS}
+    baselines["base_mask"] = np.array([b["base_mask"] for b in per_vacancy], dtype=np.int64)
+    return baselines, per_vacancy, exclude
+
+
+def score_vacancies(conn, vacancies, top_n=20, chunk_size=20000):
+    """Score semua kandidat x vacancy; yield (vacancy, DataFrame top-N, total_candidates)"""
+    bench_features = load_benchmark_features(conn, vacancies)
+    baselines, per_vacancy, exclude = compute_baselines(bench_features, vacancies)
+    n_vac = len(vacancies)
+    # Auto-Benchmark tanpa High Performer sama sekali -> ranking kosong (seperti UI)
+    active = np.array([bool(ex) for ex in exclude])
+
+    best_rate = [np.empty(0) for _ in range(n_vac)]
+    best_pos = [np.empty(0, dtype=np.int64) for _ in range(n_vac)]
+    totals = np.zeros(n_vac, dtype=np.int64)
+    kept = pd.DataFrame()
+    offset = 0
+
+    # Stream diurutkan employee_id, jadi posisi global = tie-break yang sama dengan SQL
+    for chunk in iter_candidate_features(conn, chunksize=chunk_size):
+        n = len(chunk)
+        positions = offset + np.arange(n, dtype=np.int64)
+        tgv = compute_tgv(match_score_arrays(chunk, baselines))  # (n, V, 5)
+
+        for v in range(n_vac):
+            if not active[v]:
+                continue
+            # Baris dekat batas pembulatan dihitung ulang eksak terhadap baseline vacancy ini
+            rates = final_match_rate(tgv[:, v], exact=ExactTGV(chunk, per_vacancy[v]))
+            valid = ~chunk["employee_id"].isin(exclude[v]).to_numpy()
+            totals[v] += int(valid.sum())
+            cand_rate = np.concatenate([best_rate[v], rates[valid]])
+            cand_pos = np.concatenate([best_pos[v], positions[valid]])
+            order = np.lexsort((cand_pos, -cand_rate))[:top_n]
+            best_rate[v], best_pos[v] = cand_rate[order], cand_pos[order]
+
+        # Simpan hanya feature row yang masih masuk top-N salah satu vacancy
+        chunk = chunk.set_index(positions)
+        survivors = np.unique(np.concatenate(best_pos)) if n_vac else np.empty(0, dtype=np.int64)
+        kept = pd.concat([kept, chunk]).loc[lambda df: df.index.isin(survivors)]
+        offset += n
+
+    for v, vacancy in enumerate(vacancies):
+        cand = kept.loc[best_pos[v]] if len(best_pos[v]) else kept.iloc[0:0]
+        if cand.empty:
+            yield vacancy, pd.DataFrame(), int(totals[v])
+            continue
+        tgv = compute_tgv(match_score_arrays(cand, per_vacancy[v]))
+        yield vacancy, build_result_frame(cand, tgv, per_vacancy[v]), int(totals[v])
+
+
+def run_batch(input_path, output_path, top_n=20, chunk_size=20000, engine=None):
+    """Jalankan batch scoring dan tulis satu baris JSON per vacancy ke output_path"""
+    vacancies = read_vacancies(input_path)
+    if not vacancies:
+        return 0
+
+    engine = engine or get_db_engine()
+    with engine.connect() as conn, open(output_path, "w", encoding="utf-8") as out:
+        for vacancy, df, total in score_vacancies(conn, vacancies, top_n=top_n, chunk_size=chunk_size):
+            record = {
+                "vacancy_id": vacancy["vacancy_id"],
+                "benchmark_ids": vacancy["benchmark_ids"],
+                "is_fallback": not vacancy["benchmark_ids"],
+                "total_candidates": total,
+                "results": json.loads(df.to_json(orient="records")) if not df.empty else [],
+            }
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+    return len(vacancies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score many vacancies / benchmark sets in one pass")
+    parser.add_argument("input", help="JSONL file, one {vacancy_id, benchmark_ids} per line")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="output JSONL path")
+    parser.add_argument("--top-n", type=int, default=20, help="candidates kept per vacancy")
+    parser.add_argument("--chunk-size", type=int, default=20000, help="candidate rows scored per pass")
+    args = parser.parse_args()
+
+    count = run_batch(args.input, args.output, top_n=args.top_n, chunk_size=args.chunk_size)
+    print(f"✅ {count} vacancies scored -> {args.output}")
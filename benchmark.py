@@ -0,0 +1,357 @@
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+import numpy as np
+from sqlalchemy import create_engine, text
+from scoring import (
+    compact_frame, compare_rankings, compute_baseline, compute_tgv, final_match_rate,
+    load_candidate_features, match_rate_histogram, match_score_arrays, rank_candidates,
+)
+from neighbors import ProfileIndex
+from sharding import rank_sharded
+from synthetic import features_from_tables, generate_dataset, load_dataset
+
+# --- SCALING BENCHMARK SUITE ---
+# Mengukur latency, peak memory (tracemalloc) dan rows transferred untuk setiap
+# scoring path pada dataset sintetis 1k .. 1M employee.
+#
+#   python benchmark.py --sizes 1000 10000 100000
+#       offline: jalur in-memory saja, tanpa database
+#   python benchmark.py --sizes 1000 10000 --database-url postgresql://localhost/talent_bench
+#       + jalur SQL terhadap Postgres lokal (stand-in Supabase) dan parity check
+#
+# Database target di-DROP & dibuat ulang; jangan arahkan ke database produksi.
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+BATCH_VACANCIES = 20
+DEFAULT_SHARDS = 4
+
+
+def measure(fn, repeat=3):
+    """Jalankan fn `repeat` kali untuk latency, plus satu kali di bawah tracemalloc untuk peak memory"""
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {
+        "latency_ms_median": round(statistics.median(latencies) * 1000, 2),
+        "latency_ms_min": round(min(latencies) * 1000, 2),
+        "peak_mem_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def _rows_info(df):
+    return {"rows_transferred": int(len(df)), "bytes_transferred": int(df.memory_usage(deep=True).sum())}
+
+
+def compare_features(expected, actual):
+    """Kolom feature matrix yang berbeda antara dua sumber (urut per employee_id)"""
+    expected = expected.sort_values("employee_id").reset_index(drop=True)
+    actual = actual.sort_values("employee_id").reset_index(drop=True)
+    if not expected["employee_id"].equals(actual["employee_id"]):
+        return ["features: employee_id sets differ"]
+    problems = []
+    for col in actual.columns.intersection(expected.columns):
+        a, b = expected[col], actual[col]
+        if col == "top_3_strengths":
+            same = a.map(list).equals(b.map(list))
+        elif a.dtype.kind in "fiub" and b.dtype.kind in "fiub":
+            same = np.array_equal(a.to_numpy(dtype=float), b.to_numpy(dtype=float), equal_nan=True)
+        else:
+            same = a.astype(str).equals(b.astype(str))
+        if not same:
+            problems.append(f"features: {col} differs")
+    return problems
+
+
+def run_memory_paths(features, repeat):
+    """Jalur in-process: ranking tunggal, top-K, dan batch matrix"""
+    hp_ids = features.loc[features["is_high_performer"], "employee_id"].tolist()
+    results = {}
+
+    ranking, stats = measure(lambda: rank_candidates(features, hp_ids), repeat)
+    results["memory_rank_full"] = {**stats, **_rows_info(ranking)}
+
+    # Frame yang disimpan per session (category / float32 untuk skor tampilan)
+    compact, stats = measure(lambda: compact_frame(ranking), repeat)
+    results["memory_rank_full_compact"] = {**stats, **_rows_info(compact)}
+
+    top, stats = measure(lambda: rank_candidates(features, hp_ids).head(10), repeat)
+    results["memory_rank_top10"] = {**stats, **_rows_info(top)}
+
+    rng = np.random.default_rng(0)
+    benchmark_sets = [list(rng.choice(hp_ids, size=min(3, len(hp_ids)), replace=False)) for _ in range(BATCH_VACANCIES)] if hp_ids else []
+
+    def batch_matrix():
+        baselines = [compute_baseline(features, ids) for ids in benchmark_sets]
+        stacked = {k: np.array([b[k] for b in baselines]) for k in baselines[0]}
+        return final_match_rate(compute_tgv(match_score_arrays(features, stacked)))
+
+    if benchmark_sets:
+        _, stats = measure(batch_matrix, repeat)
+        results[f"memory_batch_{BATCH_VACANCIES}_vacancies"] = {**stats, "rows_transferred": 0, "bytes_transferred": 0}
+    return ranking, results
+
+
+def run_index_paths(features, ranking, repeat, k=10):
+    """KD-tree top-K (neighbors.py) vs ranking exhaustive: latency, fraksi titik yang di-score, parity"""
+    hp_ids = features.loc[features["is_high_performer"], "employee_id"].tolist()
+    index, stats = measure(lambda: ProfileIndex(features), 1)
+    results = {"index_build": {**stats, "rows_transferred": 0, "bytes_transferred": 0}}
+    if not hp_ids:
+        return results, []
+
+    top, stats = measure(lambda: index.top_k(hp_ids, k), repeat)
+    results[f"index_top{k}"] = {**stats, **_rows_info(top), **index.last_query}
+    return results, compare_rankings(top, ranking.head(k))
+
+
+def _histogram_problems(name, a, b):
+    counts_a, edges_a = a
+    counts_b, edges_b = b
+    if not (np.array_equal(counts_a, counts_b) and np.allclose(edges_a, edges_b)):
+        return [f"{name}: histogram differs"]
+    return []
+
+
+def run_sharded_paths(features, ranking, repeat, shards, k=10):
+    """Sharded top-K (sharding.py): 1 proses vs `shards` proses, parity vs ranking satu proses"""
+    hp_ids = features.loc[features["is_high_performer"], "employee_id"].tolist()
+    if not hp_ids:
+        return {}, []
+    results = {}
+    _, stats = measure(lambda: rank_sharded(features, hp_ids, shards, top_k=k, workers=1), repeat)
+    results[f"memory_sharded{shards}_top{k}_serial"] = {**stats, "rows_transferred": k, "bytes_transferred": 0}
+    # Pool spawn hidup selama proses: start worker tidak ikut diukur
+    rank_sharded(features, hp_ids, shards, top_k=k, workers=shards)
+    top, stats = measure(lambda: rank_sharded(features, hp_ids, shards, top_k=k, workers=shards), repeat)
+    serial_ms = results[f"memory_sharded{shards}_top{k}_serial"]["latency_ms_median"]
+    results[f"memory_sharded{shards}_top{k}"] = {
+        **stats, **_rows_info(top),
+        "speedup_vs_serial": round(serial_ms / stats["latency_ms_median"], 2) if stats["latency_ms_median"] else None,
+    }
+
+    problems = compare_rankings(top, ranking.head(k))
+    full_histogram = match_rate_histogram(ranking["final_match_rate"], top.attrs["histogram"][0].size)
+    problems += _histogram_problems("memory sharded", top.attrs["histogram"], full_histogram)
+    if top.attrs["total_candidates"] != len(ranking):
+        problems.append("memory sharded: total_candidates differs")
+    return results, problems
+
+
+def run_sql_sharded_paths(engine, repeat, shards, k=10):
+    """Sharded SQL top-K (koneksi paralel) vs TOP_K_QUERY satu koneksi: latency & parity"""
+    from cohorts import DEFAULT_COHORT
+    from query import _get_ranked_talent_sql, _get_ranked_talent_sql_sharded
+
+    def single():
+        with engine.connect() as conn:
+            return _get_ranked_talent_sql(conn, DEFAULT_COHORT, None, k)[0]
+
+    top, _ = measure(single, 1)
+    sharded, stats = measure(lambda: _get_ranked_talent_sql_sharded(engine, DEFAULT_COHORT, None, k, shards)[0], repeat)
+    results = {f"sql_sharded{shards}_top{k}": {**stats, **_rows_info(sharded)}}
+    if top.empty:
+        return results, [] if sharded.empty else ["sql sharded: expected no candidates"]
+    problems = compare_rankings(sharded, top)
+    problems += _histogram_problems("sql sharded", sharded.attrs["histogram"], top.attrs["histogram"])
+    if sharded.attrs["total_candidates"] != top.attrs["total_candidates"]:
+        problems.append("sql sharded: total_candidates differs")
+    return results, problems
+
+
+def run_sql_paths(engine, repeat):
+    """Jalur Postgres: MATCHING_QUERY penuh, top-K + histogram, baseline dari agregat, dan load feature matrix"""
+    # Import lokal: query.py butuh config aplikasi hanya untuk engine default
+    import pandas as pd
+    from cohorts import BENCHMARK_COHORTS, DEFAULT_COHORT
+    from query import HISTOGRAM_BINS, build_matching_query, fetch_frame
+
+    cohort_sql = BENCHMARK_COHORTS[DEFAULT_COHORT]["sql"]
+    results = {}
+
+    def sql_full():
+        with engine.connect() as conn:
+            return pd.read_sql(text(build_matching_query(cohort_sql)), conn)
+
+    def sql_full_columnar():
+        with engine.connect() as conn:
+            return fetch_frame(conn.execute(text(build_matching_query(cohort_sql))))
+
+    def sql_topk():
+        with engine.connect() as conn:
+            return pd.read_sql(text(build_matching_query(cohort_sql, top_k=True)), conn,
+                               params={"top_k": 10, "bins": HISTOGRAM_BINS})
+
+    # Baseline cohort default dari cohort_baseline_agg (di-maintain trigger saat load)
+    def sql_full_aggregated():
+        with engine.connect() as conn:
+            return pd.read_sql(text(build_matching_query(cohort_sql, aggregated_cohort=DEFAULT_COHORT)), conn)
+
+    def sql_topk_aggregated():
+        with engine.connect() as conn:
+            return pd.read_sql(text(build_matching_query(cohort_sql, top_k=True, aggregated_cohort=DEFAULT_COHORT)), conn,
+                               params={"top_k": 10, "bins": HISTOGRAM_BINS})
+
+    def feature_load():
+        with engine.connect() as conn:
+            return load_candidate_features(conn)
+
+    full, stats = measure(sql_full, repeat)
+    results["sql_matching_full"] = {**stats, **_rows_info(full)}
+    columnar, stats = measure(sql_full_columnar, repeat)
+    results["sql_matching_full_columnar"] = {**stats, **_rows_info(columnar)}
+    top, stats = measure(sql_topk, repeat)
+    results["sql_matching_top10"] = {**stats, **_rows_info(top)}
+    aggregated, stats = measure(sql_full_aggregated, repeat)
+    results["sql_matching_full_aggregated"] = {**stats, **_rows_info(aggregated)}
+    top, stats = measure(sql_topk_aggregated, repeat)
+    results["sql_matching_top10_aggregated"] = {**stats, **_rows_info(top)}
+    features, stats = measure(feature_load, repeat)
+    results["sql_feature_matrix_load"] = {**stats, **_rows_info(features)}
+    return full, aggregated, features, results
+
+
+def run_snapshot_paths(engine, db_features, repeat):
+    """Snapshot lokal (snapshot.py): sync penuh, sync tanpa perubahan, load feature matrix dari mmap"""
+    import tempfile
+    from snapshot import load_snapshot_features, sync_snapshot
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        _, stats = measure(lambda: sync_snapshot(engine, directory, full=True), 1)
+        results["snapshot_sync_full"] = {**stats, "rows_transferred": 0, "bytes_transferred": 0}
+        # Tidak ada yang berubah: hanya digest per employee yang ditransfer
+        _, stats = measure(lambda: sync_snapshot(engine, directory), repeat)
+        results["snapshot_sync_unchanged"] = {**stats, "rows_transferred": 0, "bytes_transferred": 0}
+        features, stats = measure(lambda: load_snapshot_features(directory), repeat)
+        results["snapshot_feature_load"] = {**stats, **_rows_info(features)}
+
+    hp_ids = db_features.loc[db_features["is_high_performer"], "employee_id"].tolist()
+    problems = compare_rankings(rank_candidates(features, hp_ids), rank_candidates(db_features, hp_ids))
+    return results, problems
+
+
+def run_render(ranking, repeat):
+    """Waktu membangun dashboard (Plotly + tabel) untuk top-10; Streamlit jalan dalam bare mode"""
+    from app_layout import render_results_table, render_visualizations
+
+    top = ranking.head(10)
+
+    def render():
+        render_visualizations(ranking, top.iloc[0])
+        render_results_table(top)
+
+    _, stats = measure(render, repeat)
+    return {"dashboard_render": {**stats, "rows_transferred": 0, "bytes_transferred": 0}}
+
+
+def run_size(n_employees, seed, repeat, database_url=None, render=False, shards=DEFAULT_SHARDS):
+    report = {"employees": n_employees}
+
+    start = time.perf_counter()
+    tables = generate_dataset(n_employees, seed=seed, include_competencies=False)
+    report["generate_s"] = round(time.perf_counter() - start, 2)
+
+    engine = None
+    if database_url:
+        from feature_store import ensure_feature_store, refresh_employee_features
+        from migrations import apply_migrations
+        engine = create_engine(database_url)
+        start = time.perf_counter()
+        load_dataset(engine, tables)
+        ensure_feature_store(engine)
+        refresh_employee_features(engine, full=True)
+        apply_migrations(engine)
+        report["load_s"] = round(time.perf_counter() - start, 2)
+        # Feature matrix dari FEATURE_QUERY (definisi yang dipakai app), bukan
+        # salinan pandas-nya; salinan itu hanya dicek supaya tidak diam-diam beda
+        with engine.connect() as conn:
+            features = load_candidate_features(conn)
+        report["feature_parity_problems"] = compare_features(features_from_tables(tables), features)
+    else:
+        features = features_from_tables(tables)
+
+    ranking, paths = run_memory_paths(features, repeat)
+    index_paths, report["index_parity_problems"] = run_index_paths(features, ranking, repeat)
+    paths.update(index_paths)
+    sharded_paths, report["shard_parity_problems"] = run_sharded_paths(features, ranking, repeat, shards)
+    paths.update(sharded_paths)
+    if engine is not None:
+        from migrations import run_plan_checks
+        # Plan hot path di dataset ukuran ini: Seq Scan terlarang / cost di atas batas
+        report["plans"], report["plan_problems"], _ = run_plan_checks(engine)
+
+        sql_ranking, aggregated_ranking, db_features, sql_paths = run_sql_paths(engine, repeat)
+        paths.update(sql_paths)
+        # Baseline incremental (trigger) harus sama dengan baseline hasil scan
+        report["aggregate_parity_problems"] = compare_rankings(sql_ranking, aggregated_ranking)
+        # Parity: SQL path vs in-memory path di atas feature matrix dari database yang sama
+        report["parity_problems"] = compare_rankings(sql_ranking, ranking)
+        snapshot_paths, report["snapshot_parity_problems"] = run_snapshot_paths(engine, db_features, repeat)
+        paths.update(snapshot_paths)
+        sql_sharded_paths, sql_shard_problems = run_sql_sharded_paths(engine, repeat, shards)
+        paths.update(sql_sharded_paths)
+        report["shard_parity_problems"] += sql_shard_problems
+        engine.dispose()
+    if render:
+        paths.update(run_render(ranking, repeat))
+
+    report["paths"] = paths
+    return report
+
+
+def print_report(report):
+    print(f"\n=== {report['employees']:,} employees (generate {report['generate_s']}s"
+          + (f", load {report['load_s']}s" if "load_s" in report else "") + ") ===")
+    print(f"{'path':<32}{'median ms':>12}{'min ms':>12}{'peak MB':>10}{'rows':>10}{'bytes':>14}")
+    for name, stats in report["paths"].items():
+        print(f"{name:<32}{stats['latency_ms_median']:>12}{stats['latency_ms_min']:>12}"
+              f"{stats['peak_mem_mb']:>10}{stats['rows_transferred']:>10}{stats['bytes_transferred']:>14}")
+    for name, stats in report["paths"].items():
+        if "points_scored" in stats:
+            print(f"{name}: scored {stats['points_scored']:,} of {stats['points_total']:,} candidates "
+                  f"({stats['pair_candidates']:,} via theme pairs, {stats['nodes_visited']} of {stats['nodes_total']} nodes)")
+    print("parity index vs exhaustive:", "OK" if not report["index_parity_problems"] else report["index_parity_problems"])
+    for name, stats in report["paths"].items():
+        if "speedup_vs_serial" in stats:
+            print(f"{name}: {stats['speedup_vs_serial']}x vs the same shards in one process")
+    print("parity sharded vs single-shot:", "OK" if not report["shard_parity_problems"] else report["shard_parity_problems"])
+    if "parity_problems" in report:
+        print("parity synthetic vs database features:",
+              "OK" if not report["feature_parity_problems"] else report["feature_parity_problems"])
+        print("parity SQL vs memory:", "OK" if not report["parity_problems"] else report["parity_problems"])
+        print("parity aggregated vs scanned baseline:",
+              "OK" if not report["aggregate_parity_problems"] else report["aggregate_parity_problems"])
+        print("parity snapshot vs database features:",
+              "OK" if not report["snapshot_parity_problems"] else report["snapshot_parity_problems"])
+        print("query plans:", "OK" if not report["plan_problems"] else report["plan_problems"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the matching pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--database-url", help="local Postgres stand-in (will be DROPPED and reloaded)")
+    parser.add_argument("--render", action="store_true", help="also time dashboard rendering")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS, help="shards / worker processes for the sharded paths")
+    parser.add_argument("--output", help="append JSON lines with the raw results")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        result = run_size(size, args.seed, args.repeat, database_url=args.database_url, render=args.render,
+                          shards=args.shards)
+        print_report(result)
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result) + "\n")
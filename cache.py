@@ -0,0 +1,168 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --- BOUNDED LRU + TTL CACHE ---
+# Shared by the ranking cache (query.py) and the Gemini response cache
+# (prompt.py). Thread-safe because Streamlit serves every session from
+# threads of the same process.
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU cache dengan batas jumlah entry, TTL per entry, dan counter monitoring.
+
+    Setiap entry bisa membawa `version`; `get()` dengan version berbeda
+    dianggap miss dan entry lama dibuang (invalidation), jadi data basi
+    tidak pernah dikembalikan.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, version=None, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, entry_version, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            if entry_version != version:
+                del self._data[key]
+                self.invalidations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, version=None):
+        with self._lock:
+            self._data[key] = (value, version, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Snapshot counter untuk monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class PersistentResponseCache:
+    """Cache string 2 tier: LRU in-memory di depan SQLite yang bertahan lintas restart.
+
+    Tier disk dibatasi total ukuran (`max_bytes`); entry yang paling lama tidak
+    diakses dibuang duluan.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, memory_size=256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory = TTLCache(maxsize=memory_size)
+        self._lock = threading.Lock()
+        self._conn = None
+        self.disk_hits = 0
+        self.disk_evictions = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+            self.disk_hits += 1
+
+        self.memory.set(key, row[0])
+        return row[0]
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = db.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC LIMIT 1"
+                ).fetchone()
+                if oldest is None:
+                    break
+                db.execute("DELETE FROM responses WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                self.disk_evictions += 1
+            db.commit()
+
+    def stats(self):
+        with self._lock:
+            db = self._db()
+            count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            disk = {
+                "disk_entries": count,
+                "disk_bytes": total,
+                "disk_max_bytes": self.max_bytes,
+                "disk_hits": self.disk_hits,
+                "disk_evictions": self.disk_evictions,
+            }
+        return {**self.memory.stats(), **disk}
@@ -0,0 +1,93 @@
+# --- BENCHMARK COHORTS ---
+# Definisi cohort dievaluasi sepenuhnya di Postgres (semi-join / anti-join di
+# MATCHING_QUERY), jadi daftar employee_id high performer tidak pernah
+# di-materialize di Python lalu dikirim balik sebagai array parameter.
+#
+# Setiap cohort = SELECT yang menghasilkan kolom `employee_id`. Parameternya
+# diberi prefix `cohort_` supaya tidak bentrok dengan parameter query utama.
+# `aggregated`: baseline cohort ini di-maintain incremental oleh trigger
+# (feature_store.py), jadi MATCHING_QUERY cukup membaca satu baris agregat.
+
+DEFAULT_COHORT = "high_performers"
+CUSTOM_COHORT = "custom"
+
+BENCHMARK_COHORTS = {
+    "high_performers": {
+        "label": "All High Performers (rating 5, any year)",
+        "sql": """
+            SELECT DISTINCT employee_id
+            FROM performance_yearly
+            WHERE rating = 5
+        """,
+        "defaults": {},
+        "aggregated": True,
+    },
+    "rating5_year": {
+        "label": "Rating 5 in a specific year",
+        "sql": """
+            SELECT DISTINCT employee_id
+            FROM performance_yearly
+            WHERE rating = 5 AND year = :cohort_year
+        """,
+        "defaults": {"cohort_year": None},
+    },
+    "consistent_high_performers": {
+        "label": "Rating 5 in at least N of the last M years",
+        "sql": """
+            SELECT employee_id
+            FROM performance_yearly
+            WHERE rating = 5
+              AND year > (SELECT MAX(year) FROM performance_yearly) - :cohort_window
+            GROUP BY employee_id
+            HAVING COUNT(DISTINCT year) >= :cohort_min_years
+        """,
+        "defaults": {"cohort_window": 3, "cohort_min_years": 2},
+    },
+    "high_performers_grade": {
+        "label": "High Performers in a specific grade",
+        "sql": """
+            SELECT DISTINCT py.employee_id
+            FROM performance_yearly py
+            JOIN employees e ON e.employee_id = py.employee_id
+            WHERE py.rating = 5 AND e.grade_id::text = :cohort_grade
+        """,
+        "defaults": {"cohort_grade": None},
+    },
+    # Benchmark pilihan user (maks 3 ID), dibawa sebagai satu array kecil
+    CUSTOM_COHORT: {
+        "label": "Custom Benchmark IDs",
+        "sql": """
+            SELECT DISTINCT UNNEST(CAST(:benchmark_ids AS text[])) as employee_id
+        """,
+        "defaults": {"benchmark_ids": []},
+    },
+}
+
+
+def resolve_cohort(cohort=None, cohort_params=None):
+    """Validasi nama cohort + lengkapi parameter dengan default-nya.
+
+    Mengembalikan (sql, params). Raise ValueError kalau cohort tidak dikenal
+    atau ada parameter wajib yang kosong.
+    """
+    cohort = cohort or DEFAULT_COHORT
+    if cohort not in BENCHMARK_COHORTS:
+        raise ValueError(f"Unknown benchmark cohort: {cohort}")
+
+    definition = BENCHMARK_COHORTS[cohort]
+    params = {**definition["defaults"], **(cohort_params or {})}
+    missing = [name for name, value in params.items() if value is None]
+    if missing:
+        raise ValueError(f"Cohort '{cohort}' needs: {', '.join(missing)}")
+    return definition["sql"], params
+
+
+def cohort_cache_key(cohort=None, cohort_params=None):
+    """Representasi hashable cohort untuk ranking cache"""
+    _, params = resolve_cohort(cohort, cohort_params)
+    normalized = []
+    for name, value in sorted(params.items()):
+        if isinstance(value, (list, tuple)):
+            value = tuple(sorted(set(value)))
+        normalized.append((name, value))
+    return (cohort or DEFAULT_COHORT, tuple(normalized))
@@ -1,7 +1,9 @@
 import os
+import threading
+import time
 import streamlit as st
 import google.generativeai as genai
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
 
@@ -10,6 +12,68 @@ load_dotenv()
 
 GEMINI_KEY = os.getenv("GEMINI_API_KEY")
 
+# Scoring engine: "sql" (MATCHING_QUERY) atau "memory" (scoring.py)
+SCORING_ENGINE = os.getenv("SCORING_ENGINE", "sql")
+
+# Dashboard hanya butuh N kandidat teratas + histogram (dihitung di DB)
+RESULTS_TOP_K = int(os.getenv("RESULTS_TOP_K", "10"))
+HISTOGRAM_BINS = 15
+
+# Sharded scoring untuk organisasi besar: kandidat dibagi ke N shard yang di-score
+# paralel (proses untuk "memory", koneksi DB untuk "sql"); 1 = satu query / proses.
+# Worker 0 = jumlah CPU (memory) / jumlah shard (sql).
+SCORING_SHARDS = int(os.getenv("SCORING_SHARDS", "1"))
+SCORING_SHARD_WORKERS = int(os.getenv("SCORING_SHARD_WORKERS", "0"))
+
+# Engine "memory" membaca feature matrix dari snapshot lokal (snapshot.py, SNAPSHOT_DIR)
+# alih-alih query ke database
+SNAPSHOT_FEATURES = os.getenv("SNAPSHOT_FEATURES", "0") != "0"
+
+# Ranking cache: jumlah entry, TTL (detik), dan seberapa sering data version di-probe ulang
+RANKING_CACHE_SIZE = int(os.getenv("RANKING_CACHE_SIZE", "64"))
+RANKING_CACHE_TTL = float(os.getenv("RANKING_CACHE_TTL", "900"))
+RANKING_CACHE_VERSION_TTL = float(os.getenv("RANKING_CACHE_VERSION_TTL", "0"))
+
+# Baseline cohort default dari agregat yang di-maintain trigger (feature_store.py)
+BASELINE_AGGREGATES = os.getenv("BASELINE_AGGREGATES", "1") != "0"
+
+# Gemini response cache (in-memory LRU + SQLite di disk)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "256"))
+
+# Gemini: streaming ke dashboard + batas waktu satu generasi (detik)
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") != "0"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# AI insight untuk seluruh shortlist (insights.py): concurrency, kuota & retry
+SHORTLIST_INSIGHTS = os.getenv("SHORTLIST_INSIGHTS", "1") != "0"
+INSIGHT_CONCURRENCY = int(os.getenv("INSIGHT_CONCURRENCY", "4"))
+INSIGHT_RATE_PER_MIN = float(os.getenv("INSIGHT_RATE_PER_MIN", "60"))
+INSIGHT_BURST = int(os.getenv("INSIGHT_BURST", "5"))
+INSIGHT_RETRIES = int(os.getenv("INSIGHT_RETRIES", "3"))
+INSIGHT_TIMEOUT = float(os.getenv("INSIGHT_TIMEOUT", "30"))
+
+# Headless API (api.py): pekerjaan DB / Gemini paralel maksimum + batas antre (detik)
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "8"))
+API_LLM_CONCURRENCY = int(os.getenv("API_LLM_CONCURRENCY", "4"))
+API_QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "10"))
+# Batas top_k per request /v1/rankings
+API_MAX_TOP_K = int(os.getenv("API_MAX_TOP_K", "1000"))
+
+# Connection pool (engine dibuat lazy saat pertama kali dipakai)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Health check yang gagal diulang paling cepat tiap N detik (DB cold start / network blip)
+DB_HEALTH_RETRY_SECONDS = float(os.getenv("DB_HEALTH_RETRY_SECONDS", "10"))
+# MATCHING_QUERY di-PREPARE sekali per koneksi pool (lihat query.py)
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1") != "0"
+
 # 2. Ambil ENV sesuai struktur terbaru
 host = os.getenv("SUPA_HOST")
 port = os.getenv("SUPA_PORT")
@@ -17,35 +81,88 @@ db_name = os.getenv("DBNAME")
 user = os.getenv("SUPA_USER")
 password = os.getenv("PASSWORD")
 
-# Encode password
-password_encoded = quote_plus(password)
+# 3. Validasi Config (tanpa round trip ke database)
+# Dashboard berhenti di sini kalau .env tidak lengkap. Di luar Streamlit (CLI
+# benchmark.py / synthetic.py / migrations.py dengan --database-url, test) modul
+# tetap bisa di-import; error baru muncul kalau engine default benar-benar dipakai.
+CONFIG_ERROR = None
+if not (host and user and password and GEMINI_KEY):
+    CONFIG_ERROR = "⚠️ Error: The .env file has an issue. Make sure SUPA_HOST, SUPA_USER, PASSWORD, and GEMINI_API_KEY are correct."
+    if st.runtime.exists():
+        st.error(CONFIG_ERROR)
+        st.stop()
 
-# 3. Susun connection string
-DB_URL = f"postgresql://{user}:{password_encoded}@{host}:{port}/{db_name}"
-
-# 4. Validasi Config
-if not DB_URL or not GEMINI_KEY:
-    st.error("⚠️ Error: The .env file has an issue. Make sure SUPA_HOST, SUPA_USER, PASSWORD, and GEMINI_API_KEY are correct.")
-    st.stop()
+# 4. Susun connection string (password di-encode)
+DB_URL = f"postgresql://{user}:{quote_plus(password)}@{host}:{port}/{db_name}" if host and user and password else None
 
 # 5. Setup Gemini
-genai.configure(api_key=GEMINI_KEY)
+if GEMINI_KEY:
+    genai.configure(api_key=GEMINI_KEY)
+
+# 6. Setup Database Engine (lazy + pooled)
+# Import modul ini tidak membuka koneksi apa pun. Engine dibuat saat
+# get_db_engine() pertama kali dipanggil; create_engine sendiri juga belum
+# konek, jadi cold start tidak menunggu network. Satu engine dipakai bersama
+# oleh semua session (thread) sehingga koneksi yang sudah warm di-reuse.
+_engine = None
+_engine_lock = threading.Lock()
+_health = {"status": "unknown", "error": None, "checked_at": None}
+
 
-# 6. Setup Database Engine (cached)
-@st.cache_resource
 def get_db_engine():
+    global _engine
+    if DB_URL is None:
+        raise RuntimeError(CONFIG_ERROR)
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    DB_URL,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                    connect_args={
+                        "connect_timeout": DB_CONNECT_TIMEOUT,
+                        "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+                    },
+                )
+                # Koneksi yang berhasil di-checkout (lolos pre-ping) = database sehat lagi
+                event.listen(_engine, "checkout", _mark_healthy)
+    return _engine
+
+
+def _mark_healthy(*_):
+    if _health["status"] != "ok":
+        _health.update(status="ok", error=None, checked_at=time.time())
+
+
+def _run_health_check():
     try:
-        engine = create_engine(DB_URL)
-        # Test quick connection
-        with engine.connect() as conn:
+        with get_db_engine().connect() as conn:
             conn.execute(text("SELECT 1"))
-        return engine
+        _health.update(status="ok", error=None)
     except Exception as e:
-        st.error(f"❌ Database Connection Error: {e}")
-        return None
+        _health.update(status="error", error=str(e))
+    _health["checked_at"] = time.time()
+
+
+def start_health_check():
+    """Cek koneksi di background thread (sekaligus mengisi pool dengan satu koneksi warm).
+
+    Jalan sekali di awal, lalu diulang kalau cek terakhir error dan sudah lebih
+    dari DB_HEALTH_RETRY_SECONDS yang lalu.
+    """
+    with _engine_lock:
+        stale_error = (_health["status"] == "error"
+                       and time.time() - (_health["checked_at"] or 0) >= DB_HEALTH_RETRY_SECONDS)
+        if _health["status"] != "unknown" and not stale_error:
+            return
+        _health["status"] = "checking"
+    threading.Thread(target=_run_health_check, name="db-health-check", daemon=True).start()
 
-# Jalankan koneksi
-engine = get_db_engine()
 
-if engine:
-    st.success("✅ Database Connected Successfully!")
+def db_health():
+    """Status health check terakhir: unknown / checking / ok / error"""
+    return dict(_health)
@@ -0,0 +1,468 @@
+import argparse
+from sqlalchemy import text
+
+# --- WIDE CANDIDATE FEATURE TABLE ---
+# One row per employee with the PAPI pivot, psych scores, strengths arrays and
+# org dimension names precomputed. MATCHING_QUERY reads from this table instead
+# of re-pivoting papi_scores / re-aggregating strengths on every request.
+#
+# Gallup top-5 themes are also stored as a BIGINT bitmask (`top5_mask`, one bit
+# per theme from `dim_strength_themes`) so strengths overlap is a popcount of
+# an AND instead of an UNNEST + ANY scan. MATCHING_QUERY counts the shared bits
+# with bit_count(bit), which needs PostgreSQL 14 or newer (Supabase ships 15+).
+#
+# Source tables mark changed employees in `employee_features_dirty` via
+# triggers; the refresh job only rebuilds those employees.
+
+FEATURE_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS employee_features (
+    employee_id      TEXT PRIMARY KEY,
+    fullname         TEXT,
+    iq               NUMERIC,
+    pauli            NUMERIC,
+    has_psych        BOOLEAN NOT NULL DEFAULT FALSE,
+    papi_rows        INTEGER NOT NULL DEFAULT 0,
+    papi_n           NUMERIC,
+    papi_a           NUMERIC,
+    papi_l           NUMERIC,
+    papi_p           NUMERIC,
+    papi_i           NUMERIC,
+    papi_z           NUMERIC,
+    papi_c           NUMERIC,
+    top_3_strengths  TEXT[] NOT NULL DEFAULT '{}',
+    my_top_themes    TEXT[] NOT NULL DEFAULT '{}',
+    top5_mask        BIGINT NOT NULL DEFAULT 0,
+    directorate_id   TEXT,
+    grade_id         TEXT,
+    role             TEXT,
+    division         TEXT,
+    department       TEXT,
+    directorate      TEXT,
+    job_level        TEXT,
+    refreshed_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE employee_features ADD COLUMN IF NOT EXISTS top5_mask BIGINT NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS dim_strength_themes (
+    theme TEXT PRIMARY KEY,
+    bit   SMALLINT NOT NULL UNIQUE CHECK (bit BETWEEN 0 AND 62)
+);
+
+CREATE TABLE IF NOT EXISTS employee_features_dirty (
+    employee_id TEXT PRIMARY KEY,
+    marked_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION mark_employee_features_dirty() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO employee_features_dirty (employee_id) VALUES (OLD.employee_id::text)
+        ON CONFLICT (employee_id) DO NOTHING;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO employee_features_dirty (employee_id) VALUES (NEW.employee_id::text)
+        ON CONFLICT (employee_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Dimension rename -> every employee pointing at that row is dirty.
+-- TG_ARGV[0] = FK column in employees, TG_ARGV[1] = key column in the dim table.
+CREATE OR REPLACE FUNCTION mark_employee_features_dirty_by_dim() RETURNS trigger AS $$
+DECLARE
+    dim_key TEXT := COALESCE(to_jsonb(NEW), to_jsonb(OLD)) ->> TG_ARGV[1];
+BEGIN
+    EXECUTE format(
+        'INSERT INTO employee_features_dirty (employee_id)
+         SELECT employee_id::text FROM employees WHERE %I::text = $1
+         ON CONFLICT (employee_id) DO NOTHING',
+        TG_ARGV[0]
+    ) USING dim_key;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# The 34 CliftonStrengths themes; bit position = index in this list.
+GALLUP_THEMES = [
+    "Achiever", "Activator", "Adaptability", "Analytical", "Arranger", "Belief",
+    "Command", "Communication", "Competition", "Connectedness", "Consistency",
+    "Context", "Deliberative", "Developer", "Discipline", "Empathy", "Focus",
+    "Futuristic", "Harmony", "Ideation", "Includer", "Individualization", "Input",
+    "Intellection", "Learner", "Maximizer", "Positivity", "Relator",
+    "Responsibility", "Restorative", "Self-Assurance", "Significance",
+    "Strategic", "Woo",
+]
+MAX_THEME_BITS = 63
+
+SOURCE_TABLES = ["employees", "profiles_psych", "papi_scores", "strengths"]
+
+# dim table -> (FK column in employees, key column in dim table)
+DIM_TABLES = {
+    "dim_positions": ("position_id", "position_id"),
+    "dim_divisions": ("division_id", "division_id"),
+    "dim_departments": ("department_id", "department_id"),
+    "dim_directorates": ("directorate_id", "directorate_id"),
+    "dim_grades": ("grade_id", "grade_id"),
+}
+
+# Same pivot the old `candidate_data` CTE built on every request.
+FEATURE_SELECT = """
+SELECT
+    e.employee_id::text, e.fullname, pp.iq, pp.pauli,
+    (pp.employee_id IS NOT NULL) as has_psych,
+    COUNT(ps.scale_code) as papi_rows,
+    MAX(CASE WHEN ps.scale_code = 'Papi_N' THEN ps.score END) as papi_n,
+    MAX(CASE WHEN ps.scale_code = 'Papi_A' THEN ps.score END) as papi_a,
+    MAX(CASE WHEN ps.scale_code = 'Papi_L' THEN ps.score END) as papi_l,
+    MAX(CASE WHEN ps.scale_code = 'Papi_P' THEN ps.score END) as papi_p,
+    MAX(CASE WHEN ps.scale_code = 'Papi_I' THEN ps.score END) as papi_i,
+    MAX(CASE WHEN ps.scale_code = 'Papi_Z' THEN ps.score END) as papi_z,
+    MAX(CASE WHEN ps.scale_code = 'Papi_C' THEN ps.score END) as papi_c,
+    ARRAY(SELECT theme FROM strengths s WHERE s.employee_id = e.employee_id ORDER BY rank ASC LIMIT 3) as top_3_strengths,
+    ARRAY(SELECT theme FROM strengths s WHERE s.employee_id = e.employee_id AND s.rank <= 5 ORDER BY rank ASC) as my_top_themes,
+    (SELECT COALESCE(BIT_OR(1::bigint << t.bit), 0)
+     FROM strengths s JOIN dim_strength_themes t ON s.theme = t.theme
+     WHERE s.employee_id = e.employee_id AND s.rank <= 5) as top5_mask,
+    e.directorate_id::text, e.grade_id::text,
+    pos.name as role,
+    div.name as division,
+    dept.name as department,
+    dir.name as directorate,
+    gr.name as job_level,
+    now() as refreshed_at
+FROM employees e
+LEFT JOIN profiles_psych pp ON e.employee_id = pp.employee_id
+LEFT JOIN papi_scores ps ON e.employee_id = ps.employee_id
+LEFT JOIN dim_positions pos ON e.position_id = pos.position_id
+LEFT JOIN dim_divisions div ON e.division_id = div.division_id
+LEFT JOIN dim_departments dept ON e.department_id = dept.department_id
+LEFT JOIN dim_directorates dir ON e.directorate_id = dir.directorate_id
+LEFT JOIN dim_grades gr ON e.grade_id = gr.grade_id
+{where}
+GROUP BY e.employee_id, e.fullname, pp.employee_id, pp.iq, pp.pauli,
+         e.directorate_id, e.grade_id, pos.name, div.name, dept.name, dir.name, gr.name
+"""
+
+FEATURE_COLUMNS = [
+    "employee_id", "fullname", "iq", "pauli", "has_psych", "papi_rows",
+    "papi_n", "papi_a", "papi_l", "papi_p", "papi_i", "papi_z", "papi_c",
+    "top_3_strengths", "my_top_themes", "top5_mask", "directorate_id", "grade_id",
+    "role", "division", "department", "directorate", "job_level", "refreshed_at",
+]
+
+UPSERT_FEATURES = """
+INSERT INTO employee_features ({cols})
+{select}
+ON CONFLICT (employee_id) DO UPDATE SET {updates}
+""".format(
+    cols=", ".join(FEATURE_COLUMNS),
+    select="{select}",
+    updates=", ".join(f"{c} = EXCLUDED.{c}" for c in FEATURE_COLUMNS if c != "employee_id"),
+)
+
+
+# --- BASELINE AGGREGATES (cohort default: semua High Performer) ---
+# `benchmark_stats` / `benchmark_top_strengths` di MATCHING_QUERY untuk cohort
+# default hampir selalu menghasilkan angka yang sama, jadi disimpan sebagai
+# running sum/count (cohort_baseline_agg) + jumlah anggota per tema
+# (cohort_theme_counts). Kontribusi tiap anggota dicatat di
+# baseline_contributions; trigger statement-level (transition table) di
+# employee_features dan performance_yearly hanya menghitung ulang employee yang
+# berubah lalu menambahkan selisihnya, jadi baseline cohort default = lookup
+# satu baris, bukan scan seluruh High Performer.
+BASELINE_COHORT = "high_performers"
+
+# kolom agregat -> ekspresi atas baris kontribusi (filter sama dengan benchmark_stats)
+BASELINE_AGG_FIELDS = [
+    ("members", "COUNT(*)"),
+    ("iq_sum", "SUM(iq * papi_rows) FILTER (WHERE qualifies)"),
+    ("iq_weight", "SUM(papi_rows) FILTER (WHERE qualifies AND iq IS NOT NULL)"),
+    ("pauli_sum", "SUM(pauli * papi_rows) FILTER (WHERE qualifies)"),
+    ("pauli_weight", "SUM(papi_rows) FILTER (WHERE qualifies AND pauli IS NOT NULL)"),
+] + [
+    field
+    for scale in "nalpizc"
+    for field in [(f"papi_{scale}_sum", f"SUM(papi_{scale}) FILTER (WHERE qualifies)"),
+                  (f"papi_{scale}_count", f"COUNT(papi_{scale}) FILTER (WHERE qualifies)")]
+]
+
+BASELINE_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS baseline_contributions (
+    cohort       TEXT NOT NULL,
+    employee_id  TEXT NOT NULL,
+    qualifies    BOOLEAN NOT NULL,
+    papi_rows    INTEGER NOT NULL,
+    iq           NUMERIC,
+    pauli        NUMERIC,
+    papi_n       NUMERIC,
+    papi_a       NUMERIC,
+    papi_l       NUMERIC,
+    papi_p       NUMERIC,
+    papi_i       NUMERIC,
+    papi_z       NUMERIC,
+    papi_c       NUMERIC,
+    top5_mask    BIGINT NOT NULL,
+    PRIMARY KEY (cohort, employee_id)
+);
+
+CREATE TABLE IF NOT EXISTS cohort_baseline_agg (
+    cohort      TEXT PRIMARY KEY,
+    {columns},
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS cohort_theme_counts (
+    cohort   TEXT NOT NULL,
+    bit      SMALLINT NOT NULL,
+    members  BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (cohort, bit)
+);
+""".replace("{columns}", ",\n    ".join(
+    f"{name} {'BIGINT' if name == 'members' or name.endswith(('_weight', '_count')) else 'NUMERIC'} NOT NULL DEFAULT 0"
+    for name, _ in BASELINE_AGG_FIELDS
+))
+
+
+def _baseline_delta_sql(changed, sign):
+    """Satu statement: baris `changed` (DELETE/INSERT ... RETURNING) -> agregat +/- selisihnya"""
+    sums = ", ".join(f"COALESCE({expr}, 0) as {name}" for name, expr in BASELINE_AGG_FIELDS)
+    sets = ", ".join(f"{name} = a.{name} {sign} d.{name}" for name, _ in BASELINE_AGG_FIELDS)
+    return f"""
+    WITH changed AS (
+        {changed}
+    ),
+    totals AS (
+        UPDATE cohort_baseline_agg a SET {sets}, updated_at = now()
+        FROM (SELECT {sums} FROM changed) d
+        WHERE a.cohort = '{BASELINE_COHORT}'
+        RETURNING 1
+    )
+    INSERT INTO cohort_theme_counts (cohort, bit, members)
+    SELECT '{BASELINE_COHORT}', t.bit, {sign}COUNT(*)
+    FROM changed c JOIN dim_strength_themes t ON (c.top5_mask & (1::bigint << t.bit)) <> 0
+    GROUP BY t.bit
+    ON CONFLICT (cohort, bit) DO UPDATE SET members = cohort_theme_counts.members + EXCLUDED.members;"""
+
+
+_CONTRIBUTION_COLUMNS = "cohort, employee_id, qualifies, papi_rows, iq, pauli, papi_n, papi_a, papi_l, papi_p, papi_i, papi_z, papi_c, top5_mask"
+
+BASELINE_FUNCTION_DDL = """
+-- Hitung ulang kontribusi `ids`: kontribusi lama dikurangkan, yang baru ditambahkan
+CREATE OR REPLACE FUNCTION sync_baseline_contributions(ids TEXT[]) RETURNS void AS $$
+BEGIN
+    INSERT INTO cohort_baseline_agg (cohort) VALUES ('{cohort}') ON CONFLICT (cohort) DO NOTHING;
+    {remove}
+    {add}
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_baseline_on_features() RETURNS trigger AS $$
+DECLARE
+    ids TEXT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(employee_id) INTO ids FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(employee_id) INTO ids FROM old_rows;
+    ELSE
+        SELECT array_agg(employee_id) INTO ids FROM (
+            SELECT employee_id FROM old_rows UNION SELECT employee_id FROM new_rows
+        ) u;
+    END IF;
+    IF ids IS NOT NULL THEN
+        PERFORM sync_baseline_contributions(ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Hanya baris rating 5 yang bisa mengubah keanggotaan cohort
+CREATE OR REPLACE FUNCTION sync_baseline_on_performance() RETURNS trigger AS $$
+DECLARE
+    ids TEXT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT employee_id::text) INTO ids FROM new_rows WHERE rating = 5;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT employee_id::text) INTO ids FROM old_rows WHERE rating = 5;
+    ELSE
+        SELECT array_agg(employee_id) INTO ids FROM (
+            SELECT employee_id::text FROM old_rows WHERE rating = 5
+            UNION SELECT employee_id::text FROM new_rows WHERE rating = 5
+        ) u;
+    END IF;
+    IF ids IS NOT NULL THEN
+        PERFORM sync_baseline_contributions(ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+""".replace("{cohort}", BASELINE_COHORT).replace("{remove}", _baseline_delta_sql(
+    f"DELETE FROM baseline_contributions c WHERE c.cohort = '{BASELINE_COHORT}' "
+    "AND c.employee_id IN (SELECT unnest(ids)) RETURNING c.*",
+    "-",
+)).replace("{add}", _baseline_delta_sql(
+    f"INSERT INTO baseline_contributions ({_CONTRIBUTION_COLUMNS}) "
+    f"SELECT '{BASELINE_COHORT}', f.employee_id, f.has_psych AND f.papi_rows > 0, f.papi_rows, "
+    "f.iq, f.pauli, f.papi_n, f.papi_a, f.papi_l, f.papi_p, f.papi_i, f.papi_z, f.papi_c, f.top5_mask "
+    "FROM employee_features f WHERE f.employee_id IN (SELECT unnest(ids)) "
+    "AND EXISTS (SELECT 1 FROM performance_yearly py WHERE py.employee_id = f.employee_id AND py.rating = 5) "
+    "RETURNING *",
+    "+",
+))
+
+# table -> trigger function; satu trigger per event karena transition table
+# tidak bisa dipakai trigger dengan lebih dari satu event
+BASELINE_TRIGGER_TABLES = {
+    "employee_features": "sync_baseline_on_features",
+    "performance_yearly": "sync_baseline_on_performance",
+}
+TRANSITION_TABLES = {
+    "INSERT": "NEW TABLE AS new_rows",
+    "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "OLD TABLE AS old_rows",
+}
+
+
+def _default_engine():
+    # Import lokal: modul ini juga dipakai terhadap database lain (synthetic / benchmark)
+    from config import get_db_engine
+    return get_db_engine()
+
+
+def seed_strength_themes(conn, employee_ids_table=None):
+    """Isi dim_strength_themes: 34 tema Gallup dulu, lalu tema lain yang ada di data.
+
+    employee_ids_table: hanya cek tema milik employee di tabel ini (refresh incremental).
+    top5_mask meng-JOIN dim_strength_themes, jadi tema baru harus punya bit sebelum refresh.
+    """
+    existing = dict(conn.execute(text("SELECT theme, bit FROM dim_strength_themes")).fetchall())
+    scope = f"AND employee_id::text IN (SELECT employee_id FROM {employee_ids_table})" if employee_ids_table else ""
+    in_data = [row[0] for row in conn.execute(text(
+        f"SELECT DISTINCT theme FROM strengths WHERE theme IS NOT NULL {scope} ORDER BY theme"
+    ))]
+
+    next_bit = max(existing.values(), default=-1) + 1
+    for theme in GALLUP_THEMES + in_data:
+        if theme in existing:
+            continue
+        if next_bit >= MAX_THEME_BITS:
+            raise ValueError(f"Too many distinct strength themes for a BIGINT mask (> {MAX_THEME_BITS})")
+        conn.execute(
+            text("INSERT INTO dim_strength_themes (theme, bit) VALUES (:theme, :bit)"),
+            {"theme": theme, "bit": next_bit},
+        )
+        existing[theme] = next_bit
+        next_bit += 1
+
+
+def ensure_feature_store(engine=None):
+    """Buat tabel, function & trigger (idempotent)"""
+    engine = engine or _default_engine()
+    with engine.begin() as conn:
+        conn.execute(text(FEATURE_TABLE_DDL))
+        seed_strength_themes(conn)
+        for table in SOURCE_TABLES:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_features_dirty ON {table}"))
+            conn.execute(text(
+                f"CREATE TRIGGER trg_{table}_features_dirty "
+                f"AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION mark_employee_features_dirty()"
+            ))
+        for table, (fk_col, key_col) in DIM_TABLES.items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_features_dirty ON {table}"))
+            conn.execute(text(
+                f"CREATE TRIGGER trg_{table}_features_dirty "
+                f"AFTER UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION mark_employee_features_dirty_by_dim('{fk_col}', '{key_col}')"
+            ))
+
+        conn.execute(text(BASELINE_TABLE_DDL))
+        conn.execute(text(BASELINE_FUNCTION_DDL))
+        for table, function in BASELINE_TRIGGER_TABLES.items():
+            for event, transition in TRANSITION_TABLES.items():
+                name = f"trg_{table}_baseline_{event.lower()}"
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {name} ON {table}"))
+                conn.execute(text(
+                    f"CREATE TRIGGER {name} AFTER {event} ON {table} "
+                    f"REFERENCING {transition} FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+                ))
+        _rebuild_baseline(conn)
+
+
+def _rebuild_baseline(conn):
+    conn.execute(text("DELETE FROM baseline_contributions WHERE cohort = :cohort"), {"cohort": BASELINE_COHORT})
+    conn.execute(text("DELETE FROM cohort_theme_counts WHERE cohort = :cohort"), {"cohort": BASELINE_COHORT})
+    conn.execute(text("DELETE FROM cohort_baseline_agg WHERE cohort = :cohort"), {"cohort": BASELINE_COHORT})
+    conn.execute(text(
+        "SELECT sync_baseline_contributions(ARRAY("
+        "SELECT f.employee_id FROM employee_features f "
+        "WHERE EXISTS (SELECT 1 FROM performance_yearly py WHERE py.employee_id = f.employee_id AND py.rating = 5)))"
+    ))
+
+
+def rebuild_baseline_aggregates(engine=None):
+    """Hitung ulang agregat baseline dari nol (mis. setelah TRUNCATE, yang tidak memicu trigger)"""
+    engine = engine or _default_engine()
+    with engine.begin() as conn:
+        _rebuild_baseline(conn)
+
+
+def refresh_employee_features(engine=None, full=False):
+    """Rebuild baris employee_features.
+
+    full=False hanya memproses employee yang ditandai trigger di
+    employee_features_dirty; full=True membangun ulang semuanya.
+    Mengembalikan jumlah employee yang diproses.
+    """
+    engine = engine or _default_engine()
+    with engine.begin() as conn:
+        if full:
+            seed_strength_themes(conn)
+            conn.execute(text(UPSERT_FEATURES.format(select=FEATURE_SELECT.format(where=""))))
+            conn.execute(text(
+                "DELETE FROM employee_features f "
+                "WHERE NOT EXISTS (SELECT 1 FROM employees e WHERE e.employee_id::text = f.employee_id)"
+            ))
+            conn.execute(text("TRUNCATE employee_features_dirty"))
+            return conn.execute(text("SELECT COUNT(*) FROM employee_features")).scalar()
+
+        # Snapshot antrian dulu: perubahan yang masuk selama refresh tetap tertinggal
+        # di antrian untuk run berikutnya.
+        conn.execute(text(
+            "CREATE TEMP TABLE _features_refresh_ids ON COMMIT DROP AS "
+            "SELECT employee_id FROM employee_features_dirty"
+        ))
+        conn.execute(text(
+            "DELETE FROM employee_features_dirty d USING _features_refresh_ids r "
+            "WHERE d.employee_id = r.employee_id"
+        ))
+        conn.execute(text(
+            "DELETE FROM employee_features f USING _features_refresh_ids r "
+            "WHERE f.employee_id = r.employee_id "
+            "AND NOT EXISTS (SELECT 1 FROM employees e WHERE e.employee_id::text = r.employee_id)"
+        ))
+        # Tema yang baru muncul di strengths dapat bit dulu, kalau tidak hilang dari top5_mask
+        seed_strength_themes(conn, "_features_refresh_ids")
+        where = "WHERE e.employee_id::text IN (SELECT employee_id FROM _features_refresh_ids)"
+        conn.execute(text(UPSERT_FEATURES.format(select=FEATURE_SELECT.format(where=where))))
+        return conn.execute(text("SELECT COUNT(*) FROM _features_refresh_ids")).scalar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the employee_features table")
+    parser.add_argument("--full", action="store_true", help="rebuild every employee, not only dirty ones")
+    parser.add_argument("--init", action="store_true", help="create table and triggers first")
+    parser.add_argument("--rebuild-baseline", action="store_true", help="recompute the high-performer baseline aggregates from scratch")
+    args = parser.parse_args()
+
+    if args.init:
+        ensure_feature_store()
+    count = refresh_employee_features(full=args.full or args.init)
+    print(f"✅ employee_features refreshed: {count} employees")
+    if args.rebuild_baseline:
+        rebuild_baseline_aggregates()
+        print("✅ baseline aggregates rebuilt")
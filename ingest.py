@@ -0,0 +1,151 @@
+import argparse
+import os
+import pandas as pd
+from sqlalchemy import text
+from synthetic import TABLE_ORDER, copy_frame
+
+# --- CSV INGESTION (pengganti loader di data_transformation.ipynb) ---
+# CSV dibaca per chunk (memory terbatas, tidak tergantung ukuran file), tipe
+# dinormalisasi secara vektor (bukan .apply per baris), lalu setiap chunk:
+#   COPY -> temp staging table -> INSERT ... ON CONFLICT (primary key) DO UPDATE
+# Update hanya terjadi kalau isi baris benar-benar berubah (IS DISTINCT FROM),
+# jadi trigger feature_store hanya menandai employee yang terdampak dan
+# refresh_employee_features() di akhir cukup membangun ulang employee itu saja.
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+# table -> (primary key, {kolom: tipe}); tipe: "int" | "float" | "text"
+TABLE_SPECS = {
+    "dim_directorates": (["directorate_id"], {"directorate_id": "int", "name": "text"}),
+    "dim_divisions": (["division_id"], {"division_id": "int", "name": "text"}),
+    "dim_departments": (["department_id"], {"department_id": "int", "name": "text"}),
+    "dim_positions": (["position_id"], {"position_id": "int", "name": "text"}),
+    "dim_grades": (["grade_id"], {"grade_id": "int", "name": "text"}),
+    "dim_education": (["education_id"], {"education_id": "int", "name": "text"}),
+    "dim_competency_pillars": (["pillar_code"], {"pillar_code": "text", "pillar_label": "text"}),
+    "employees": (["employee_id"], {
+        "employee_id": "text", "fullname": "text",
+        "directorate_id": "int", "division_id": "int", "department_id": "int",
+        "position_id": "int", "grade_id": "int", "education_id": "int",
+        "years_of_service_months": "int",
+    }),
+    "performance_yearly": (["employee_id", "year"], {"employee_id": "text", "year": "int", "rating": "int"}),
+    # gtq dulu dibersihkan dengan format_score() per baris; sekarang to_numeric vektor
+    "profiles_psych": (["employee_id"], {
+        "employee_id": "text", "pauli": "float", "faxtor": "float",
+        "disc": "text", "mbti": "text", "iq": "float", "gtq": "float",
+    }),
+    "papi_scores": (["employee_id", "scale_code"], {"employee_id": "text", "scale_code": "text", "score": "int"}),
+    "strengths": (["employee_id", "rank"], {"employee_id": "text", "rank": "int", "theme": "text"}),
+    "competencies_yearly": (["employee_id", "pillar_code", "year"], {
+        "employee_id": "text", "pillar_code": "text", "year": "int", "score": "int",
+    }),
+}
+
+
+def table_for_file(path):
+    """Tebak nama tabel dari nama file (mis. 'Study Case DA - profiles_psych.csv')"""
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    # Nama terpanjang dulu, supaya 'dim_positions' tidak tertangkap sebagai tabel lain
+    for table in sorted(TABLE_SPECS, key=len, reverse=True):
+        if stem == table or stem.endswith(table):
+            return table
+    raise ValueError(f"Cannot infer target table from file name: {path}")
+
+
+def normalize_chunk(df, table):
+    """Normalisasi tipe satu chunk (vektor). Mengembalikan (DataFrame bersih, jumlah baris ditolak)"""
+    key, columns = TABLE_SPECS[table]
+    missing = [c for c in key if c not in df.columns]
+    if missing:
+        raise ValueError(f"{table}: CSV is missing key column(s) {', '.join(missing)}")
+
+    out = pd.DataFrame(index=df.index)
+    for col, kind in columns.items():
+        if col not in df.columns:
+            continue
+        raw = df[col].str.strip().replace("", pd.NA)
+        if kind == "text":
+            out[col] = raw
+            continue
+        values = pd.to_numeric(raw, errors="coerce")
+        if kind == "int":
+            # 3.0 -> 3; nilai pecahan di kolom integer dianggap tidak valid (NULL)
+            values = values.where(values.round() == values).astype("Int64")
+        out[col] = values
+
+    # Baris tanpa primary key tidak bisa di-upsert
+    valid = out[key].notna().all(axis=1)
+    rejected = int((~valid).sum())
+    out = out[valid].drop_duplicates(subset=key, keep="last")
+    return out, rejected
+
+
+def upsert_sql(table, stage, columns, key):
+    cols = ", ".join(columns)
+    updates = [c for c in columns if c not in key]
+    if not updates:
+        conflict = "DO NOTHING"
+    else:
+        assignments = ", ".join(f"{c} = EXCLUDED.{c}" for c in updates)
+        changed = ", ".join(f"{table}.{c}" for c in updates)
+        incoming = ", ".join(f"EXCLUDED.{c}" for c in updates)
+        conflict = f"DO UPDATE SET {assignments} WHERE ({changed}) IS DISTINCT FROM ({incoming})"
+    return (
+        f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} "
+        f"ON CONFLICT ({', '.join(key)}) {conflict}"
+    )
+
+
+def ingest_csv(conn, path, table=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream satu CSV ke tabelnya; mengembalikan dict statistik"""
+    table = table or table_for_file(path)
+    key, _ = TABLE_SPECS[table]
+    stage = f"_ingest_{table}"
+    conn.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {table}) ON COMMIT DROP"))
+
+    stats = {"table": table, "file": path, "rows_read": 0, "rows_rejected": 0, "rows_written": 0}
+    # dtype=str: parsing tipe dilakukan sekali di normalize_chunk, bukan ditebak pandas per chunk
+    reader = pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    for chunk in reader:
+        chunk.columns = [c.strip().lower() for c in chunk.columns]
+        clean, rejected = normalize_chunk(chunk, table)
+        stats["rows_read"] += len(chunk)
+        stats["rows_rejected"] += rejected
+        if clean.empty:
+            continue
+        conn.execute(text(f"TRUNCATE {stage}"))
+        copy_frame(conn, stage, clean)
+        result = conn.execute(text(upsert_sql(table, stage, list(clean.columns), key)))
+        stats["rows_written"] += max(result.rowcount, 0)
+    return stats
+
+
+def ingest_files(paths, engine=None, chunk_size=DEFAULT_CHUNK_SIZE, refresh=True):
+    """Ingest beberapa CSV (dimensi dulu, lalu fakta) lalu refresh employee_features yang berubah"""
+    from feature_store import _default_engine, refresh_employee_features
+    engine = engine or _default_engine()
+
+    jobs = sorted(((table_for_file(p), p) for p in paths), key=lambda job: TABLE_ORDER.index(job[0]))
+    results = []
+    for table, path in jobs:
+        # Satu transaksi per file: file yang gagal tidak meninggalkan data setengah jadi
+        with engine.begin() as conn:
+            results.append(ingest_csv(conn, path, table, chunk_size))
+
+    refreshed = refresh_employee_features(engine) if refresh else 0
+    return results, refreshed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream HR CSV exports into Postgres (COPY + upsert)")
+    parser.add_argument("files", nargs="+", help="CSV files; target table is inferred from the file name")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per COPY batch")
+    parser.add_argument("--no-refresh", action="store_true", help="skip refreshing employee_features")
+    args = parser.parse_args()
+
+    results, refreshed = ingest_files(args.files, chunk_size=args.chunk_size, refresh=not args.no_refresh)
+    for r in results:
+        print(f"✅ {r['table']}: {r['rows_read']} rows read, {r['rows_written']} inserted/updated, "
+              f"{r['rows_rejected']} rejected ({r['file']})")
+    print(f"✅ employee_features refreshed: {refreshed} employees")
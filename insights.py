@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+import tracing
+from tracing import span
+
+# --- SHORTLIST INSIGHTS ---
+# AI insight untuk semua kandidat di shortlist (bukan hanya #1). Request ke
+# Gemini di-fan-out ke beberapa worker, tapi tetap dibatasi:
+#   - concurrency: jumlah request yang berjalan bersamaan
+#   - token bucket: rata-rata request per menit + burst (kuota API)
+#   - retry dengan exponential backoff + jitter untuk error sementara (429/5xx)
+#   - deadline per kandidat: retry / antre rate limit tidak melewati batas ini
+# Hasil di-yield begitu satu kandidat selesai (urutan selesai, bukan urutan rank).
+#
+# Modul ini tidak meng-import config / prompt di level modul, jadi bisa dites
+# offline dengan `generate=` (fungsi stub) atau `model=` (fake Gemini client).
+
+# Nama exception google.api_core yang layak di-retry
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "DeadlineExceeded", "InternalServerError", "GatewayTimeout",
+}
+
+
+class TokenBucket:
+    """Rate limiter token bucket yang thread-safe.
+
+    `rate` token per detik diisi ulang sampai maksimum `capacity` (burst).
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline=None):
+        """Ambil satu token; False kalau deadline (monotonic) lewat sebelum dapat token"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+# Satu bucket per (rate, burst) untuk seluruh proses: semua sesi / rerun
+# Streamlit berbagi kuota Gemini yang sama, bukan masing-masing burst penuh
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(rate_per_minute, burst):
+    """TokenBucket proses untuk (rate_per_minute, burst); dibuat sekali"""
+    key = (float(rate_per_minute), int(burst))
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(key[0] / 60.0, capacity=key[1])
+        return bucket
+
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS or getattr(error, "code", None) in (429, 500, 502, 503, 504)
+
+
+def call_with_retry(fn, deadline, bucket=None, retries=3, backoff=0.5, max_backoff=8.0):
+    """Panggil fn(timeout) dengan rate limit + retry sampai deadline (monotonic)"""
+    attempt = 0
+    while True:
+        if bucket is not None and not bucket.acquire(deadline):
+            raise TimeoutError("Rate limit queue exceeded the insight deadline")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Insight deadline exceeded")
+        try:
+            return fn(remaining)
+        except Exception as e:
+            attempt += 1
+            if attempt > retries or not is_retryable(e):
+                raise
+            # Full jitter: sleep acak di [0, backoff * 2^attempt]
+            delay = random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+            if time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
+
+
+def _default_generate(model, top_match_rate):
+    from prompt import build_shortlist_prompt, _generate
+
+    def generate(row, rank, timeout):
+        return _generate(build_shortlist_prompt(row, rank, top_match_rate), model, timeout=timeout)
+    return generate
+
+
+def generate_shortlist_insights(rows, model=None, generate=None, max_workers=4,
+                                rate_per_minute=60, burst=5, retries=3, timeout=30.0, cancel=None,
+                                first_rank=1, top_match_rate=None):
+    """Insight untuk setiap baris shortlist; yield (index, text, ok) saat selesai.
+
+    rows: list baris kandidat (Series, mis. `[row for _, row in df.iterrows()]`),
+    urut rank mulai `first_rank`. `generate(row, rank, timeout)` default memanggil
+    Gemini lewat response cache prompt.py dengan prompt sesuai rank (selisih ke
+    `top_match_rate`, match rate #1; default baris pertama kalau first_rank=1).
+    Error akhir tidak menghentikan batch: baris itu di-yield dengan
+    ok=False dan pesan "⚠️ Analysis Error". `cancel` (threading.Event) membuat
+    request yang belum mulai langsung dilewati. Rate limit dibagi dengan semua
+    pemanggil lain di proses ini yang memakai rate_per_minute / burst yang sama
+    (shared_bucket).
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    if generate is None:
+        if top_match_rate is None:
+            if first_rank != 1:
+                raise ValueError("top_match_rate is required when the shortlist does not start at #1")
+            top_match_rate = rows[0]["final_match_rate"]
+        generate = _default_generate(model, top_match_rate)
+    bucket = shared_bucket(rate_per_minute, burst)
+
+    def run(index, row):
+        if cancel is not None and cancel.is_set():
+            raise CancelledError("Analysis cancelled")
+        deadline = time.monotonic() + timeout
+        with span("gemini.shortlist_insight", rank=index + 1):
+            return call_with_retry(lambda remaining: generate(row, first_rank + index, remaining), deadline, bucket, retries)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(rows)))) as pool:
+        futures = {tracing.submit(pool, run, i, row): i for i, row in enumerate(rows)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield index, future.result(), True
+            except Exception as e:
+                yield index, f"⚠️ Analysis Error: {str(e)}", False
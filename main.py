@@ -1,18 +1,57 @@
+import math
+import queue
+import threading
+import time
 import streamlit as st
 import uuid
-from app_layout import render_sidebar, render_visualizations, render_results_table
-from prompt import generate_job_profile_gemini, generate_candidate_analysis
-from query import get_ranked_talent
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from app_layout import (
+    render_sidebar, render_weight_sliders, render_visualizations, render_results_table,
+    render_shortlist_insight_slots,
+)
+from insights import generate_shortlist_insights
+from prompt import (
+    generate_job_profile_gemini, generate_candidate_analysis,
+    stream_job_profile_gemini, stream_candidate_analysis,
+)
+from query import get_match_scores, get_ranked_talent, normalize_benchmark
+from scoring import TGV_WEIGHTS, rerank
+from config import (
+    RESULTS_TOP_K, HISTOGRAM_BINS, LLM_STREAMING, start_health_check, db_health,
+    SHORTLIST_INSIGHTS, INSIGHT_CONCURRENCY, INSIGHT_RATE_PER_MIN, INSIGHT_BURST, INSIGHT_RETRIES, INSIGHT_TIMEOUT,
+)
+from cohorts import BENCHMARK_COHORTS, DEFAULT_COHORT, resolve_cohort, cohort_cache_key
+import tracing
+from tracing import span, traced
+
+# Seberapa sering teks parsial Gemini di-render ulang (detik)
+STREAM_POLL_SECONDS = 0.1
 
 st.set_page_config(page_title="AI Talent Matcher", layout="wide", page_icon="🧬")
 st.title("🧬 AI Talent Match Intelligence")
 st.markdown("Automated Success Pattern Discovery & Matching")
 
 def main():
+    # Health check DB jalan di background; halaman tidak menunggu koneksi.
+    # Error lama tetap tampil selama cek ulang berjalan, hilang begitu ada
+    # koneksi yang berhasil (health check atau query biasa)
+    start_health_check()
+    health = db_health()
+    if health["error"]:
+        st.error(f"❌ Database Connection Error: {health['error']}")
+
     # Render Sidebar
-    role, level, purpose, resps, comps, bench_ids, is_clicked = render_sidebar()
+    role, level, purpose, resps, comps, bench_ids, cohort, cohort_params, is_clicked = render_sidebar()
+    weights = render_weight_sliders()
+    ids_list = [x.strip() for x in bench_ids.split(",") if x.strip()]
+    key = analysis_key(role, level, purpose, resps, comps, ids_list, cohort, cohort_params)
+    saved = st.session_state.get('analysis')
 
     if is_clicked:
+        # Klik eksplisit selalu menjalankan ulang analisis (ranking / insight bisa
+        # basi walau input sama); hanya rerun tanpa klik yang memakai hasil tersimpan
+
         # 1. PARAMETERIZE JOB VACANCY (Simulasi Recording)
         # Sesuai requirement: "Record or parameterize a new job_vacancy_id"
         if 'vacancy_id' not in st.session_state:
@@ -23,49 +62,273 @@ def main():
         st.toast(f"🆔 Analysis Session ID: {current_vacancy_id} initialized.")
 
         # 2. VALIDASI BENCHMARK
-        ids_list = [x.strip() for x in bench_ids.split(",") if x.strip()]
         if len(ids_list) > 3:
             st.error(f"Maximum Benchmark limit is 3 IDs! You entered {len(ids_list)} !!")
             st.stop()
+        if not ids_list:
+            try:
+                resolve_cohort(cohort, cohort_params)
+            except ValueError as e:
+                st.error(f"⚠️ {e}")
+                st.stop()
+
+        # 3-7. PIPELINE PARALEL
+        # AI context & ranking SQL tidak saling bergantung -> jalan bersamaan.
+        # AI insight mulai begitu top candidate diketahui. Setiap panel punya
+        # placeholder sendiri dan dirender begitu hasilnya siap.
+        # Semua span (termasuk di worker thread) di-tag dengan vacancy_id
+        with tracing.trace(vacancy_id=current_vacancy_id):
+            with span("stage.total"):
+                run_analysis_pipeline(role, level, purpose, resps, comps, ids_list, cohort, cohort_params, weights, key)
+        tracing.write_metrics_snapshot()
+
+    elif saved is not None:
+        # Rerun karena widget lain (input sidebar, slider bobot): analisis terakhir
+        # tetap tampil dari session state, tanpa query database maupun Gemini
+        if saved['key'] != key:
+            st.info("Inputs changed since this analysis. Click **Analyze & Match** to refresh it.")
+        render_saved_analysis(saved, weights)
+
+def analysis_key(role, level, purpose, resps, comps, ids_list, cohort, cohort_params):
+    """Key analisis tersimpan: input role + benchmark kanonik (None kalau cohort belum valid)"""
+    try:
+        benchmark = cohort_cache_key(*normalize_benchmark(ids_list, cohort, cohort_params))
+    except ValueError:
+        return None
+    return (role, level, purpose, tuple(resps), tuple(comps), benchmark)
+
+def _same_weights(a, b):
+    return all(math.isclose(a[g], b[g]) for g in TGV_WEIGHTS)
+
+def _rank(ids_list, cohort, cohort_params, weights):
+    """(top-K, is_fallback, score frame atau None).
+
+    Bobot default: TOP_K_QUERY (top-K + histogram server), tanpa score frame
+    seluruh kandidat di session state. Bobot custom: score frame m_* di-rerank
+    dan disimpan untuk slider bobot berikutnya.
+    """
+    if _same_weights(weights, TGV_WEIGHTS):
+        df, is_fallback = get_ranked_talent(ids_list, top_k=RESULTS_TOP_K, cohort=cohort, cohort_params=cohort_params)
+        return df, is_fallback, None
+    scores, is_fallback = get_match_scores(ids_list, cohort=cohort, cohort_params=cohort_params)
+    if scores.empty:
+        return scores, is_fallback, None
+    return rerank(scores, weights, top_k=RESULTS_TOP_K, bins=HISTOGRAM_BINS), is_fallback, scores
 
-        # 3. GENERATE AI CONTEXT
-        with st.expander("📄 View AI-Generated Job Context", expanded=False):
-             with st.spinner("Analyzing context & Requirements..."):
-                ai_output = generate_job_profile_gemini(role, level, purpose, resps, comps)
-                st.markdown(ai_output)
+def _analysis_scores(analysis):
+    """Score frame analisis tersimpan; di-fetch sekali saat slider pertama kali digeser"""
+    if analysis.get('scores') is None:
+        with span("stage.fetch_scores"):
+            scores, _ = get_match_scores(analysis['ids_list'], cohort=analysis['cohort'],
+                                         cohort_params=analysis['cohort_params'])
+        analysis['scores'] = None if scores.empty else scores
+    return analysis['scores']
 
+def _render_benchmark_banner(is_fallback, cohort, ids_list):
+    if is_fallback:
+        st.info(f"Auto-Benchmark: {BENCHMARK_COHORTS[cohort or DEFAULT_COHORT]['label']}.")
+    else:
+        st.success(f"✅ Custom Benchmark: ID {', '.join(ids_list)}")
+
+def render_saved_analysis(analysis, weights):
+    """Tampilkan analisis terakhir dari session state.
+
+    Bobot sama -> ranking tersimpan dipakai apa adanya; bobot beda -> rerank
+    in-process dari score frame m_* (query sekali saat slider pertama kali
+    digeser, lalu disimpan). Tidak ada panggilan Gemini.
+    """
+    reweight = not _same_weights(weights, analysis['weights'])
+    scores = _analysis_scores(analysis) if reweight else analysis.get('scores')
+    reweight = reweight and scores is not None
+    if reweight:
+        start = time.perf_counter()
+        with span("stage.reweight", candidates=len(scores)):
+            df_results = rerank(scores, weights, top_k=RESULTS_TOP_K, bins=HISTOGRAM_BINS)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    else:
+        df_results = analysis['results']
+
+    with st.expander("📄 View AI-Generated Job Context", expanded=False):
+        st.markdown(analysis['context'])
+    st.divider()
+    _render_benchmark_banner(analysis['is_fallback'], analysis['cohort'], analysis['ids_list'])
+    if reweight:
+        st.caption(f"⚖️ Re-ranked {len(scores):,} candidates with the sidebar weights in {elapsed_ms:.0f} ms.")
+
+    best_candidate = df_results.iloc[0]
+    render_visualizations(df_results, best_candidate)
+
+    st.divider()
+    st.markdown(f"### AI Insight: Why {best_candidate['fullname']} ranks #1?")
+    if analysis.get('insight_for') == best_candidate['employee_id']:
+        st.info(analysis['insight'])
+    else:
+        st.caption("The #1 candidate changed with these weights. Click Analyze & Match to generate a new AI insight.")
+
+    st.divider()
+    render_results_table(df_results)
+
+    # Insight shortlist yang sudah dibuat (per employee_id, jadi tetap cocok setelah rerank)
+    shortlist_df = df_results.head(10).iloc[1:]
+    saved_insights = analysis.get('shortlist') or {}
+    if SHORTLIST_INSIGHTS and not shortlist_df.empty and saved_insights:
         st.divider()
+        slots = render_shortlist_insight_slots(shortlist_df)
+        for i, employee_id in enumerate(shortlist_df['employee_id']):
+            if employee_id in saved_insights:
+                slots[i].info(saved_insights[employee_id])
+            else:
+                slots[i].caption("Click Analyze & Match to generate an insight for this candidate.")
 
-        # 4. RECOMPUTE BASELINES & SQL (Dynamic)
-        # Fungsi ini otomatis menghitung ulang baseline dari input `ids_list` 
-        # dan menjalankan parameterized query tanpa edit code.
-        with st.spinner("Recomputing Success Baselines & Ranking..."):
-            df_results, is_fallback = get_ranked_talent(ids_list)
-
-        if df_results.empty:
-            st.warning("No data found.")
-        else:
-            if is_fallback:
-                st.info(f"Auto-Benchmark: Using {len(ids_list) if not ids_list else 'All'} High Performers.")
+def _stream_to(key, chunks, updates):
+    """Kumpulkan chunk streaming; setiap teks parsial dikirim ke main thread lewat queue"""
+    text = ""
+    for piece in chunks:
+        text += piece
+        updates.put((key, text))
+    return text
+
+def _shortlist_to(rows, top_match_rate, updates, cancel):
+    """Insight shortlist #2 dst (paralel + rate limited); setiap hasil dikirim ke main thread"""
+    results = generate_shortlist_insights(
+        rows, max_workers=INSIGHT_CONCURRENCY, rate_per_minute=INSIGHT_RATE_PER_MIN,
+        burst=INSIGHT_BURST, retries=INSIGHT_RETRIES, timeout=INSIGHT_TIMEOUT, cancel=cancel,
+        first_rank=2, top_match_rate=top_match_rate,
+    )
+    for index, text, _ in results:
+        updates.put((("shortlist", index), text))
+
+def run_analysis_pipeline(role, level, purpose, resps, comps, ids_list, cohort=None, cohort_params=None, weights=None, key=None):
+    # Placeholder sesuai urutan layout, diisi sesuai urutan selesai
+    context_box = st.expander("📄 View AI-Generated Job Context", expanded=False)
+    context_slot = context_box.empty()
+    context_slot.caption("⏳ Analyzing context & Requirements...")
+    st.divider()
+    results_area = st.container()
+    ranking_slot = results_area.empty()
+    ranking_slot.caption("⏳ Recomputing Success Baselines & Ranking...")
+
+    # Re-run (klik Run lagi / widget berubah) membatalkan stream Gemini run sebelumnya
+    previous = st.session_state.get('analysis_cancel')
+    if previous is not None:
+        previous.set()
+    cancel = threading.Event()
+    st.session_state['analysis_cancel'] = cancel
+    updates = queue.Queue()
+    weights = weights or dict(TGV_WEIGHTS)
+    # Analisis lama tetap di session state sampai yang baru selesai; run yang
+    # terpotong rerun tidak menghapus hasil terakhir
+    analysis = {
+        'key': key, 'weights': weights, 'ids_list': ids_list, 'cohort': cohort, 'cohort_params': cohort_params,
+        'context': "", 'insight': None, 'insight_for': None, 'shortlist': {},
+        'results': None, 'is_fallback': None, 'scores': None,
+    }
+    shortlist_ids = []
+
+    # Worker thread perlu ScriptRunContext agar st.cache_* tetap bekerja
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=5, initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+        try:
+            if LLM_STREAMING:
+                chunks = stream_job_profile_gemini(role, level, purpose, resps, comps, cancel=cancel)
+                profile_future = tracing.submit(pool, traced("stage.ai_context")(_stream_to), "context", chunks, updates)
             else:
-                st.success(f"✅ Custom Benchmark: ID {', '.join(ids_list)}")
-            
-            best_candidate = df_results.iloc[0]
-
-            # 5. REGENERATE VISUALS
-            render_visualizations(df_results, best_candidate)
-            
-            # 6. AI CANDIDATE INSIGHT
-            st.divider()
-            st.markdown(f"### AI Insight: Why {best_candidate['fullname']} ranks #1?")
-            with st.spinner("Generating insight..."):
-                insight = generate_candidate_analysis(best_candidate)
-                st.info(insight)
-            
-            st.divider()
-
-            # 7. DISPLAY OUTPUT TABLES
-            render_results_table(df_results)
+                profile_future = tracing.submit(pool, traced("stage.ai_context")(generate_job_profile_gemini), role, level, purpose, resps, comps)
+            # 4. RECOMPUTE BASELINES & SQL (Dynamic)
+            # Fungsi ini otomatis menghitung ulang baseline dari input `ids_list` 
+            # dan menjalankan parameterized query tanpa edit code.
+            # Top-K (bobot default) atau score frame m_* yang di-rerank (bobot custom)
+            ranking_future = tracing.submit(
+                pool, traced("stage.ranking")(_rank), ids_list, cohort, cohort_params, weights,
+            )
+            insight_future = None
+            insight_slot = None
+            shortlist_slots = {}
+
+            pending = {profile_future, ranking_future}
+            while pending:
+                done, pending = wait(pending, timeout=STREAM_POLL_SECONDS, return_when=FIRST_COMPLETED)
+
+                # Render teks parsial terbaru dari stream Gemini
+                latest = {}
+                while not updates.empty():
+                    slot_key, partial = updates.get_nowait()
+                    latest[slot_key] = partial
+                if "context" in latest and profile_future not in done:
+                    context_slot.markdown(latest["context"] + " ▌")
+                if "insight" in latest and insight_slot is not None and insight_future not in done:
+                    insight_slot.info(latest["insight"] + " ▌")
+                for update_key, text in latest.items():
+                    if isinstance(update_key, tuple) and update_key[1] in shortlist_slots:
+                        shortlist_slots[update_key[1]].info(text)
+                        analysis['shortlist'][shortlist_ids[update_key[1]]] = text
+
+                for future in done:
+                    if future is profile_future:
+                        # 3. GENERATE AI CONTEXT
+                        analysis['context'] = future.result()
+                        context_slot.markdown(analysis['context'])
+
+                    elif future is ranking_future:
+                        ranking_slot.empty()
+                        df_results, is_fallback, analysis['scores'] = future.result()
+                        if df_results.empty:
+                            results_area.warning("No data found.")
+                            continue
+
+                        analysis['results'] = df_results
+                        analysis['is_fallback'] = is_fallback
+                        best_candidate = df_results.iloc[0]
+                        # 6. AI CANDIDATE INSIGHT (mulai secepatnya, render nanti)
+                        if LLM_STREAMING:
+                            chunks = stream_candidate_analysis(best_candidate, cancel=cancel)
+                            insight_future = tracing.submit(pool, traced("stage.ai_insight")(_stream_to), "insight", chunks, updates)
+                        else:
+                            insight_future = tracing.submit(pool, traced("stage.ai_insight")(generate_candidate_analysis), best_candidate)
+                        pending.add(insight_future)
+                        analysis['insight_for'] = best_candidate['employee_id']
+
+                        with results_area:
+                            _render_benchmark_banner(is_fallback, cohort, ids_list)
+
+                            # 5. REGENERATE VISUALS
+                            with span("stage.visualizations"):
+                                render_visualizations(df_results, best_candidate)
+
+                            st.divider()
+                            st.markdown(f"### AI Insight: Why {best_candidate['fullname']} ranks #1?")
+                            insight_slot = st.empty()
+                            insight_slot.caption("⏳ Generating insight...")
+
+                            st.divider()
+
+                            # 7. DISPLAY OUTPUT TABLES
+                            with span("stage.tables"):
+                                render_results_table(df_results)
+
+                            # 8. AI INSIGHT SHORTLIST (#2 dst, #1 sudah di atas)
+                            shortlist_df = df_results.head(10).iloc[1:]
+                            if SHORTLIST_INSIGHTS and not shortlist_df.empty:
+                                st.divider()
+                                shortlist_slots = render_shortlist_insight_slots(shortlist_df)
+                                shortlist_ids = list(shortlist_df['employee_id'])
+                                shortlist_rows = [row for _, row in shortlist_df.iterrows()]
+                                pending.add(tracing.submit(
+                                    pool, traced("stage.shortlist_insights")(_shortlist_to),
+                                    shortlist_rows, best_candidate['final_match_rate'], updates, cancel,
+                                ))
+
+                    elif future is insight_future:
+                        analysis['insight'] = future.result()
+                        insight_slot.info(analysis['insight'])
+
+            # Simpan hasil (+ score frame kalau sudah di-fetch) untuk rerun berikutnya
+            if analysis['results'] is not None:
+                st.session_state['analysis'] = analysis
+        finally:
+            # Script dihentikan (re-run) atau error: hentikan stream yang masih jalan
+            # supaya shutdown pool tidak menunggu generasi selesai
+            cancel.set()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
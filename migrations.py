@@ -0,0 +1,339 @@
+import argparse
+import json
+import sys
+from sqlalchemy import create_engine, text
+
+# --- SCHEMA MIGRATIONS + QUERY PLAN CHECKS ---
+# Migration berversi untuk index yang dibutuhkan hot path matching. Versi yang
+# sudah jalan dicatat di `schema_migrations`, jadi modul ini aman dijalankan
+# berulang (mis. setiap deploy). Index dibuat CONCURRENTLY supaya tabel HR
+# tetap bisa ditulis selama build; advisory lock mencegah dua migrator jalan
+# bersamaan.
+#
+# `--check` menjalankan EXPLAIN (ANALYZE, BUFFERS) untuk query matching &
+# refresh feature di database (mis. dataset sintetis, lihat synthetic.py) dan
+# gagal kalau plan kembali ke Seq Scan di tabel yang seharusnya lewat index,
+# atau cost planner melewati batas.
+#
+# Urutan: `python feature_store.py --init` dulu (employee_features harus ada).
+
+MIGRATIONS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version     INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    applied_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+# --- DATA VERSION COUNTER ---
+# Ranking cache (query.py) memvalidasi entry dengan versi data. Alih-alih scan
+# COUNT / SUM tiap request, trigger statement-level menaikkan counter per tabel
+# sumber MATCHING_QUERY setiap kali statement benar-benar mengubah baris;
+# probe versi jadi lookup satu tabel kecil.
+DATA_VERSION_TABLES = ["employee_features", "performance_yearly", "employees"]
+
+DATA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS data_versions (
+    source      TEXT PRIMARY KEY,
+    version     BIGINT NOT NULL DEFAULT 0,
+    changed_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO data_versions (source) VALUES {sources} ON CONFLICT (source) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+DECLARE
+    changed BOOLEAN;
+BEGIN
+    -- Statement yang tidak mengubah baris apa pun (mis. refresh tanpa employee dirty) tidak dihitung
+    IF TG_OP = 'TRUNCATE' THEN
+        changed := true;
+    ELSIF TG_OP = 'DELETE' THEN
+        changed := EXISTS (SELECT 1 FROM old_rows);
+    ELSE
+        changed := EXISTS (SELECT 1 FROM new_rows);
+    END IF;
+    IF changed THEN
+        UPDATE data_versions SET version = version + 1, changed_at = now() WHERE source = TG_TABLE_NAME;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+""".replace("{sources}", ", ".join(f"('{t}')" for t in DATA_VERSION_TABLES))
+
+
+def _data_version_triggers(table):
+    # Satu trigger per event (transition table), TRUNCATE tanpa transition table
+    statements = []
+    for event, transition in [("INSERT", "NEW TABLE AS new_rows"), ("UPDATE", "NEW TABLE AS new_rows"),
+                              ("DELETE", "OLD TABLE AS old_rows"), ("TRUNCATE", None)]:
+        name = f"trg_{table}_data_version_{event.lower()}"
+        referencing = f"REFERENCING {transition} " if transition else ""
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {name} AFTER {event} ON {table} "
+            f"{referencing}FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()"
+        )
+    return statements
+
+
+# Tambahkan versi baru di akhir; jangan ubah migration yang sudah pernah jalan.
+#   sql:     statement biasa, satu transaksi
+#   indexes: nama -> definisi, dibuat dengan CREATE INDEX CONCURRENTLY
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "matching_hot_path_indexes",
+        "indexes": {
+            # FEATURE_SELECT (refresh per employee): pivot PAPI & top strengths
+            # jadi index-only scan per employee
+            "idx_papi_scores_employee_scale": "papi_scores (employee_id, scale_code) INCLUDE (score)",
+            "idx_strengths_employee_rank": "strengths (employee_id, rank) INCLUDE (theme)",
+            # Cohort High Performer (rating = 5, opsional per tahun), flag
+            # is_high_performer dan trigger baseline aggregates
+            "idx_performance_yearly_rating5": "performance_yearly (employee_id) INCLUDE (year) WHERE rating = 5",
+            # selected_benchmarks: EXISTS per employee dengan rating apa pun
+            "idx_performance_yearly_employee": "performance_yearly (employee_id) INCLUDE (rating)",
+            # Cohort High Performer per grade
+            "idx_employees_grade": "employees (grade_id)",
+            # ProfileIndex.sync(since)
+            "idx_employee_features_refreshed_at": "employee_features (refreshed_at)",
+        },
+    },
+    {
+        "version": 2,
+        "name": "data_version_counters",
+        "sql": [DATA_VERSION_DDL] + [
+            statement
+            for table in DATA_VERSION_TABLES
+            for statement in _data_version_triggers(table)
+        ],
+    },
+]
+
+MIGRATION_LOCK_KEY = "talent_match_migrations"
+
+INVALID_INDEXES_QUERY = """
+SELECT c.relname
+FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+WHERE NOT i.indisvalid AND c.relname = ANY(CAST(:names AS text[]))
+"""
+
+# Batas cost planner (unit cost Postgres) per employee di employee_features /
+# per employee yang di-refresh. Plan normal jauh di bawah ini; yang tertangkap
+# adalah regresi seperti nested loop cohort x kandidat.
+MATCHING_COST_PER_EMPLOYEE = 25.0
+REFRESH_COST_PER_EMPLOYEE = 100.0
+REFRESH_SAMPLE_SIZE = 50
+# Refresh punya subquery berkorelasi (strengths per employee). Planner
+# membebankannya ke setiap baris SEBELUM GROUP BY (employee x ~20 baris papi),
+# sehingga total cost-nya ~30k walau eksekusinya beberapa ms. Jadi yang dibatasi:
+# cost sumber baris (join di bawah aggregate) per employee, dan cost satu kali
+# eksekusi tiap subplan (lookup index; Seq Scan strengths bernilai ribuan).
+REFRESH_SUBPLAN_COST = 100.0
+
+# Tabel yang di-VACUUM ANALYZE sebelum EXPLAIN (statistik & visibility map
+# untuk index-only scan; data hasil COPY belum punya keduanya)
+PLAN_TABLES = ["employees", "profiles_psych", "papi_scores", "strengths", "performance_yearly", "employee_features"]
+
+
+def _default_engine():
+    # Import lokal: modul ini juga dipakai terhadap database lain (synthetic / benchmark)
+    from config import get_db_engine
+    return get_db_engine()
+
+
+def applied_versions(conn):
+    conn.execute(text(MIGRATIONS_TABLE_DDL))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def _create_indexes(conn, indexes):
+    # Build CONCURRENTLY yang gagal meninggalkan index INVALID; IF NOT EXISTS
+    # akan melewatinya, jadi dibuang dulu lalu dibangun ulang
+    invalid = [row[0] for row in conn.execute(text(INVALID_INDEXES_QUERY), {"names": list(indexes)})]
+    for name in invalid:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    for name, definition in indexes.items():
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+
+
+def apply_migrations(engine=None, target=None):
+    """Jalankan migration yang belum tercatat (sampai versi `target`); mengembalikan versi yang dijalankan"""
+    engine = engine or _default_engine()
+    applied = []
+    # CREATE INDEX CONCURRENTLY tidak bisa di dalam transaksi -> koneksi autocommit
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text("SELECT pg_advisory_lock(hashtext(:key))"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            done = applied_versions(conn)
+            for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+                version = migration["version"]
+                if version in done or (target is not None and version > target):
+                    continue
+                if migration.get("sql"):
+                    with engine.begin() as tx:
+                        for statement in migration["sql"]:
+                            tx.execute(text(statement))
+                _create_indexes(conn, migration.get("indexes", {}))
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                    {"version": version, "name": migration["name"]},
+                )
+                applied.append(version)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": MIGRATION_LOCK_KEY})
+    return applied
+
+
+def explain(conn, sql, params=None):
+    """EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) -> dict plan teratas (dengan 'Plan' & 'Execution Time')"""
+    raw = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql), params or {}).scalar()
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return raw[0]
+
+
+def plan_nodes(node):
+    """Semua node plan (termasuk CTE & subplan), depth-first"""
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def row_source_cost(node):
+    """Cost node tanpa subplan berkorelasi yang menempel padanya (cost input barisnya)"""
+    children = node.get("Plans", [])
+    inputs = [c for c in children if c.get("Parent Relationship") != "SubPlan"]
+    if len(inputs) == len(children) or not inputs:
+        return node["Total Cost"]
+    return max(row_source_cost(c) for c in inputs)
+
+
+def check_plan(name, explained, no_seq_scan=(), max_cost=None, max_subplan_cost=None):
+    """Ringkasan satu plan + daftar masalah (Seq Scan terlarang / cost terlalu tinggi).
+
+    Dengan `max_subplan_cost`, `max_cost` membatasi row_source_cost plan (bukan
+    total cost yang ikut menghitung subplan per baris) dan tiap subplan dibatasi
+    `max_subplan_cost` per eksekusi.
+    """
+    plan = explained["Plan"]
+    nodes = list(plan_nodes(plan))
+    seq_scans = sorted({n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan" and "Relation Name" in n})
+    subplans = [n for n in nodes if n.get("Parent Relationship") == "SubPlan"]
+    cost = plan["Total Cost"] if max_subplan_cost is None else row_source_cost(plan)
+    summary = {
+        "total_cost": plan["Total Cost"],
+        "budgeted_cost": cost,
+        "max_cost": max_cost,
+        "subplan_cost": max((n["Total Cost"] for n in subplans), default=0.0),
+        "max_subplan_cost": max_subplan_cost,
+        "execution_ms": round(explained.get("Execution Time", 0.0), 2),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": plan.get("Shared Read Blocks", 0),
+        "seq_scans": seq_scans,
+        "indexes": sorted({n["Index Name"] for n in nodes if "Index Name" in n}),
+    }
+    problems = [f"{name}: Seq Scan on {rel}" for rel in seq_scans if rel in no_seq_scan]
+    if max_cost is not None and cost > max_cost:
+        problems.append(f"{name}: planner cost {cost:.0f} exceeds {max_cost:.0f}")
+    if max_subplan_cost is not None:
+        problems.extend(
+            f"{name}: {n.get('Subplan Name', 'subplan')} cost {n['Total Cost']:.0f} exceeds {max_subplan_cost:.0f}"
+            for n in subplans if n["Total Cost"] > max_subplan_cost
+        )
+    return summary, problems
+
+
+def _plan_checks(conn, cost_scale):
+    """(nama, sql, params, tabel tanpa Seq Scan, batas cost, batas cost subplan) untuk hot path saat ini"""
+    # Import lokal: query.py butuh config aplikasi (sama seperti benchmark.py)
+    from cohorts import BENCHMARK_COHORTS, CUSTOM_COHORT, DEFAULT_COHORT
+    from feature_store import FEATURE_SELECT
+    from query import HISTOGRAM_BINS, build_matching_query
+
+    employees = conn.execute(text("SELECT COUNT(*) FROM employee_features")).scalar() or 0
+    sample = [row[0] for row in conn.execute(
+        text("SELECT employee_id FROM employee_features ORDER BY md5(employee_id) LIMIT :n"),
+        {"n": REFRESH_SAMPLE_SIZE},
+    )]
+    benchmark_ids = [row[0] for row in conn.execute(text(
+        "SELECT DISTINCT employee_id FROM performance_yearly WHERE rating = 5 ORDER BY employee_id LIMIT 3"
+    ))]
+
+    top_k = {"top_k": 10, "bins": HISTOGRAM_BINS}
+    matching_cost = MATCHING_COST_PER_EMPLOYEE * max(employees, 1) * cost_scale
+    default_sql = BENCHMARK_COHORTS[DEFAULT_COHORT]["sql"]
+    checks = [
+        # Cohort default + baseline aggregates: anggota cohort lewat index parsial rating 5
+        ("matching_default_aggregated",
+         build_matching_query(default_sql, top_k=True, aggregated_cohort=DEFAULT_COHORT),
+         top_k, ["performance_yearly"], matching_cost, None),
+        # Baseline hasil scan (BASELINE_AGGREGATES=0): semi-join ke semua anggota boleh
+        # memakai hash join, jadi hanya cost yang dibatasi
+        ("matching_default_scan",
+         build_matching_query(default_sql, top_k=True),
+         top_k, [], matching_cost, None),
+        ("matching_custom",
+         build_matching_query(BENCHMARK_COHORTS[CUSTOM_COHORT]["sql"], top_k=True),
+         {**top_k, "benchmark_ids": benchmark_ids}, ["performance_yearly"], matching_cost, None),
+        # Refresh incremental segelintir employee: semua source table lewat index
+        ("feature_refresh",
+         FEATURE_SELECT.format(where="WHERE e.employee_id::text = ANY(CAST(:ids AS text[]))"),
+         {"ids": sample}, ["employees", "profiles_psych", "papi_scores", "strengths"],
+         REFRESH_COST_PER_EMPLOYEE * max(len(sample), 1) * cost_scale, REFRESH_SUBPLAN_COST * cost_scale),
+    ]
+    return checks
+
+
+def _vacuum_analyze(engine, tables):
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in tables:
+            conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+
+
+def run_plan_checks(engine=None, cost_scale=1.0, analyze=True):
+    """EXPLAIN (ANALYZE, BUFFERS) hot path; mengembalikan (report per query, daftar masalah, plan JSON)"""
+    engine = engine or _default_engine()
+    if analyze:
+        _vacuum_analyze(engine, PLAN_TABLES)
+
+    report, problems, plans = {}, [], {}
+    with engine.connect() as conn:
+        for name, sql, params, no_seq_scan, max_cost, max_subplan_cost in _plan_checks(conn, cost_scale):
+            explained = explain(conn, sql, params)
+            plans[name] = explained
+            report[name], found = check_plan(name, explained, no_seq_scan, max_cost, max_subplan_cost)
+            problems.extend(found)
+    return report, problems, plans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations and check matching query plans")
+    parser.add_argument("--database-url", help="target database (default: the app's Supabase connection)")
+    parser.add_argument("--target", type=int, help="apply migrations up to this version")
+    parser.add_argument("--check", action="store_true", help="run EXPLAIN (ANALYZE, BUFFERS) plan checks after migrating")
+    parser.add_argument("--cost-scale", type=float, default=1.0, help="multiply the planner cost budgets")
+    parser.add_argument("--no-analyze", action="store_true", help="skip VACUUM ANALYZE before the plan checks")
+    parser.add_argument("--plans-out", help="write the raw EXPLAIN JSON plans to this file")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url) if args.database_url else _default_engine()
+    applied = apply_migrations(engine, target=args.target)
+    print(f"✅ Migrations applied: {applied or 'none (up to date)'}")
+
+    if args.check:
+        report, problems, plans = run_plan_checks(engine, cost_scale=args.cost_scale, analyze=not args.no_analyze)
+        for name, stats in report.items():
+            print(f"{name:<30} cost {stats['budgeted_cost']:>12.0f} / {stats['max_cost']:>12.0f}"
+                  f"  {stats['execution_ms']:>9.1f} ms  seq scans: {', '.join(stats['seq_scans']) or '-'}")
+        if args.plans_out:
+            with open(args.plans_out, "w") as f:
+                json.dump(plans, f, indent=2)
+        if problems:
+            print("❌ Plan regressions:")
+            for problem in problems:
+                print(f"  - {problem}")
+            sys.exit(1)
+        print("✅ Query plans OK")
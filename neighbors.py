@@ -0,0 +1,308 @@
+import heapq
+import itertools
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from scoring import (
+    FEATURE_COLUMNS_SQL, IQ_PENALTY, PAULI_PENALTY, PAPI_PENALTY, TGV_WEIGHTS, TOP_THEMES,
+    ExactTGV, _ratio_match, build_result_frame, compute_baseline, compute_tgv, final_match_rate,
+    match_score_arrays, normalize_weights, popcount, prepare_features,
+)
+
+# --- NEAREST-NEIGHBOUR INDEX ---
+# KD-tree di atas vektor profil kandidat (iq, pauli, 6 skala PAPI yang dipakai
+# TGV) + OR bitmask strengths per node, untuk top-K "paling mirip benchmark"
+# tanpa men-scan semua employee.
+#
+# final_match_rate = sum bobot x m_* dan setiap m_* hanya bergantung pada satu
+# variabel (monoton untuk iq/pauli, "tenda" di sekitar baseline untuk PAPI,
+# popcount overlap untuk strengths). Jadi untuk satu node KD-tree (bounding
+# box [lo, hi]) batas atas skor bisa dihitung eksak; pencarian best-first
+# berhenti saat batas atas node terbaik < skor ke-K - SCORE_MARGIN.
+#
+# OR bitmask satu node hampir selalu memuat kelima tema baseline, jadi batas
+# strengths per node praktis selalu 5/5 (bobot default: 20 poin) dan tidak
+# ada node yang terpotong. Karena itu pencarian dua tahap:
+#   1. kandidat dengan overlap >= 2 diambil dari inverted index pasangan tema
+#      (pasangan tema baseline -> slot), lalu di-score langsung;
+#   2. sisanya (overlap <= 1) lewat KD-tree dengan batas overlap maksimum 1.
+# Skor ke-K dari tahap 1 biasanya sudah di atas batas root tahap 2 (bobot
+# default: 80 + 4 poin), jadi hanya sebagian kecil kandidat yang di-score.
+#
+# Toleransi vs ranking exhaustive (scoring.rank_candidates):
+#   - kandidat yang tersisa di-score ulang dengan jalur scoring yang sama, jadi
+#     final_match_rate / score_* identik (selisih 0.00)
+#   - set & urutan top-K identik, termasuk tie-break employee_id; SCORE_MARGIN
+#     (0.02) menutup pembulatan ROUND(.., 2) dan selisih float antara skor
+#     linear index dan jalur TGV, sehingga kandidat seri tidak terpotong.
+# compare_rankings(top_k(...), rank_candidates(...).head(k), atol=0.01) == []
+
+INDEX_DIMS = ["iq", "pauli", "papi_n", "papi_a", "papi_l", "papi_i", "papi_z", "papi_c"]
+PAPI_DIMS = INDEX_DIMS[2:]
+SCORE_MARGIN = 0.02
+# iq/pauli NULL -> m = 0 di SQL; -1 selalu di bawah baseline positif sehingga
+# _ratio_match memberi 0 juga. PAPI NULL = COALESCE(.., 0) seperti SQL.
+MISSING_RATIO_VALUE = -1.0
+
+CHANGED_FEATURES_QUERY = FEATURE_COLUMNS_SQL + "WHERE f.refreshed_at > :since ORDER BY f.employee_id"
+
+
+def _coordinates(rows):
+    coords = np.empty((len(rows), len(INDEX_DIMS)), dtype=float)
+    for j, col in enumerate(INDEX_DIMS):
+        values = rows[col].to_numpy(dtype=float)
+        coords[:, j] = np.nan_to_num(values, nan=MISSING_RATIO_VALUE if j < 2 else 0.0)
+    return coords
+
+
+def _coefficients(weights):
+    """Bobot final_match_rate per m_* (TGV di-expand ke variabel)"""
+    w = normalize_weights(weights) if weights else TGV_WEIGHTS
+    return {
+        "iq": w["cognitive"] / 3.0,
+        "pauli": w["motivation"] / 3.0,
+        "papi_n": w["motivation"] / 3.0,
+        "papi_a": w["motivation"] / 3.0,
+        "papi_l": w["leadership"] / 2.0,
+        "papi_i": w["cognitive"] / 3.0,
+        "papi_z": w["adaptability"],
+        "papi_c": w["reliability"],
+        "strengths": w["cognitive"] / 3.0 + w["leadership"] / 2.0,
+    }
+
+
+def _bits(mask):
+    return [b for b in range(64) if (int(mask) >> b) & 1]
+
+
+def _papi_match(values, base):
+    with np.errstate(invalid="ignore"):
+        return np.nan_to_num(np.maximum(0, 100 - np.abs(values - base) * PAPI_PENALTY), nan=0.0)
+
+
+def _linear_scores(coords, masks, baseline, coef, max_overlap=TOP_THEMES):
+    """final_match_rate (belum dibulatkan) untuk titik atau sudut bounding box.
+
+    max_overlap: batas jumlah tema sama (tahap 2 hanya berisi kandidat overlap <= 1).
+    """
+    score = coef["iq"] * _ratio_match(coords[..., 0], baseline["base_iq"], IQ_PENALTY)
+    score = score + coef["pauli"] * _ratio_match(coords[..., 1], baseline["base_pauli"], PAULI_PENALTY)
+    for j, col in enumerate(PAPI_DIMS, start=2):
+        score = score + coef[col] * _papi_match(coords[..., j], baseline[f"base_{col}"])
+    overlap = np.minimum(popcount(masks & np.int64(baseline["base_mask"])), max_overlap)
+    return score + coef["strengths"] * overlap / 5.0 * 100
+
+
+class ProfileIndex:
+    """KD-tree atas feature matrix (hasil scoring.load_candidate_features).
+
+    Perubahan inkremental (`upsert` / `remove`) tidak membangun ulang tree:
+    slot lama di-tombstone dan baris baru masuk delta buffer yang di-scan
+    linear. Tree dibangun ulang otomatis kalau delta + tombstone melebihi
+    `rebuild_ratio` dari ukuran tree. Inverted index pasangan tema (tahap 1)
+    memakai slot yang sama, dibangun ulang bersama tree.
+    """
+
+    def __init__(self, features, leaf_size=64, rebuild_ratio=0.1):
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self.last_query = {}
+        self._build(features)
+
+    # --- build ---
+    def _build(self, features):
+        self.rows = features.set_index("employee_id", drop=False)
+        self.rows = self.rows[~self.rows.index.duplicated(keep="last")]
+        self.ids = self.rows.index.to_numpy()
+        self.coords = _coordinates(self.rows)
+        self.masks = self.rows["top5_mask"].to_numpy(dtype=np.int64)
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self.slot = {emp: i for i, emp in enumerate(self.ids)}
+        self.delta = {}  # employee_id -> (coords, mask)
+
+        order = np.arange(len(self.ids))
+        starts, ends, lefts, rights, los, his, ors = [], [], [], [], [], [], []
+
+        def new_node(start, end):
+            idx = order[start:end]
+            starts.append(start)
+            ends.append(end)
+            lefts.append(-1)
+            rights.append(-1)
+            los.append(self.coords[idx].min(axis=0) if end > start else np.zeros(len(INDEX_DIMS)))
+            his.append(self.coords[idx].max(axis=0) if end > start else np.zeros(len(INDEX_DIMS)))
+            ors.append(np.bitwise_or.reduce(self.masks[idx]) if end > start else 0)
+            return len(starts) - 1
+
+        stack = [new_node(0, len(order))]
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            if end - start <= self.leaf_size:
+                continue
+            dim = int(np.argmax(his[node] - los[node]))
+            if his[node][dim] == los[node][dim]:
+                continue  # semua titik identik -> tetap leaf
+            mid = (start + end) // 2
+            segment = order[start:end]
+            part = np.argpartition(self.coords[segment, dim], mid - start)
+            order[start:end] = segment[part]
+            lefts[node] = new_node(start, mid)
+            rights[node] = new_node(mid, end)
+            stack.extend([lefts[node], rights[node]])
+
+        # Inverted index tahap 1: (bit tema a, bit tema b) -> slot yang punya keduanya di top-5
+        has = {b: (self.masks >> b) & 1 == 1 for b in _bits(np.bitwise_or.reduce(self.masks) if len(self.masks) else 0)}
+        self.theme_pairs = {}
+        for a, b in itertools.combinations(sorted(has), 2):
+            slots = np.flatnonzero(has[a] & has[b])
+            if len(slots):
+                self.theme_pairs[(a, b)] = slots.astype(np.int32)
+
+        self.order = order
+        self.node_start = np.array(starts)
+        self.node_end = np.array(ends)
+        self.node_left = np.array(lefts)
+        self.node_right = np.array(rights)
+        self.node_lo = np.array(los)
+        self.node_hi = np.array(his)
+        self.node_mask = np.array(ors, dtype=np.int64)
+
+    def rebuild(self):
+        # self.rows selalu berisi tepat baris yang aktif (tree + delta)
+        self._build(self.rows.reset_index(drop=True))
+
+    def __len__(self):
+        return int(self.alive.sum()) + len(self.delta)
+
+    # --- incremental updates ---
+    def upsert(self, rows):
+        """Tambah / perbarui employee (DataFrame format prepare_features)"""
+        if rows.empty:
+            return
+        rows = rows.drop_duplicates("employee_id", keep="last")
+        coords = _coordinates(rows)
+        masks = rows["top5_mask"].to_numpy(dtype=np.int64)
+        for i, emp in enumerate(rows["employee_id"]):
+            slot = self.slot.pop(emp, None)
+            if slot is not None:
+                self.alive[slot] = False
+            self.delta[emp] = (coords[i], masks[i])
+        fresh = rows.set_index("employee_id", drop=False)
+        self.rows = pd.concat([self.rows[~self.rows.index.isin(fresh.index)], fresh])
+        self._maybe_rebuild()
+
+    def remove(self, employee_ids):
+        for emp in employee_ids:
+            slot = self.slot.pop(emp, None)
+            if slot is not None:
+                self.alive[slot] = False
+            self.delta.pop(emp, None)
+        self.rows = self.rows[~self.rows.index.isin(set(employee_ids))]
+        self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        stale = int((~self.alive).sum()) + len(self.delta)
+        if stale > self.rebuild_ratio * max(len(self.ids), 1):
+            self.rebuild()
+
+    # --- query ---
+    def top_k(self, benchmark_ids, k=10, weights=None):
+        """Top-K kandidat (kolom RESULT_COLUMNS) vs baseline benchmark_ids, tanpa full scan"""
+        ids = [emp for emp in dict.fromkeys(benchmark_ids) if emp in self.rows.index]
+        if not ids:
+            return pd.DataFrame()
+        baseline = compute_baseline(self.rows.loc[ids].reset_index(drop=True), ids)
+        exclude = set(benchmark_ids)
+        coef = _coefficients(weights)
+        base_mask = np.int64(baseline["base_mask"])
+
+        # Batas atas semua node sekaligus (tahap 2, overlap <= 1): iq/pauli naik
+        # monoton -> nilai di `hi`; PAPI maksimum di titik terdekat ke baseline dalam [lo, hi]
+        corners = self.node_hi.copy()
+        for j, col in enumerate(PAPI_DIMS, start=2):
+            base = baseline[f"base_{col}"]
+            corners[:, j] = np.clip(base, self.node_lo[:, j], self.node_hi[:, j]) if not np.isnan(base) else 0.0
+        bounds = _linear_scores(corners, self.node_mask, baseline, coef, max_overlap=1)
+
+        best = []        # min-heap skor top-K sejauh ini
+        collected = []   # (skor, employee_id) yang masih mungkin masuk top-K
+
+        def consider(emp_ids, scores):
+            for emp, score in zip(emp_ids, scores):
+                if emp in exclude:
+                    continue
+                collected.append((score, emp))
+                if len(best) < k:
+                    heapq.heappush(best, score)
+                elif score > best[0]:
+                    heapq.heapreplace(best, score)
+
+        def threshold():
+            return best[0] - SCORE_MARGIN if len(best) >= k else -np.inf
+
+        # Delta buffer: scan linear (kecil)
+        if self.delta:
+            delta_ids = list(self.delta)
+            delta_coords = np.array([self.delta[e][0] for e in delta_ids])
+            delta_masks = np.array([self.delta[e][1] for e in delta_ids], dtype=np.int64)
+            consider(delta_ids, _linear_scores(delta_coords, delta_masks, baseline, coef))
+
+        # Tahap 1: kandidat dengan >= 2 tema baseline (overlap >= 2), dari inverted index
+        pairs = [self.theme_pairs.get(p) for p in itertools.combinations(_bits(base_mask), 2)]
+        pairs = [slots for slots in pairs if slots is not None]
+        slots = np.unique(np.concatenate(pairs)) if pairs else np.empty(0, dtype=np.int32)
+        slots = slots[self.alive[slots]]
+        if len(slots):
+            consider(self.ids[slots], _linear_scores(self.coords[slots], self.masks[slots], baseline, coef))
+
+        # Tahap 2: KD-tree untuk kandidat overlap <= 1
+        visited, scored = 0, len(self.delta) + len(slots)
+        heap = [(-bounds[0], 0)] if len(self.node_start) and self.node_end[0] > 0 else []
+        while heap:
+            neg_bound, node = heapq.heappop(heap)
+            if -neg_bound < threshold():
+                break
+            visited += 1
+            if self.node_left[node] < 0:
+                idx = self.order[self.node_start[node]:self.node_end[node]]
+                # Overlap >= 2 sudah di-score di tahap 1
+                idx = idx[self.alive[idx] & (popcount(self.masks[idx] & base_mask) < 2)]
+                scored += len(idx)
+                consider(self.ids[idx], _linear_scores(self.coords[idx], self.masks[idx], baseline, coef))
+                continue
+            for child in (self.node_left[node], self.node_right[node]):
+                if bounds[child] >= threshold():
+                    heapq.heappush(heap, (-bounds[child], child))
+
+        self.last_query = {"nodes_visited": visited, "nodes_total": len(self.node_start),
+                           "points_scored": scored, "points_total": len(self), "pair_candidates": len(slots)}
+        cutoff = threshold()
+        survivors = [emp for score, emp in collected if score >= cutoff]
+        if not survivors:
+            return pd.DataFrame()
+
+        # Score ulang lewat jalur yang sama dengan rank_candidates -> nilai identik
+        cand = self.rows.loc[survivors].reset_index(drop=True)
+        tgv = compute_tgv(match_score_arrays(cand, baseline))
+        df = build_result_frame(cand, tgv, baseline)
+        if weights:
+            df["final_match_rate"] = final_match_rate(tgv, normalize_weights(weights), exact=ExactTGV(cand, baseline))
+        df = df.sort_values(["final_match_rate", "employee_id"], ascending=[False, True], kind="stable")
+        return df.head(k).reset_index(drop=True)
+
+    # --- sync dengan employee_features ---
+    def sync(self, conn, since):
+        """Upsert employee yang di-refresh feature_store sejak `since`; hapus yang sudah tidak ada.
+
+        Mengembalikan watermark baru (MAX(refreshed_at)) untuk pemanggilan berikutnya.
+        Catatan: flag performance (has_performance / is_high_performer) baris yang
+        tidak di-refresh tidak ikut berubah; rebuild penuh kalau data rating berubah.
+        """
+        changed = prepare_features(pd.read_sql(text(CHANGED_FEATURES_QUERY), conn, params={"since": since}))
+        self.upsert(changed)
+        current = {row[0] for row in conn.execute(text("SELECT employee_id FROM employee_features"))}
+        gone = [emp for emp in list(self.slot) + list(self.delta) if emp not in current]
+        if gone:
+            self.remove(gone)
+        return conn.execute(text("SELECT MAX(refreshed_at) FROM employee_features")).scalar() or since
@@ -1,4 +1,17 @@
+import hashlib
+import time
 import google.generativeai as genai
+from cache import PersistentResponseCache
+from tracing import span, observe
+from config import LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_MEMORY_SIZE, LLM_TIMEOUT
+
+MODEL_NAME = 'gemini-2.5-flash'
+
+# --- RESPONSE CACHE ---
+# Key = hash(model name + prompt final); client inject tanpa `model_name` tidak
+# di-cache (lihat _response_key). Prompt yang identik (role/level/purpose/
+# responsibilities sama, atau top candidate yang sama) tidak memanggil Gemini lagi.
+response_cache = PersistentResponseCache(LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES, memory_size=LLM_CACHE_MEMORY_SIZE)
 
 JOB_PROFILE_PROMPT = """
 You are an expert Talent Acquisition Strategist. Draft a Job Profile based on these inputs:
@@ -55,44 +68,183 @@ You are a Talent Intelligence Analyst. Explain why **{name}** is the top-ranked
 **🚀 Why Top Rank:** [Your Analysis Here]
 """
 
+# --- SHORTLIST INSIGHT PROMPT (#2 dst) ---
+# CANDIDATE_INSIGHT_PROMPT hanya untuk panel #1; kandidat shortlist lain
+# dijelaskan relatif terhadap #1 (rank + selisih match rate).
+SHORTLIST_INSIGHT_PROMPT = """
+You are a Talent Intelligence Analyst. **{name}** is ranked #{rank} on the shortlist for this role (Match Rate: {match_rate}%, {gap} points behind the #1 candidate at {top_rate}%).
+
+### Candidate Data:
+- **Top Strengths**: {strengths}
+- **Cognitive Score**: {s_cog} (Weight 30%)
+- **Motivation Score**: {s_mot} (Weight 25%)
+- **Leadership Score**: {s_lead} (Weight 20%)
+
+### Instructions:
+1. Provide a concise "Why this candidate?" summary. Do not describe them as the top-ranked candidate.
+2. Highlight their key differentiator (the "Spike").
+3. Explain what most likely keeps them behind #1, and mention one potential gap if any score is below 75.
+4. Keep it business-focused and under 100 words.
+
+### Output:
+**📋 Why Rank #{rank}:** [Your Analysis Here]
+"""
+
+
+def _cache_key(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+def _response_key(model, prompt):
+    """(nama model untuk tracing, cache key) untuk satu generasi.
+
+    Client yang di-inject tanpa `model_name` (fake client testing, wrapper lain)
+    tidak bisa dibedakan dari model default, jadi key-nya None: response cache
+    dilewati supaya jawabannya tidak tercampur dengan jawaban Gemini asli di
+    `.llm_cache.sqlite3`.
+    """
+    if model is None:
+        model_name = MODEL_NAME
+    else:
+        model_name = getattr(model, 'model_name', None)
+        if not model_name:
+            return f"{type(model).__module__}.{type(model).__qualname__}", None
+    model_name = model_name.removeprefix('models/')
+    return model_name, _cache_key(model_name, prompt)
 
-def generate_job_profile_gemini(role, level, purpose, resps, comps):
+def _generate(final_prompt, model=None, timeout=None):
+    """generate_content lewat response cache.
+
+    `model` bisa diganti fake client (objek dengan `generate_content(prompt)` yang
+    mengembalikan objek ber-atribut `.text`) untuk testing offline; tanpa
+    `model_name` client itu tidak memakai response cache. Exception dibiarkan naik ke pemanggil, jadi pesan error tidak pernah masuk cache.
+    `timeout` (detik) diteruskan sebagai request timeout kalau diisi.
+    """
+    model_name, key = _response_key(model, final_prompt)
+
+    cached = response_cache.get(key) if key else None
+    if cached is not None:
+        return cached
+
+    model = model or genai.GenerativeModel(MODEL_NAME)
+    with span("gemini.generate_content", model=model_name):
+        if timeout is None:
+            text = model.generate_content(final_prompt).text
+        else:
+            text = model.generate_content(final_prompt, request_options={"timeout": timeout}).text
+    if text and key:
+        response_cache.set(key, text)
+    return text
+
+def _generate_stream(final_prompt, model=None, timeout=None, cancel=None):
+    """Versi streaming `_generate`: yield potongan teks begitu diterima dari model.
+
+    `cancel` (threading.Event) menghentikan stream di chunk berikutnya, dan
+    `timeout` (detik) adalah batas total satu generasi (TimeoutError). Hanya
+    respons yang selesai utuh yang masuk cache. Fake client untuk testing perlu
+    menerima `generate_content(prompt, stream=True, request_options=...)` dan
+    mengembalikan iterable objek ber-atribut `.text`.
+    """
+    model_name, key = _response_key(model, final_prompt)
+
+    cached = response_cache.get(key) if key else None
+    if cached is not None:
+        yield cached
+        return
+
+    timeout = LLM_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    model = model or genai.GenerativeModel(MODEL_NAME)
+    parts = []
+    with span("gemini.generate_content", model=model_name, stream=True):
+        start = time.perf_counter()
+        response = model.generate_content(final_prompt, stream=True, request_options={"timeout": timeout})
+        for chunk in response:
+            if cancel is not None and cancel.is_set():
+                return
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Gemini response exceeded {timeout:.0f}s")
+            piece = chunk.text
+            if not piece:
+                continue
+            if not parts:
+                observe("gemini.first_token", time.perf_counter() - start, model=model_name)
+            parts.append(piece)
+            yield piece
+
+    text = "".join(parts)
+    if text and key:
+        response_cache.set(key, text)
+
+def build_job_profile_prompt(role, level, purpose, resps, comps):
+    # Kita gabungkan input user jadi string biasa, biar AI yang memformatnya jadi bullet/bold
+    resps_str = ", ".join(resps) if resps else "(None provided, please suggest standard based on role)"
+    comps_str = ", ".join(comps) if comps else "(None provided, please suggest standard based on role)"
+    
+    return JOB_PROFILE_PROMPT.format(
+        role=role, 
+        level=level, 
+        purpose=purpose,
+        user_resps=resps_str,
+        user_comps=comps_str
+    )
+
+def build_candidate_prompt(candidate_row):
+    return CANDIDATE_INSIGHT_PROMPT.format(
+        name=candidate_row['fullname'],
+        # score_* float32 (scoring.compact_frame) dibulatkan ke presisi ROUND aslinya
+        match_rate=round(float(candidate_row['final_match_rate']), 2),
+        strengths=candidate_row['strengths_list'],
+        s_cog=round(float(candidate_row['score_cognitive']), 1),
+        s_mot=round(float(candidate_row['score_motivation']), 1),
+        s_lead=round(float(candidate_row['score_leadership']), 1)
+    )
+
+def build_shortlist_prompt(candidate_row, rank, top_match_rate):
+    """Prompt insight kandidat peringkat `rank` (1 = CANDIDATE_INSIGHT_PROMPT)"""
+    if rank == 1:
+        return build_candidate_prompt(candidate_row)
+    match_rate = round(float(candidate_row['final_match_rate']), 2)
+    top_rate = round(float(top_match_rate), 2)
+    return SHORTLIST_INSIGHT_PROMPT.format(
+        name=candidate_row['fullname'],
+        rank=rank,
+        match_rate=match_rate,
+        gap=round(top_rate - match_rate, 2),
+        top_rate=top_rate,
+        strengths=candidate_row['strengths_list'],
+        s_cog=round(float(candidate_row['score_cognitive']), 1),
+        s_mot=round(float(candidate_row['score_motivation']), 1),
+        s_lead=round(float(candidate_row['score_leadership']), 1)
+    )
+
+def generate_job_profile_gemini(role, level, purpose, resps, comps, model=None):
     """Memanggil Gemini API dengan format prompt baru"""
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Kita gabungkan input user jadi string biasa, biar AI yang memformatnya jadi bullet/bold
-        resps_str = ", ".join(resps) if resps else "(None provided, please suggest standard based on role)"
-        comps_str = ", ".join(comps) if comps else "(None provided, please suggest standard based on role)"
-        
-        final_prompt = JOB_PROFILE_PROMPT.format(
-            role=role, 
-            level=level, 
-            purpose=purpose,
-            user_resps=resps_str,
-            user_comps=comps_str
-        )
-        
-        response = model.generate_content(final_prompt)
-        return response.text
+        final_prompt = build_job_profile_prompt(role, level, purpose, resps, comps)
+        return _generate(final_prompt, model)
     except Exception as e:
         return f"⚠️ AI Error: {str(e)}"
 
-def generate_candidate_analysis(candidate_row):
+def generate_candidate_analysis(candidate_row, model=None):
     """Menganalisis Top Candidate"""
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        final_prompt = CANDIDATE_INSIGHT_PROMPT.format(
-            name=candidate_row['fullname'],
-            match_rate=candidate_row['final_match_rate'],
-            strengths=candidate_row['strengths_list'],
-            s_cog=candidate_row['score_cognitive'],
-            s_mot=candidate_row['score_motivation'],
-            s_lead=candidate_row['score_leadership']
-        )
-        
-        response = model.generate_content(final_prompt)
-        return response.text
+        final_prompt = build_candidate_prompt(candidate_row)
+        return _generate(final_prompt, model)
+    except Exception as e:
+        return f"⚠️ Analysis Error: {str(e)}"
+
+def stream_job_profile_gemini(role, level, purpose, resps, comps, model=None, timeout=None, cancel=None):
+    """Sama seperti generate_job_profile_gemini, tapi yield potongan teks"""
+    try:
+        final_prompt = build_job_profile_prompt(role, level, purpose, resps, comps)
+        yield from _generate_stream(final_prompt, model, timeout, cancel)
+    except Exception as e:
+        yield f"\n\n⚠️ AI Error: {str(e)}"
+
+def stream_candidate_analysis(candidate_row, model=None, timeout=None, cancel=None):
+    """Sama seperti generate_candidate_analysis, tapi yield potongan teks"""
+    try:
+        final_prompt = build_candidate_prompt(candidate_row)
+        yield from _generate_stream(final_prompt, model, timeout, cancel)
     except Exception as e:
-        return f"⚠️ Analysis Error: {str(e)}"
\ No newline at end of file
+        yield f"\n\n⚠️ Analysis Error: {str(e)}"
@@ -1,77 +1,69 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import numpy as np
 import pandas as pd
 import streamlit as st
 from sqlalchemy import text
-from config import get_db_engine
+from cache import TTLCache
+from config import (
+    get_db_engine, SCORING_ENGINE,
+    RANKING_CACHE_SIZE, RANKING_CACHE_TTL, RANKING_CACHE_VERSION_TTL,
+    HISTOGRAM_BINS, DB_PREPARED_STATEMENTS, BASELINE_AGGREGATES,
+    SCORING_SHARDS, SCORING_SHARD_WORKERS,
+)
+from cohorts import BENCHMARK_COHORTS, CUSTOM_COHORT, DEFAULT_COHORT, resolve_cohort, cohort_cache_key
+from scoring import (
+    CATEGORY_COLUMNS, FLOAT32_COLUMNS, FLOAT64_COLUMNS, baseline_from_row, build_score_frame, compact_frame,
+    compute_baseline, get_candidate_features, match_rate_histogram, rank_candidates,
+)
+from sharding import merge_top_k, rank_sharded
+from tracing import span, submit
 
 # --- SQL CTE LOGIC (FIXED: EXCLUDE BENCHMARK FROM RESULTS) ---
-MATCHING_QUERY = """
+MATCHING_CTE = """
 WITH 
 -- 1. FILTER BENCHMARK (Untuk menghitung Baseline)
+-- benchmark_members = cohort dari cohorts.py (atau ID custom), dievaluasi di server
+benchmark_members AS (
+    {benchmark_members}
+),
 selected_benchmarks AS (
-    SELECT DISTINCT employee_id 
-    FROM performance_yearly 
-    WHERE employee_id = ANY(:benchmark_ids) 
+    SELECT DISTINCT m.employee_id 
+    FROM benchmark_members m
+    WHERE EXISTS (SELECT 1 FROM performance_yearly py WHERE py.employee_id = m.employee_id)
 ),
--- 2. HITUNG BASELINE STATS
-benchmark_stats AS (
-    SELECT 
-        AVG(pp.iq) as base_iq,
-        AVG(pp.pauli) as base_pauli,
-        AVG(CASE WHEN ps.scale_code = 'Papi_N' THEN ps.score END) as base_papi_n,
-        AVG(CASE WHEN ps.scale_code = 'Papi_A' THEN ps.score END) as base_papi_a,
-        AVG(CASE WHEN ps.scale_code = 'Papi_L' THEN ps.score END) as base_papi_l,
-        AVG(CASE WHEN ps.scale_code = 'Papi_P' THEN ps.score END) as base_papi_p,
-        AVG(CASE WHEN ps.scale_code = 'Papi_I' THEN ps.score END) as base_papi_i,
-        AVG(CASE WHEN ps.scale_code = 'Papi_Z' THEN ps.score END) as base_papi_z,
-        AVG(CASE WHEN ps.scale_code = 'Papi_C' THEN ps.score END) as base_papi_c
+-- 2. FEATURE ROW BENCHMARK (dari tabel employee_features, lihat feature_store.py)
+benchmark_features AS (
+    SELECT f.*
     FROM selected_benchmarks sb
-    JOIN profiles_psych pp ON sb.employee_id = pp.employee_id
-    JOIN papi_scores ps ON sb.employee_id = ps.employee_id
+    JOIN employee_features f ON sb.employee_id = f.employee_id
 ),
--- 3. HITUNG BASELINE STRENGTHS
-benchmark_top_strengths AS (
-    SELECT ARRAY_AGG(theme) as base_themes
-    FROM (
-        SELECT s.theme
-        FROM selected_benchmarks sb
-        JOIN strengths s ON sb.employee_id = s.employee_id
-        WHERE s.rank <= 5
-        GROUP BY s.theme
-        ORDER BY COUNT(*) DESC
-        LIMIT 5
-    ) sub
-),
--- 4. DATA KANDIDAT (FILTER BARU: KECUALIKAN BENCHMARK)
+{benchmark_baseline}
+-- 5. DATA KANDIDAT (FILTER BARU: KECUALIKAN BENCHMARK)
 candidate_data AS (
-    SELECT 
-        e.employee_id, e.fullname, pp.iq, pp.pauli,
-        MAX(CASE WHEN ps.scale_code = 'Papi_N' THEN ps.score END) as papi_n,
-        MAX(CASE WHEN ps.scale_code = 'Papi_A' THEN ps.score END) as papi_a,
-        MAX(CASE WHEN ps.scale_code = 'Papi_L' THEN ps.score END) as papi_l,
-        MAX(CASE WHEN ps.scale_code = 'Papi_P' THEN ps.score END) as papi_p,
-        MAX(CASE WHEN ps.scale_code = 'Papi_I' THEN ps.score END) as papi_i,
-        MAX(CASE WHEN ps.scale_code = 'Papi_Z' THEN ps.score END) as papi_z,
-        MAX(CASE WHEN ps.scale_code = 'Papi_C' THEN ps.score END) as papi_c,
-        
-        ARRAY(SELECT theme FROM strengths s WHERE s.employee_id = e.employee_id ORDER BY rank ASC LIMIT 3) as top_3_strengths,
-        ARRAY(SELECT theme FROM strengths s WHERE s.employee_id = e.employee_id AND s.rank <= 5) as my_top_themes
-    FROM employees e
-    LEFT JOIN profiles_psych pp ON e.employee_id = pp.employee_id
-    LEFT JOIN papi_scores ps ON e.employee_id = ps.employee_id
+    SELECT f.*
+    FROM employee_features f
     
     -- LOGIC: Do not include Benchmark IDs in the candidate list
     -- This ensures the output shows the SUCCESSOR, not the person themselves.
-    WHERE e.employee_id <> ALL(:benchmark_ids)
-    
-    GROUP BY e.employee_id, e.fullname, pp.iq, pp.pauli
+    WHERE NOT EXISTS (SELECT 1 FROM benchmark_members m WHERE m.employee_id = f.employee_id)
+      -- Cohort kosong -> tidak ada baseline -> tidak ada ranking
+      AND EXISTS (SELECT 1 FROM benchmark_members)
+      {candidate_shard}
 ),
--- 5. MATCH SCORES
+-- 6. MATCH SCORES
 tv_scores AS (
     SELECT 
         c.employee_id, c.fullname, c.top_3_strengths,
         b.base_iq, b.base_pauli, b.base_papi_n, 
         
         c.iq, c.pauli, c.papi_n, c.papi_a, c.papi_l, c.papi_i, c.papi_z, c.papi_c,
+        c.role, c.division, c.department, c.directorate, c.job_level,
         
         CASE WHEN c.iq >= b.base_iq THEN 100 ELSE GREATEST(0, 100 - (((b.base_iq - c.iq)::numeric / NULLIF(b.base_iq,0)) * 100 * 1.5)) END as m_iq,
         CASE WHEN c.pauli >= b.base_pauli THEN 100 ELSE GREATEST(0, 100 - (((b.base_pauli - c.pauli)::numeric / NULLIF(b.base_pauli,0)) * 100)) END as m_pauli,
@@ -81,10 +73,10 @@ tv_scores AS (
         GREATEST(0, 100 - (ABS(COALESCE(c.papi_i,0) - b.base_papi_i) * 11.1)) as m_papi_i,
         GREATEST(0, 100 - (ABS(COALESCE(c.papi_z,0) - b.base_papi_z) * 11.1)) as m_papi_z,
         GREATEST(0, 100 - (ABS(COALESCE(c.papi_c,0) - b.base_papi_c) * 11.1)) as m_papi_c,
-        (SELECT COUNT(*) FROM UNNEST(c.my_top_themes) AS t WHERE t = ANY(bs.base_themes))::numeric / 5.0 * 100 as m_strengths_overlap
+        bit_count((c.top5_mask & bs.base_mask)::bit(64))::numeric / 5.0 * 100 as m_strengths_overlap
     FROM candidate_data c, benchmark_stats b, benchmark_top_strengths bs
 ),
--- 6. TGV GROUPING
+-- 7. TGV GROUPING
 tgv_scores AS (
     SELECT 
         *,
@@ -94,8 +86,9 @@ tgv_scores AS (
         (m_papi_z) as tgv_adaptability,
         (m_papi_c) as tgv_reliability
     FROM tv_scores
-)
--- 7. FINAL OUTPUT
+),
+-- 8. FINAL OUTPUT
+ranked AS (
 SELECT 
     t.employee_id, t.fullname, 
     array_to_string(t.top_3_strengths, ', ') as strengths_list,
@@ -129,49 +122,583 @@ SELECT
         ELSE 'Reliability'
     END as gap_tgv,
 
-    pos.name as role,
-    div.name as division,
-    dept.name as department,
-    dir.name as directorate,
-    gr.name as job_level
+    t.role, t.division, t.department, t.directorate, t.job_level
 
 FROM tgv_scores t
-JOIN employees e ON t.employee_id = e.employee_id
-LEFT JOIN dim_positions pos ON e.position_id = pos.position_id
-LEFT JOIN dim_divisions div ON e.division_id = div.division_id
-LEFT JOIN dim_departments dept ON e.department_id = dept.department_id
-LEFT JOIN dim_directorates dir ON e.directorate_id = dir.directorate_id
-LEFT JOIN dim_grades gr ON e.grade_id = gr.grade_id
-
-ORDER BY final_match_rate DESC
+)
+"""
+
+# Langkah 3-4: baseline dihitung dari anggota cohort (scan)...
+SCANNED_BASELINE = """
+-- 3. HITUNG BASELINE STATS
+-- (AVG(iq) dulu dihitung per baris PAPI hasil join -> bobot papi_rows menjaga hasil tetap sama)
+benchmark_stats AS (
+    SELECT 
+        SUM(f.iq * f.papi_rows)::numeric / NULLIF(SUM(CASE WHEN f.iq IS NOT NULL THEN f.papi_rows END), 0) as base_iq,
+        SUM(f.pauli * f.papi_rows)::numeric / NULLIF(SUM(CASE WHEN f.pauli IS NOT NULL THEN f.papi_rows END), 0) as base_pauli,
+        AVG(f.papi_n) as base_papi_n,
+        AVG(f.papi_a) as base_papi_a,
+        AVG(f.papi_l) as base_papi_l,
+        AVG(f.papi_p) as base_papi_p,
+        AVG(f.papi_i) as base_papi_i,
+        AVG(f.papi_z) as base_papi_z,
+        AVG(f.papi_c) as base_papi_c
+    FROM benchmark_features f
+    WHERE f.has_psych AND f.papi_rows > 0
+),
+-- 4. HITUNG BASELINE STRENGTHS (bitmask 5 tema paling sering, tie-break by bit)
+benchmark_top_strengths AS (
+    SELECT COALESCE(BIT_OR(1::bigint << sub.bit), 0) as base_mask
+    FROM (
+        SELECT t.bit
+        FROM benchmark_features f
+        JOIN dim_strength_themes t ON (f.top5_mask & (1::bigint << t.bit)) <> 0
+        GROUP BY t.bit
+        ORDER BY COUNT(*) DESC, t.bit
+        LIMIT 5
+    ) sub
+)
 """
 
-def get_ranked_talent(benchmark_ids_list):
+# ...atau, untuk cohort dengan agregat yang di-maintain trigger (feature_store.py,
+# cohorts.BENCHMARK_COHORTS[...]["aggregated"]), dibaca dari satu baris agregat.
+# LEFT JOIN: baris baseline tetap satu (NULL) walau agregat belum ada, sama
+# seperti benchmark_stats untuk cohort tanpa anggota.
+AGGREGATED_BASELINE = """
+-- 3. BASELINE STATS DARI RUNNING SUM / COUNT
+benchmark_stats AS (
+    SELECT
+        a.iq_sum / NULLIF(a.iq_weight, 0) as base_iq,
+        a.pauli_sum / NULLIF(a.pauli_weight, 0) as base_pauli,
+        a.papi_n_sum / NULLIF(a.papi_n_count, 0) as base_papi_n,
+        a.papi_a_sum / NULLIF(a.papi_a_count, 0) as base_papi_a,
+        a.papi_l_sum / NULLIF(a.papi_l_count, 0) as base_papi_l,
+        a.papi_p_sum / NULLIF(a.papi_p_count, 0) as base_papi_p,
+        a.papi_i_sum / NULLIF(a.papi_i_count, 0) as base_papi_i,
+        a.papi_z_sum / NULLIF(a.papi_z_count, 0) as base_papi_z,
+        a.papi_c_sum / NULLIF(a.papi_c_count, 0) as base_papi_c
+    FROM (SELECT 1) one
+    LEFT JOIN cohort_baseline_agg a ON a.cohort = '{cohort}'
+),
+-- 4. BASELINE STRENGTHS DARI JUMLAH ANGGOTA PER TEMA
+benchmark_top_strengths AS (
+    SELECT COALESCE(BIT_OR(1::bigint << sub.bit), 0) as base_mask
+    FROM (
+        SELECT tc.bit
+        FROM cohort_theme_counts tc
+        WHERE tc.cohort = '{cohort}' AND tc.members > 0
+        ORDER BY tc.members DESC, tc.bit
+        LIMIT 5
+    ) sub
+)
+"""
+
+# ...atau, untuk scoring per shard, baseline yang sudah dihitung sekali
+# (BASELINE_SELECT) dikirim sebagai parameter ke setiap shard.
+PARAM_BASELINE = """
+-- 3-4. BASELINE DARI PARAMETER (dihitung sekali untuk semua shard)
+benchmark_stats AS (
+    SELECT
+        CAST(:base_iq AS numeric) as base_iq,
+        CAST(:base_pauli AS numeric) as base_pauli,
+        CAST(:base_papi_n AS numeric) as base_papi_n,
+        CAST(:base_papi_a AS numeric) as base_papi_a,
+        CAST(:base_papi_l AS numeric) as base_papi_l,
+        CAST(:base_papi_p AS numeric) as base_papi_p,
+        CAST(:base_papi_i AS numeric) as base_papi_i,
+        CAST(:base_papi_z AS numeric) as base_papi_z,
+        CAST(:base_papi_c AS numeric) as base_papi_c
+),
+benchmark_top_strengths AS (
+    SELECT CAST(:base_mask AS bigint) as base_mask
+)
+"""
+
+# Kandidat shard ke-:shard dari :shards (hash employee_id)
+CANDIDATE_SHARD = "AND mod(abs(hashtext(f.employee_id::text)::bigint), :shards) = :shard"
+
+BASELINE_SELECT = """
+SELECT b.*, bs.base_mask
+FROM benchmark_stats b CROSS JOIN benchmark_top_strengths bs
+"""
+
+FULL_SELECT = """
+SELECT * FROM ranked
+ORDER BY final_match_rate DESC, employee_id
+"""
+
+# --- TOP-K MODE ---
+# Hanya N kandidat teratas yang dikirim ke Python; distribusi match rate
+# dihitung di database (width_bucket, range min..max seperti np.histogram),
+# jadi ukuran transfer konstan berapapun jumlah employee.
+TOP_K_SELECT = """,
+rate_range AS (
+    SELECT MIN(final_match_rate) as lo, MAX(final_match_rate) as hi, COUNT(*) as n
+    FROM ranked
+),
+histogram AS (
+    SELECT
+        CASE WHEN s.hi > s.lo
+             THEN LEAST(width_bucket(r.final_match_rate, s.lo, s.hi, :bins), :bins)
+             ELSE :bins / 2 + 1
+        END as bucket,
+        COUNT(*) as cnt
+    FROM ranked r CROSS JOIN rate_range s
+    GROUP BY 1
+),
+top_k AS (
+    SELECT * FROM ranked
+    ORDER BY final_match_rate DESC, employee_id
+    LIMIT :top_k
+)
+SELECT
+    k.*,
+    s.lo as hist_min, s.hi as hist_max, s.n as total_candidates,
+    (SELECT json_object_agg(bucket, cnt) FROM histogram) as hist_counts
+FROM top_k k CROSS JOIN rate_range s
+ORDER BY k.final_match_rate DESC, k.employee_id
+"""
+
+# Top-K per shard + jumlah kandidat per final_match_rate (2 desimal, maks. 10001
+# nilai) supaya histogram global bisa dihitung ulang persis setelah merge.
+SHARD_TOP_K_SELECT = """,
+top_k AS (
+    SELECT * FROM ranked
+    ORDER BY final_match_rate DESC, employee_id
+    LIMIT :top_k
+)
+SELECT
+    k.*,
+    (SELECT json_object_agg(r.final_match_rate, r.cnt)
+     FROM (SELECT final_match_rate, COUNT(*) as cnt FROM ranked GROUP BY 1) r) as rate_counts
+FROM top_k k
+ORDER BY k.final_match_rate DESC, k.employee_id
+"""
+
+# --- SCORE FRAME MODE ---
+# Skor m_* per variabel untuk SEMUA kandidat (belum diberi bobot TGV), urut
+# employee_id. Dipakai untuk re-weighting interaktif di Python (scoring.rerank).
+SCORES_SELECT = """
+SELECT
+    t.employee_id, t.fullname,
+    array_to_string(t.top_3_strengths, ', ') as strengths_list,
+    t.iq, t.pauli, t.papi_n, t.papi_a, t.papi_l, t.papi_i, t.papi_z, t.papi_c,
+    ROUND(t.base_iq, 0) as bench_iq,
+    ROUND(t.base_pauli, 0) as bench_pauli,
+    ROUND(t.base_papi_n, 1) as bench_papi_n,
+    t.role, t.division, t.department, t.directorate, t.job_level,
+    t.m_iq, t.m_pauli,
+    t.m_papi_n, t.m_papi_a, t.m_papi_l, t.m_papi_i, t.m_papi_z, t.m_papi_c,
+    t.m_strengths_overlap
+FROM tv_scores t
+ORDER BY t.employee_id
+"""
+
+def build_matching_query(cohort_sql, top_k=False, scores=False, aggregated_cohort=None,
+                         baseline_only=False, shard=False, param_baseline=False):
+    """MATCHING_CTE dengan benchmark cohort tertentu + select penuh / top-K / score frame.
+
+    aggregated_cohort: nama cohort yang baseline-nya dibaca dari cohort_baseline_agg
+    (lookup O(1)) alih-alih dihitung dari anggotanya.
+    baseline_only: hanya satu baris baseline (dipakai sebagai parameter shard / score frame).
+    shard: kandidat shard :shard dari :shards, baseline dari parameter (PARAM_BASELINE).
+    param_baseline: baseline dari parameter tanpa sharding.
+    """
+    if shard or param_baseline:
+        baseline = PARAM_BASELINE
+    elif aggregated_cohort:
+        baseline = AGGREGATED_BASELINE.replace("{cohort}", aggregated_cohort)
+    else:
+        baseline = SCANNED_BASELINE
+    cte = MATCHING_CTE.replace("{benchmark_members}", cohort_sql.strip())
+    cte = cte.replace("{benchmark_baseline}", baseline.strip() + ",")
+    cte = cte.replace("{candidate_shard}", CANDIDATE_SHARD if shard else "")
+    if baseline_only:
+        return cte + BASELINE_SELECT
+    if scores:
+        return cte + SCORES_SELECT
+    if shard:
+        return cte + (SHARD_TOP_K_SELECT if top_k else FULL_SELECT)
+    return cte + (TOP_K_SELECT if top_k else FULL_SELECT)
+
+# Versi dengan benchmark ID custom (:benchmark_ids)
+MATCHING_QUERY = build_matching_query(BENCHMARK_COHORTS[CUSTOM_COHORT]["sql"])
+TOP_K_QUERY = build_matching_query(BENCHMARK_COHORTS[CUSTOM_COHORT]["sql"], top_k=True)
+
+# --- RANKING CACHE ---
+# Key = scoring engine + top_k + cohort (ID custom di-sort & dedup; kosong = auto-benchmark).
+# Setiap entry membawa data version; kalau source tables berubah, entry lama
+# otomatis jadi miss sehingga hasil basi tidak pernah keluar.
+ranking_cache = TTLCache(maxsize=RANKING_CACHE_SIZE, ttl=RANKING_CACHE_TTL)
+
+# Versi data yang dibaca MATCHING_QUERY: counter per tabel sumber yang dinaikkan
+# trigger (migrations.py, migration 2), jadi probe = lookup beberapa baris.
+DATA_VERSION_QUERY = """
+SELECT string_agg(source || '=' || version, ',' ORDER BY source) as data_version
+FROM data_versions
+"""
+
+_data_version = {"value": None, "checked_at": 0.0, "counters": None}
+_data_version_lock = threading.Lock()
+
+def get_data_version(conn):
+    """Data version stamp; di-probe ulang paling cepat tiap RANKING_CACHE_VERSION_TTL detik.
+
+    Tanpa tabel data_versions (migration belum dijalankan) versi tidak bisa
+    dipercaya, jadi setiap probe menghasilkan versi baru (ranking cache SQL
+    selalu miss) alih-alih mengembalikan hasil basi.
+    """
+    with _data_version_lock:
+        now = time.monotonic()
+        if _data_version["value"] is None or now - _data_version["checked_at"] >= RANKING_CACHE_VERSION_TTL:
+            with span("query.data_version"):
+                if not _data_version["counters"]:
+                    _data_version["counters"] = conn.execute(text("SELECT to_regclass('data_versions') IS NOT NULL")).scalar()
+                if _data_version["counters"]:
+                    _data_version["value"] = conn.execute(text(DATA_VERSION_QUERY)).scalar()
+                else:
+                    _data_version["value"] = f"unversioned:{now}"
+            _data_version["checked_at"] = now
+        return _data_version["value"]
+
+def get_ranking_cache_stats():
+    """Counter hit/miss/eviction ranking cache (untuk monitoring)"""
+    return ranking_cache.stats()
+
+def normalize_benchmark(benchmark_ids_list, cohort=None, cohort_params=None):
+    """(cohort, cohort_params) kanonik: ID custom di-strip, dedup & sort; kosong = cohort (default High Performer)"""
+    clean_ids = [x.strip() for x in benchmark_ids_list or [] if x.strip()]
+    if clean_ids:
+        return CUSTOM_COHORT, {"benchmark_ids": sorted(set(clean_ids))}
+    # Jika user KOSONGKAN input, benchmark = cohort High Performer
+    return cohort or DEFAULT_COHORT, cohort_params
+
+def aggregated_cohort(cohort):
+    """Nama cohort kalau baseline-nya bisa dibaca dari cohort_baseline_agg, selain itu None"""
+    if BASELINE_AGGREGATES and BENCHMARK_COHORTS.get(cohort, {}).get("aggregated"):
+        return cohort
+    return None
+
+def get_ranked_talent(benchmark_ids_list, scoring_engine=None, top_k=None, cohort=None, cohort_params=None):
+    """Ranking kandidat vs benchmark.
+
+    scoring_engine: "sql" (MATCHING_QUERY di Postgres) atau "memory" (scoring.py,
+    feature matrix di-cache sekali lalu dihitung dengan NumPy). Default dari config.
+
+    top_k: kalau diisi, hanya N baris teratas yang dikembalikan; histogram
+    match rate seluruh kandidat ada di `df.attrs["histogram"]` (counts, bin_edges)
+    dan jumlah kandidat di `df.attrs["total_candidates"]`.
+
+    cohort / cohort_params: benchmark otomatis saat `benchmark_ids_list` kosong
+    (lihat cohorts.BENCHMARK_COHORTS; default semua High Performer).
+
+    SCORING_SHARDS > 1: kandidat di-score per shard secara paralel lalu digabung
+    (sharding.py / _get_ranked_talent_sql_sharded); hasil identik.
+
+    Hasil di-cache (lihat `ranking_cache`); DataFrame yang dikembalikan dipakai
+    bersama antar session, jadi jangan dimodifikasi in-place. Dtype ringkas:
+    dimensi = category, skor tampilan = float32 (lihat scoring.compact_frame).
+    """
+    scoring_engine = scoring_engine or SCORING_ENGINE
+    cohort, cohort_params = normalize_benchmark(benchmark_ids_list, cohort, cohort_params)
+    cache_key = (scoring_engine, top_k, cohort_cache_key(cohort, cohort_params))
+
+    if scoring_engine == "memory":
+        with span("query.feature_matrix"):
+            features = get_candidate_features()
+        version = features.attrs.get("loaded_at")
+        cached = ranking_cache.get(cache_key, version=version)
+        if cached is not None:
+            return cached
+        with span("query.memory_rank", cohort=cohort):
+            result = _get_ranked_talent_memory(features, cohort, cohort_params, top_k)
+        ranking_cache.set(cache_key, result, version=version)
+        return result
+
     engine = get_db_engine()
-    clean_ids = [x.strip() for x in benchmark_ids_list if x.strip()]
-    
     with engine.connect() as conn:
-        if not clean_ids:
-            # Jika user KOSONGKAN input, kita cari semua High Performer
-            fallback_query = text("SELECT DISTINCT employee_id FROM performance_yearly WHERE rating = 5")
-            df_fallback = pd.read_sql(fallback_query, conn)
-            clean_ids = df_fallback['employee_id'].tolist()
-            
-            if not clean_ids:
-                return pd.DataFrame(), False
-            
-            is_fallback = True
-            # In fallback mode, we DO NOT need to exclude anyone
-            # because the benchmark is taken from the general population, not specific individuals.
-            # However, our SQL query already includes a `WHERE <> ALL(...)` clause.
-            # The trick: Should we pass an empty exclude list when in fallback mode?
-            # NO. It is safer to let the query continue excluding those benchmark IDs
-            # (meaning a High Performer won’t appear in their own ranking).
-            # This makes sense: We are looking for “The Next Stars,” not “The Current Stars.”
+        version = get_data_version(conn)
+        cached = ranking_cache.get(cache_key, version=version)
+        if cached is not None:
+            return cached
+        if SCORING_SHARDS <= 1:
+            with span("query.sql_rank", cohort=cohort):
+                result = _get_ranked_talent_sql(conn, cohort, cohort_params, top_k)
+    if SCORING_SHARDS > 1:
+        # Koneksi probe versi sudah kembali ke pool: satu request memegang paling
+        # banyak satu koneksi per shard yang berjalan, tidak pernah shards + 1
+        with span("query.sql_rank", cohort=cohort):
+            result = _get_ranked_talent_sql_sharded(engine, cohort, cohort_params, top_k)
+
+    ranking_cache.set(cache_key, result, version=version)
+    return result
+
+# --- SERVER-SIDE PREPARED STATEMENTS ---
+# psycopg2 tidak punya prepared statement otomatis, jadi MATCHING_QUERY di-PREPARE
+# manual sekali per koneksi pool (nama statement = hash teks query, jadi tiap
+# varian cohort / top-k punya plan sendiri). Koneksi yang di-recycle pool
+# membawa `info` baru, jadi statement otomatis di-PREPARE ulang.
+_BIND_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+def _positional(sql):
+    """Ubah :name -> $n; mengembalikan (sql, urutan nama parameter)"""
+    names = []
+    def replace(match):
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+    return _BIND_PARAM.sub(replace, sql), names
+
+def execute_prepared(conn, sql, params):
+    """Jalankan `sql` lewat PREPARE/EXECUTE di koneksi ini"""
+    name = "talent_" + hashlib.sha1(sql.encode("utf-8")).hexdigest()[:16]
+    prepared = conn.connection.info.setdefault("prepared_statements", {})
+    names = prepared.get(name)
+    if names is None:
+        positional_sql, names = _positional(sql)
+        conn.exec_driver_sql(f"PREPARE {name} AS {positional_sql}")
+        prepared[name] = names
+    if not names:
+        return conn.execute(text(f"EXECUTE {name}"))
+    args = ", ".join(f":{n}" for n in names)
+    return conn.execute(text(f"EXECUTE {name}({args})"), {n: params[n] for n in names})
 
+def fetch_frame(result):
+    """Result set -> DataFrame, dibangun per kolom langsung dalam dtype akhirnya.
+
+    Satu transpose rows -> kolom, lalu NUMERIC/Decimal -> float32 / float64 dan
+    dimensi -> category tanpa DataFrame object-dtype di tengah (lihat scoring.compact_frame).
+    """
+    columns = list(result.keys())
+    rows = result.fetchall()
+    if not rows:
+        return compact_frame(pd.DataFrame(columns=columns))
+    data = {}
+    for name, values in zip(columns, zip(*rows)):
+        if name in FLOAT32_COLUMNS:
+            # None -> NaN, Decimal -> float
+            data[name] = np.array(values, dtype=np.float32)
+        elif name in FLOAT64_COLUMNS:
+            data[name] = np.array(values, dtype=np.float64)
+        elif name in CATEGORY_COLUMNS:
+            data[name] = pd.Categorical(values)
         else:
-            is_fallback = False
+            data[name] = np.array(values, dtype=object)
+    return pd.DataFrame(data, columns=columns)
 
-        df = pd.read_sql(text(MATCHING_QUERY), conn, params={"benchmark_ids": clean_ids})
-        
-    return df, is_fallback
\ No newline at end of file
+def _get_ranked_talent_sql(conn, cohort, cohort_params=None, top_k=None):
+    # Cohort dievaluasi di dalam MATCHING_QUERY (semi-join untuk baseline,
+    # anti-join untuk mengecualikan benchmark dari kandidat).
+    # In fallback mode the cohort members are still excluded from the ranking:
+    # we are looking for “The Next Stars,” not “The Current Stars.”
+    is_fallback = cohort != CUSTOM_COHORT
+    cohort_sql, params = resolve_cohort(cohort, cohort_params)
+
+    if top_k is not None:
+        params = {**params, "top_k": int(top_k), "bins": HISTOGRAM_BINS}
+    query = build_matching_query(cohort_sql, top_k=top_k is not None, aggregated_cohort=aggregated_cohort(cohort))
+
+    # Eksekusi dan fetch + pembentukan DataFrame (per kolom) diukur terpisah
+    with span("query.matching_query"):
+        if DB_PREPARED_STATEMENTS:
+            result = execute_prepared(conn, query, params)
+        else:
+            result = conn.execute(text(query), params)
+    with span("query.dataframe_build"):
+        df = fetch_frame(result)
+        if top_k is not None:
+            df = _attach_server_histogram(df)
+
+    if df.empty and is_fallback:
+        # Tidak ada High Performer sama sekali
+        return pd.DataFrame(), False
+    return df, is_fallback
+
+def _attach_server_histogram(df):
+    """Pindahkan kolom histogram hasil TOP_K_QUERY ke df.attrs"""
+    hist_cols = ["hist_min", "hist_max", "total_candidates", "hist_counts"]
+    if df.empty:
+        df = df.drop(columns=hist_cols, errors="ignore")
+        df.attrs["histogram"] = (np.zeros(HISTOGRAM_BINS, dtype=int), np.linspace(0, 1, HISTOGRAM_BINS + 1))
+        df.attrs["total_candidates"] = 0
+        return df
+
+    first = df.iloc[0]
+    raw = first["hist_counts"]
+    raw = json.loads(raw) if isinstance(raw, str) else (raw or {})
+    df = df.drop(columns=hist_cols).reset_index(drop=True)
+    return _set_histogram(df, first["hist_min"], first["hist_max"], raw, first["total_candidates"])
+
+def _set_histogram(df, lo, hi, raw, total):
+    """df.attrs histogram dari {bucket (1..HISTOGRAM_BINS): count} dan range min..max"""
+    lo, hi = float(lo), float(hi)
+    if hi <= lo:
+        # Sama seperti np.histogram untuk data dengan satu nilai
+        lo, hi = lo - 0.5, hi + 0.5
+    counts = np.zeros(HISTOGRAM_BINS, dtype=int)
+    for bucket, cnt in raw.items():
+        counts[int(bucket) - 1] = int(cnt)
+    df.attrs["histogram"] = (counts, np.linspace(lo, hi, HISTOGRAM_BINS + 1))
+    df.attrs["total_candidates"] = int(total)
+    return df
+
+# --- SHARDED SQL SCORING ---
+# Baseline dihitung sekali (BASELINE_SELECT), lalu SCORING_SHARDS query paralel di
+# koneksi pool terpisah, masing-masing hanya men-score kandidat shard-nya
+# (hash employee_id). Top-K digabung dengan heap merge (sharding.merge_top_k);
+# histogram dihitung ulang dari jumlah kandidat per match rate dengan aritmetika
+# width_bucket yang sama seperti TOP_K_SELECT, jadi hasilnya identik.
+def _rate_buckets(rate_counts):
+    """{rate (Decimal): count} -> (lo, hi, {bucket: count}) ala rate_range + width_bucket"""
+    lo, hi = min(rate_counts), max(rate_counts)
+    buckets = {}
+    for rate, cnt in rate_counts.items():
+        if hi > lo:
+            # floor((rate - lo) * bins / (hi - lo)) + 1, eksak dengan Decimal
+            bucket = min(int((rate - lo) * HISTOGRAM_BINS // (hi - lo)) + 1, HISTOGRAM_BINS)
+        else:
+            bucket = HISTOGRAM_BINS // 2 + 1
+        buckets[bucket] = buckets.get(bucket, 0) + cnt
+    return lo, hi, buckets
+
+def _get_ranked_talent_sql_sharded(engine, cohort, cohort_params=None, top_k=None, shards=None):
+    is_fallback = cohort != CUSTOM_COHORT
+    shards = shards or SCORING_SHARDS
+    cohort_sql, params = resolve_cohort(cohort, cohort_params)
+
+    with span("query.shard_baseline"), engine.connect() as conn:
+        baseline_query = build_matching_query(cohort_sql, baseline_only=True, aggregated_cohort=aggregated_cohort(cohort))
+        baseline = dict(conn.execute(text(baseline_query), params).mappings().one())
+
+    query = build_matching_query(cohort_sql, top_k=top_k is not None, shard=True)
+    shard_params = {**params, **baseline, "shards": shards}
+    if top_k is not None:
+        shard_params["top_k"] = int(top_k)
+
+    def run_shard(shard):
+        with span("query.shard", shard=shard), engine.connect() as conn:
+            values = {**shard_params, "shard": shard}
+            if DB_PREPARED_STATEMENTS:
+                return fetch_frame(execute_prepared(conn, query, values))
+            return fetch_frame(conn.execute(text(query), values))
+
+    # Satu koneksi pool per shard yang berjalan bersamaan
+    with ThreadPoolExecutor(max_workers=min(shards, SCORING_SHARD_WORKERS or shards)) as pool:
+        frames = [f.result() for f in [submit(pool, run_shard, s) for s in range(shards)]]
+
+    with span("query.shard_merge"):
+        rate_counts = {}
+        for frame in frames:
+            # FULL_SELECT (tanpa top_k) tidak punya rate_counts
+            if top_k is not None and not frame.empty:
+                raw = frame["rate_counts"].iloc[0]
+                raw = json.loads(raw) if isinstance(raw, str) else raw
+                for rate, cnt in raw.items():
+                    rate = Decimal(str(rate))
+                    rate_counts[rate] = rate_counts.get(rate, 0) + int(cnt)
+        frames = [f.drop(columns=["rate_counts"], errors="ignore") for f in frames]
+        df = compact_frame(merge_top_k(frames, top_k))
+
+    if df.empty:
+        if is_fallback:
+            return pd.DataFrame(), False
+        if top_k is not None:
+            df = _attach_server_histogram(df)
+        return df, is_fallback
+    if top_k is not None:
+        lo, hi, buckets = _rate_buckets(rate_counts)
+        df = _set_histogram(df, lo, hi, buckets, sum(rate_counts.values()))
+    return df, is_fallback
+
+def _memory_cohort_ids(features, cohort, cohort_params=None):
+    """ID anggota cohort untuk jalur in-memory"""
+    if cohort == CUSTOM_COHORT:
+        clean_ids = list(cohort_params["benchmark_ids"])
+    elif cohort == DEFAULT_COHORT:
+        # Fallback yang sama: semua High Performer (rating 5), sudah ada di feature matrix
+        clean_ids = features.loc[features['is_high_performer'], 'employee_id'].tolist()
+    else:
+        # Cohort lain cukup diambil ID-nya sekali (bukan scoring) dari database
+        cohort_sql, params = resolve_cohort(cohort, cohort_params)
+        with span("query.cohort_members", cohort=cohort), get_db_engine().connect() as conn:
+            clean_ids = [row[0] for row in conn.execute(text(cohort_sql), params)]
+    return clean_ids
+
+def _get_ranked_talent_memory(features, cohort, cohort_params=None, top_k=None):
+    """Jalur in-memory: hasil sama dengan MATCHING_QUERY tanpa round trip ke DB"""
+    is_fallback = cohort != CUSTOM_COHORT
+    clean_ids = _memory_cohort_ids(features, cohort, cohort_params)
+    if is_fallback and not clean_ids:
+        return pd.DataFrame(), False
+
+    if SCORING_SHARDS > 1:
+        df = rank_sharded(features, clean_ids, SCORING_SHARDS, top_k=top_k,
+                          workers=SCORING_SHARD_WORKERS or None, bins=HISTOGRAM_BINS)
+        return df, is_fallback
+
+    df = rank_candidates(features, clean_ids)
+    if top_k is None:
+        return compact_frame(df), is_fallback
+
+    histogram = match_rate_histogram(df['final_match_rate'], HISTOGRAM_BINS)
+    top_df = compact_frame(df.head(int(top_k)).reset_index(drop=True))
+    top_df.attrs["histogram"] = histogram
+    top_df.attrs["total_candidates"] = len(df)
+    return top_df, is_fallback
+
+def get_match_scores(benchmark_ids_list, scoring_engine=None, cohort=None, cohort_params=None):
+    """Score frame (scoring.SCORE_FRAME_COLUMNS) semua kandidat vs benchmark.
+
+    Mengembalikan (DataFrame, is_fallback). Berbeda dengan get_ranked_talent,
+    bobot TGV belum diterapkan: pakai scoring.rerank(scores, weights) untuk
+    ranking dengan bobot apa pun tanpa query ulang. Baseline NUMERIC ada di
+    `df.attrs["baseline"]`, jadi rerank dengan bobot default identik dengan
+    get_ranked_talent. Di-cache di ranking_cache.
+    """
+    scoring_engine = scoring_engine or SCORING_ENGINE
+    cohort, cohort_params = normalize_benchmark(benchmark_ids_list, cohort, cohort_params)
+    is_fallback = cohort != CUSTOM_COHORT
+    cache_key = ("scores", scoring_engine, cohort_cache_key(cohort, cohort_params))
+
+    if scoring_engine == "memory":
+        with span("query.feature_matrix"):
+            features = get_candidate_features()
+        version = features.attrs.get("loaded_at")
+        cached = ranking_cache.get(cache_key, version=version)
+        if cached is not None:
+            return cached
+        with span("query.memory_scores", cohort=cohort):
+            ids = _memory_cohort_ids(features, cohort, cohort_params)
+            if is_fallback and not ids:
+                result = (pd.DataFrame(), False)
+            else:
+                cand = features[~features["employee_id"].isin(set(ids))]
+                result = (compact_frame(build_score_frame(cand, compute_baseline(features, ids))), is_fallback)
+        ranking_cache.set(cache_key, result, version=version)
+        return result
+
+    cohort_sql, params = resolve_cohort(cohort, cohort_params)
+    # Baseline dulu (satu baris), lalu score frame dengan baseline itu sebagai
+    # parameter: nilai NUMERIC-nya ikut di df.attrs["baseline"] untuk rerank
+    baseline_query = build_matching_query(cohort_sql, baseline_only=True, aggregated_cohort=aggregated_cohort(cohort))
+    query = build_matching_query(cohort_sql, scores=True, param_baseline=True)
+    with get_db_engine().connect() as conn:
+        version = get_data_version(conn)
+        cached = ranking_cache.get(cache_key, version=version)
+        if cached is not None:
+            return cached
+        with span("query.match_scores", cohort=cohort):
+            baseline = dict(conn.execute(text(baseline_query), params).mappings().one())
+            values = {**params, **baseline}
+            if DB_PREPARED_STATEMENTS:
+                rows = execute_prepared(conn, query, values)
+            else:
+                rows = conn.execute(text(query), values)
+            # m_* langsung float64 (bukan Decimal), supaya rerank cukup operasi array
+            df = fetch_frame(rows)
+            df.attrs["baseline"] = baseline_from_row(baseline)
+
+    result = (pd.DataFrame(), False) if df.empty and is_fallback else (df, is_fallback)
+    ranking_cache.set(cache_key, result, version=version)
+    return result
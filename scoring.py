@@ -0,0 +1,664 @@
+import time
+from decimal import ROUND_HALF_UP, Context, Decimal, localcontext
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+# --- IN-MEMORY SCORING ENGINE ---
+# Mirrors MATCHING_QUERY (query.py) step by step, but runs on a feature matrix
+# that is loaded once, so changing the benchmark never touches the database.
+
+PAPI_SCALES = ["n", "a", "l", "p", "i", "z", "c"]
+TGV_GROUPS = ["cognitive", "motivation", "leadership", "adaptability", "reliability"]
+TGV_WEIGHTS = {
+    "cognitive": 0.30,
+    "motivation": 0.25,
+    "leadership": 0.20,
+    "adaptability": 0.15,
+    "reliability": 0.10,
+}
+IQ_PENALTY = 1.5
+PAULI_PENALTY = 1.0
+PAPI_PENALTY = 11.1
+TOP_THEMES = 5
+
+# One row per employee from the precomputed employee_features table
+# (feature_store.py), plus the flags needed to reproduce `selected_benchmarks`
+# and the auto-benchmark fallback.
+FEATURE_COLUMNS_SQL = """
+SELECT
+    f.employee_id, f.fullname, f.iq, f.pauli, f.has_psych, f.papi_rows,
+    f.papi_n, f.papi_a, f.papi_l, f.papi_p, f.papi_i, f.papi_z, f.papi_c,
+    f.top_3_strengths, f.top5_mask,
+    EXISTS (SELECT 1 FROM performance_yearly py WHERE py.employee_id = f.employee_id) as has_performance,
+    EXISTS (SELECT 1 FROM performance_yearly py WHERE py.employee_id = f.employee_id AND py.rating = 5) as is_high_performer,
+    f.role, f.division, f.department, f.directorate, f.job_level
+FROM employee_features f
+"""
+
+FEATURE_QUERY = FEATURE_COLUMNS_SQL + "ORDER BY f.employee_id"
+
+# Hanya benchmark (ID tertentu dan/atau semua High Performer) untuk baseline batch
+BENCHMARK_FEATURE_QUERY = FEATURE_COLUMNS_SQL + """
+WHERE f.employee_id = ANY(:benchmark_ids)
+   OR (:include_high_performers AND EXISTS (
+        SELECT 1 FROM performance_yearly py WHERE py.employee_id = f.employee_id AND py.rating = 5))
+ORDER BY f.employee_id
+"""
+
+RESULT_COLUMNS = [
+    "employee_id", "fullname", "strengths_list",
+    "score_cognitive", "score_motivation", "score_leadership", "score_adaptability", "score_reliability",
+    "iq", "pauli", "papi_n", "papi_a", "papi_l", "papi_i", "papi_z", "papi_c",
+    "bench_iq", "bench_pauli", "bench_papi_n",
+    "final_match_rate", "top_tgv", "gap_tgv",
+    "role", "division", "department", "directorate", "job_level",
+]
+
+# m_* yang dipakai TGV (papi_p ikut di baseline tapi tidak di skor mana pun)
+MATCH_SCORE_COLUMNS = [
+    "m_iq", "m_pauli", "m_papi_n", "m_papi_a", "m_papi_l", "m_papi_i", "m_papi_z", "m_papi_c",
+    "m_strengths_overlap",
+]
+
+# Per-kandidat: kolom output yang tidak bergantung bobot TGV + skor m_* mentah.
+# Disimpan per session supaya bobot bisa diganti tanpa query ulang (lihat rerank).
+SCORE_FRAME_COLUMNS = [
+    "employee_id", "fullname", "strengths_list",
+    "iq", "pauli", "papi_n", "papi_a", "papi_l", "papi_i", "papi_z", "papi_c",
+    "bench_iq", "bench_pauli", "bench_papi_n",
+    "role", "division", "department", "directorate", "job_level",
+] + MATCH_SCORE_COLUMNS
+
+# Dtype ringkas untuk frame hasil yang disimpan per session / di ranking cache:
+# nama dimensi yang berulang -> category, skor tampilan -> float32 (NULL tetap NaN).
+# Keduanya dipetakan langsung ke Arrow (dictionary / float32) oleh st.dataframe.
+# Input, m_* dan final_match_rate tetap float64: rerank / ExactTGV menghitung
+# ulang TGV dari kolom ini dan error float32 (~1e-5) melewati _EXACT_TOLERANCE.
+CATEGORY_COLUMNS = ["role", "division", "department", "directorate", "job_level", "top_tgv", "gap_tgv"]
+FLOAT32_COLUMNS = [f"score_{g}" for g in TGV_GROUPS] + ["bench_iq", "bench_pauli", "bench_papi_n"]
+FLOAT64_COLUMNS = [
+    "iq", "pauli", "papi_n", "papi_a", "papi_l", "papi_i", "papi_z", "papi_c", "final_match_rate",
+] + MATCH_SCORE_COLUMNS
+
+
+def compact_frame(df):
+    """Frame hasil dengan dtype ringkas (category / float32 / float64; Decimal -> float). attrs ikut"""
+    dtypes = {col: "category" for col in CATEGORY_COLUMNS if col in df.columns}
+    dtypes.update({col: np.float32 for col in FLOAT32_COLUMNS if col in df.columns})
+    dtypes.update({col: np.float64 for col in FLOAT64_COLUMNS if col in df.columns})
+    compact = df.astype(dtypes)
+    compact.attrs = dict(df.attrs)
+    return compact
+
+
+def _sql_round(values, decimals):
+    """ROUND() ala Postgres numeric (half away from zero), bukan banker's rounding numpy"""
+    factor = 10.0 ** decimals
+    values = np.asarray(values, dtype=float)
+    return np.sign(values) * np.floor(np.abs(values) * factor + 0.5) / factor
+
+
+# --- EXACT NUMERIC (PARITY DENGAN POSTGRES) ---
+# Kolom MATCHING_QUERY bertipe NUMERIC: hasil bagi dibulatkan ke skala
+# select_div_scale() Postgres (min. 16 digit signifikan), ROUND() half away from
+# zero. Float64 cukup untuk hampir semua baris; baris yang hasilnya bisa beda
+# (nilai dekat batas .5 pembulatan, atau TGV yang seri) dihitung ulang dengan
+# Decimal, langkah demi langkah seperti SQL (lihat ExactTGV).
+_NUMERIC = Context(prec=200, rounding=ROUND_HALF_UP)
+# Selisih float64 vs NUMERIC jauh di bawah ini
+_EXACT_TOLERANCE = 1e-6
+_ZERO = Decimal(0)
+_HUNDRED = Decimal(100)
+
+
+def _dec(value):
+    """Nilai kolom -> Decimal (None untuk NULL / NaN); float lewat repr terpendeknya"""
+    if value is None or (isinstance(value, (float, np.floating)) and np.isnan(value)):
+        return None
+    if isinstance(value, Decimal):
+        return None if value.is_nan() else value
+    return Decimal(str(value))
+
+
+def _numeric_scale(value):
+    return max(0, -value.as_tuple().exponent)
+
+
+def _numeric_weight(value):
+    """(weight, digit pertama) representasi base-10000 NUMERIC Postgres"""
+    if value == 0:
+        return 0, 0
+    weight = value.adjusted() // 4
+    return weight, int(_NUMERIC.scaleb(_NUMERIC.abs(value), -4 * weight))
+
+
+def numeric_div(a, b):
+    """a / b seperti numeric_div Postgres: skala select_div_scale(), half away from zero"""
+    weight_a, digit_a = _numeric_weight(a)
+    weight_b, digit_b = _numeric_weight(b)
+    qweight = weight_a - weight_b - (1 if digit_a <= digit_b else 0)
+    scale = min(max(16 - qweight * 4, _numeric_scale(a), _numeric_scale(b), 0), 1000)
+
+    num_a, den_a = a.as_integer_ratio()
+    num_b, den_b = b.as_integer_ratio()
+    num, den = num_a * den_b * 10 ** scale, den_a * num_b
+    quotient, remainder = divmod(abs(num), abs(den))
+    if 2 * remainder >= abs(den):
+        quotient += 1
+    if (num < 0) != (den < 0):
+        quotient = -quotient
+    return _NUMERIC.scaleb(Decimal(quotient), -scale)
+
+
+def numeric_round(value, decimals):
+    """ROUND(numeric, decimals)"""
+    return _NUMERIC.quantize(value, Decimal(1).scaleb(-decimals))
+
+
+def _greatest_zero(value):
+    # GREATEST(0, x): 0 kecuali x lebih besar (NULL -> 0)
+    return value if value is not None and value > 0 else _ZERO
+
+
+def _near_half(values, decimals):
+    """Nilai yang pembulatannya tidak bisa diputuskan float64 (dekat batas .5)"""
+    scaled = np.abs(values) * 10.0 ** decimals
+    return np.abs(scaled - np.floor(scaled) - 0.5) < _EXACT_TOLERANCE
+
+
+def _near_tie(tgv):
+    """TGV tertinggi / terendah yang (hampir) seri -> label top / gap perlu nilai eksak"""
+    ordered = np.sort(tgv, axis=-1)
+    return ((ordered[..., -1] - ordered[..., -2]) < _EXACT_TOLERANCE) | ((ordered[..., 1] - ordered[..., 0]) < _EXACT_TOLERANCE)
+
+
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(masks):
+    """Jumlah bit 1 per elemen array int64 (shape dipertahankan)"""
+    masks = np.ascontiguousarray(masks, dtype=np.int64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(masks).astype(np.int64)
+    flat = np.atleast_1d(masks).reshape(-1)
+    counts = _BYTE_POPCOUNT[flat.view(np.uint8).reshape(-1, 8)].sum(axis=1, dtype=np.int64)
+    return counts.reshape(masks.shape)
+
+
+def top_theme_mask(masks, k=TOP_THEMES):
+    """Bitmask dari k theme yang paling sering muncul di kumpulan mask"""
+    masks = np.asarray(masks, dtype=np.int64)
+    if masks.size == 0:
+        return 0
+    bits = np.arange(63, dtype=np.int64)
+    counts = ((masks[:, None] >> bits) & 1).sum(axis=0)
+    order = np.lexsort((bits, -counts))
+    top_bits = [int(b) for b in order[:k] if counts[b] > 0]
+    return sum(1 << b for b in top_bits)
+
+
+def prepare_features(df):
+    """Normalisasi hasil FEATURE_QUERY jadi matrix siap pakai (numeric float + list themes)"""
+    df = df.copy()
+    for col in ["iq", "pauli"] + [f"papi_{s}" for s in PAPI_SCALES]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+    df["papi_rows"] = df["papi_rows"].fillna(0).astype(int)
+    df["top5_mask"] = df["top5_mask"].fillna(0).astype(np.int64)
+    # array_to_string() melewati NULL
+    df["top_3_strengths"] = df["top_3_strengths"].apply(lambda v: [t for t in v if t is not None] if isinstance(v, (list, tuple, np.ndarray)) else [])
+    return df.reset_index(drop=True)
+
+
+def load_candidate_features(conn):
+    """Ambil feature matrix semua employee dalam satu query"""
+    df = prepare_features(pd.read_sql(text(FEATURE_QUERY), conn))
+    # Dipakai ranking cache sebagai data version jalur in-memory
+    df.attrs["loaded_at"] = time.time()
+    return df
+
+
+def iter_candidate_features(conn, chunksize=20000):
+    """Stream feature matrix per chunk (server-side cursor) untuk memory terbatas"""
+    streaming = conn.execution_options(stream_results=True)
+    for chunk in pd.read_sql(text(FEATURE_QUERY), streaming, chunksize=chunksize):
+        yield prepare_features(chunk)
+
+
+@st.cache_resource(ttl=600, show_spinner=False)
+def get_candidate_features():
+    """Feature matrix di-cache per proses, supaya ganti benchmark tidak perlu query ulang"""
+    # Import lokal: engine scoring tetap bisa dipakai offline tanpa .env Supabase
+    from config import get_db_engine, SNAPSHOT_FEATURES
+    if SNAPSHOT_FEATURES:
+        # Dari snapshot lokal (memory-mapped), tanpa query ke database
+        from snapshot import load_snapshot_features
+        return load_snapshot_features()
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        return load_candidate_features(conn)
+
+
+def _numeric_sum(values, weights):
+    """(SUM(value * weight), SUM(weight)) NUMERIC eksak dari baris yang value-nya tidak NULL.
+
+    Dijumlahkan per nilai unik (skor psikometri / PAPI hanya punya sedikit nilai berbeda).
+    """
+    present = ~np.isnan(values)
+    totals = pd.Series(weights[present]).groupby(values[present]).sum()
+    with localcontext(_NUMERIC):
+        total = sum((_dec(v) * int(w) for v, w in totals.items()), _ZERO)
+    return total, int(weights[present].sum())
+
+
+def compute_baseline(features, benchmark_ids):
+    """Setara CTE `selected_benchmarks`, `benchmark_stats` & `benchmark_top_strengths`.
+
+    Nilai baseline NUMERIC persis seperti Postgres ada di `baseline["exact"]`
+    (Decimal, None = NULL); key lain float untuk scoring vektor.
+    """
+    ids = set(benchmark_ids)
+    bench = features[features["employee_id"].isin(ids) & features["has_performance"]]
+
+    # benchmark_stats meng-INNER JOIN profiles_psych & papi_scores, jadi tiap
+    # benchmark muncul sekali per baris PAPI -> AVG(iq) berbobot jumlah baris PAPI.
+    joined = bench[bench["has_psych"] & (bench["papi_rows"] > 0)]
+    rows = joined["papi_rows"].to_numpy(dtype=np.int64)
+
+    exact = {}
+    for col in ["iq", "pauli"] + [f"papi_{s}" for s in PAPI_SCALES]:
+        # SUM(iq * papi_rows) / SUM(papi_rows); AVG(papi_x) = SUM / COUNT
+        weights = rows if col in ("iq", "pauli") else np.ones(len(joined), dtype=np.int64)
+        total, count = _numeric_sum(joined[col].to_numpy(dtype=float), weights)
+        exact[f"base_{col}"] = numeric_div(total, Decimal(count)) if count > 0 else None
+
+    baseline = {key: float(value) if value is not None else np.nan for key, value in exact.items()}
+    baseline["exact"] = exact
+    # Top-5 themes paling sering dari bitmask; tie-break by bit (sama dengan SQL)
+    baseline["base_mask"] = top_theme_mask(bench["top5_mask"].to_numpy(dtype=np.int64))
+    return baseline
+
+
+def _ratio_match(values, base, penalty):
+    """CASE WHEN c >= base THEN 100 ELSE GREATEST(0, 100 - (base - c)/NULLIF(base,0)*100*penalty) END"""
+    base = np.asarray(base, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        base_safe = np.where(base == 0, np.nan, base)
+        below = 100 - ((base - values) / base_safe) * 100 * penalty
+        scores = np.where(values >= base, 100.0, np.maximum(0, below))
+    # GREATEST(0, NULL) = 0 di Postgres
+    return np.nan_to_num(scores, nan=0.0)
+
+
+def match_score_arrays(cand, baseline):
+    """m_* per variabel sebagai dict array.
+
+    `baseline` berisi scalar -> array (n,); berisi array (V,) untuk V baseline
+    sekaligus (batch scoring) -> array (n, V) lewat broadcasting.
+    """
+    multi = np.ndim(baseline["base_iq"]) > 0
+
+    def column(name, dtype=float):
+        values = cand[name].to_numpy(dtype=dtype)
+        return values[:, None] if multi else values
+
+    m = {
+        "m_iq": _ratio_match(column("iq"), baseline["base_iq"], IQ_PENALTY),
+        "m_pauli": _ratio_match(column("pauli"), baseline["base_pauli"], PAULI_PENALTY),
+    }
+    for s in PAPI_SCALES:
+        values = np.nan_to_num(column(f"papi_{s}"), nan=0.0)
+        with np.errstate(invalid="ignore"):
+            score = np.maximum(0, 100 - np.abs(values - np.asarray(baseline[f"base_papi_{s}"], dtype=float)) * PAPI_PENALTY)
+        m[f"m_papi_{s}"] = np.nan_to_num(score, nan=0.0)
+
+    base_mask = np.asarray(baseline["base_mask"], dtype=np.int64)
+    overlap = popcount(column("top5_mask", np.int64) & base_mask)
+    m["m_strengths_overlap"] = overlap / 5.0 * 100
+    return m
+
+
+def compute_match_scores(features, baseline, exclude_ids=()):
+    """Setara CTE `tv_scores`: satu kolom m_* per variabel per kandidat"""
+    cand = features[~features["employee_id"].isin(set(exclude_ids))]
+    scores = pd.DataFrame({"employee_id": cand["employee_id"].to_numpy()})
+    for col, values in match_score_arrays(cand, baseline).items():
+        scores[col] = values
+    return scores
+
+
+def compute_tgv(scores):
+    """Setara CTE `tgv_scores`; TGV group ada di axis terakhir"""
+    m = {col: np.asarray(scores[col], dtype=float) for col in scores if col.startswith("m_")}
+    return np.stack([
+        (m["m_iq"] + m["m_papi_i"] + m["m_strengths_overlap"]) / 3.0,
+        (m["m_pauli"] + m["m_papi_n"] + m["m_papi_a"]) / 3.0,
+        (m["m_papi_l"] + m["m_strengths_overlap"]) / 2.0,
+        m["m_papi_z"],
+        m["m_papi_c"],
+    ], axis=-1)
+
+
+# Input m_* tiap TGV group (cognitive & leadership + m_strengths_overlap)
+_GROUP_INPUTS = [["iq", "papi_i"], ["pauli", "papi_n", "papi_a"], ["papi_l"], ["papi_z"], ["papi_c"]]
+
+
+class ExactTGV:
+    """TGV kandidat dengan aritmetika NUMERIC Postgres (Decimal), dihitung per baris saat diminta.
+
+    `cand` = feature row (top5_mask) atau score frame (m_strengths_overlap), posisi
+    baris sama dengan array TGV float-nya; `baseline` = baseline scalar yang
+    membawa `baseline["exact"]` (compute_baseline / get_match_scores). Nilai
+    input hanya sedikit yang berbeda, jadi m_* & TGV di-memo per nilai input.
+    """
+
+    def __init__(self, cand, baseline):
+        self.base = baseline["exact"]
+        self.inputs = {col: cand[col].to_numpy() for col in ["iq", "pauli"] + [f"papi_{s}" for s in PAPI_SCALES if s != "p"]}
+        if "top5_mask" in cand:
+            self.overlap = popcount(cand["top5_mask"].to_numpy(dtype=np.int64) & np.int64(baseline["base_mask"]))
+        else:
+            # m_strengths_overlap = jumlah theme sama / 5.0 * 100
+            self.overlap = np.rint(cand["m_strengths_overlap"].to_numpy(dtype=float) / 20).astype(np.int64)
+        self._rows = {}
+        self._memo = {}
+
+    def _cached(self, key, compute):
+        if key not in self._memo:
+            with localcontext(_NUMERIC):
+                self._memo[key] = compute()
+        return self._memo[key]
+
+    def _m(self, col, value):
+        """m_<col> untuk satu nilai input (None = NULL)"""
+        c = _dec(value)
+        if col in ("iq", "pauli"):
+            # CASE WHEN c >= base THEN 100 ELSE GREATEST(0, 100 - ((base - c) / NULLIF(base, 0)) * 100 [* 1.5]) END
+            base = self.base[f"base_{col}"]
+            if c is None or base is None or base == 0 and c < base:
+                return _ZERO
+            if c >= base:
+                return _HUNDRED
+            score = numeric_div(base - c, base) * 100
+            return _greatest_zero(100 - (score * Decimal("1.5") if col == "iq" else score))
+        # GREATEST(0, 100 - (ABS(COALESCE(c, 0) - base) * 11.1))
+        base = self.base[f"base_{col}"]
+        if base is None:
+            return _ZERO
+        return _greatest_zero(100 - abs((c if c is not None else _ZERO) - base) * Decimal("11.1"))
+
+    def _score(self, col, value):
+        return self._cached((col, self._key(value)), lambda: self._m(col, value))
+
+    def _overlap(self, k):
+        return self._cached(("overlap", k), lambda: numeric_div(Decimal(k), Decimal("5.0")) * 100)
+
+    def group(self, j, i):
+        """TGV group ke-j (urutan TGV_GROUPS) baris ke-i"""
+        cols = _GROUP_INPUTS[j]
+        values = [self.inputs[col][i] for col in cols]
+        k = int(self.overlap[i]) if j in (0, 2) else None
+        key = (j, k) + tuple(self._key(value) for value in values)
+        if j >= 3:
+            return self._score(cols[0], values[0])
+
+        def compute():
+            total = sum((self._score(col, value) for col, value in zip(cols, values)), _ZERO)
+            if k is not None:
+                total += self._overlap(k)
+            return numeric_div(total, Decimal("3.0") if j < 2 else Decimal("2.0"))
+        return self._cached(key, compute)
+
+    def rounded(self, j, rows, decimals):
+        """ROUND(tgv group j, decimals) untuk baris `rows`, dihitung sekali per kombinasi input"""
+        keys = [self.inputs[col][rows].astype(float) for col in _GROUP_INPUTS[j]]
+        if j in (0, 2):
+            keys.append(self.overlap[rows].astype(float))
+        _, first, inverse = np.unique(np.column_stack(keys), axis=0, return_index=True, return_inverse=True)
+        values = np.array([float(numeric_round(self.group(j, rows[f]), decimals)) for f in first])
+        return values[inverse.reshape(-1)]
+
+    def tgv(self, i):
+        """(cognitive, motivation, leadership, adaptability, reliability) baris ke-i"""
+        if i not in self._rows:
+            self._rows[i] = tuple(self.group(j, i) for j in range(len(TGV_GROUPS)))
+        return self._rows[i]
+
+    @staticmethod
+    def _key(value):
+        # NaN (NULL) -> None supaya bisa jadi key memo
+        return None if value is None or value != value else value
+
+    def rate(self, i, weights):
+        """ROUND(SUM(tgv * bobot), 2) baris ke-i"""
+        with localcontext(_NUMERIC):
+            total = sum((t * _dec(weights[g]) for t, g in zip(self.tgv(i), TGV_GROUPS)), _ZERO)
+        return numeric_round(total, 2)
+
+
+def final_match_rate(tgv, weights=None, exact=None):
+    """Weighted sum TGV -> final_match_rate (ROUND 2 seperti SQL).
+
+    exact: ExactTGV untuk baris yang sama; baris dekat batas pembulatan diambil dari sana.
+    """
+    weights = weights or TGV_WEIGHTS
+    raw = tgv @ np.array([weights[g] for g in TGV_GROUPS])
+    rates = _sql_round(raw, 2)
+    if exact is not None:
+        for i in np.flatnonzero(_near_half(raw, 2)):
+            rates[i] = float(exact.rate(i, weights))
+    return rates
+
+
+TOP_TGV_LABELS = ["Cognitive", "Motivation", "Leadership", "Adaptability/Reliability"]
+GAP_TGV_LABELS = ["Cognitive", "Motivation", "Leadership", "Adaptability", "Reliability"]
+
+
+def _top_and_gap(tgv):
+    """Replikasi urutan CASE top_tgv / gap_tgv (kategori pertama yang menang saat seri)"""
+    top_labels = np.array(TOP_TGV_LABELS, dtype=object)
+    gap_labels = np.array(GAP_TGV_LABELS, dtype=object)
+
+    is_max = tgv >= tgv.max(axis=1, keepdims=True)
+    top_idx = np.argmax(is_max[:, :3], axis=1)
+    top_idx = np.where(is_max[:, :3].any(axis=1), top_idx, 3)
+
+    is_min = tgv <= tgv.min(axis=1, keepdims=True)
+    gap_idx = np.argmax(is_min[:, :4], axis=1)
+    gap_idx = np.where(is_min[:, :4].any(axis=1), gap_idx, 4)
+    return top_labels[top_idx], gap_labels[gap_idx]
+
+
+def _exact_top_and_gap(row):
+    """_top_and_gap untuk satu baris TGV Decimal"""
+    top = next((TOP_TGV_LABELS[i] for i in range(3) if row[i] >= max(row)), TOP_TGV_LABELS[3])
+    gap = next((GAP_TGV_LABELS[i] for i in range(4) if row[i] <= min(row)), GAP_TGV_LABELS[4])
+    return top, gap
+
+
+def tgv_columns(tgv, exact=None):
+    """score_* (ROUND 1), top_tgv & gap_tgv; baris ambigu diambil dari ExactTGV (posisi sama)"""
+    scores = _sql_round(tgv, 1)
+    top_tgv, gap_tgv = _top_and_gap(tgv)
+    if exact is not None:
+        for j in range(len(TGV_GROUPS)):
+            rows = np.flatnonzero(_near_half(tgv[:, j], 1))
+            if len(rows):
+                scores[rows, j] = exact.rounded(j, rows, 1)
+        for i in np.flatnonzero(_near_tie(tgv)):
+            top_tgv[i], gap_tgv[i] = _exact_top_and_gap(exact.tgv(i))
+    return scores, top_tgv, gap_tgv
+
+
+def bench_columns(baseline):
+    """bench_iq / bench_pauli / bench_papi_n dibulatkan dari baseline NUMERIC"""
+    exact = baseline["exact"]
+    columns = {}
+    for col, key, decimals in [("bench_iq", "base_iq", 0), ("bench_pauli", "base_pauli", 0), ("bench_papi_n", "base_papi_n", 1)]:
+        columns[col] = float(numeric_round(exact[key], decimals)) if exact[key] is not None else np.nan
+    return columns
+
+
+def build_result_frame(cand, tgv, baseline):
+    """Susun kolom output MATCHING_QUERY dari feature row kandidat + TGV-nya"""
+    cand = cand.reset_index(drop=True)
+    exact = ExactTGV(cand, baseline)
+    scores, top_tgv, gap_tgv = tgv_columns(tgv, exact)
+
+    df = pd.DataFrame({
+        "employee_id": cand["employee_id"],
+        "fullname": cand["fullname"],
+        "strengths_list": cand["top_3_strengths"].apply(", ".join),
+    })
+    for i, group in enumerate(TGV_GROUPS):
+        df[f"score_{group}"] = scores[:, i]
+    for col in ["iq", "pauli", "papi_n", "papi_a", "papi_l", "papi_i", "papi_z", "papi_c"]:
+        df[col] = cand[col]
+    for col, value in bench_columns(baseline).items():
+        df[col] = value
+    df["final_match_rate"] = final_match_rate(tgv, exact=exact)
+    df["top_tgv"] = top_tgv
+    df["gap_tgv"] = gap_tgv
+    for col in ["role", "division", "department", "directorate", "job_level"]:
+        df[col] = cand[col]
+    return df[RESULT_COLUMNS]
+
+
+def build_score_frame(cand, baseline):
+    """SCORE_FRAME_COLUMNS untuk kandidat (urutan baris dipertahankan)"""
+    cand = cand.reset_index(drop=True)
+    df = pd.DataFrame({
+        "employee_id": cand["employee_id"],
+        "fullname": cand["fullname"],
+        "strengths_list": cand["top_3_strengths"].apply(", ".join),
+    })
+    for col in ["iq", "pauli", "papi_n", "papi_a", "papi_l", "papi_i", "papi_z", "papi_c"]:
+        df[col] = cand[col]
+    for col, value in bench_columns(baseline).items():
+        df[col] = value
+    for col in ["role", "division", "department", "directorate", "job_level"]:
+        df[col] = cand[col]
+    for col, values in match_score_arrays(cand, baseline).items():
+        df[col] = values
+    df = df[SCORE_FRAME_COLUMNS]
+    # Baseline NUMERIC ikut di frame supaya rerank bisa membulatkan persis seperti SQL
+    df.attrs["baseline"] = baseline
+    return df
+
+
+def baseline_from_row(row):
+    """Baseline (format compute_baseline) dari satu baris BASELINE_SELECT (Decimal / None)"""
+    exact = {f"base_{col}": _dec(row[f"base_{col}"]) for col in ["iq", "pauli"] + [f"papi_{s}" for s in PAPI_SCALES]}
+    baseline = {key: float(value) if value is not None else np.nan for key, value in exact.items()}
+    baseline["exact"] = exact
+    baseline["base_mask"] = int(row["base_mask"] or 0)
+    return baseline
+
+
+def match_rate_histogram(rates, bins=15, counts=None):
+    """Histogram final_match_rate persis seperti TOP_K_SELECT (width_bucket di range min..max).
+
+    Dihitung dalam sen (integer) sehingga nilai tepat di batas bin masuk bin yang
+    sama dengan SQL; np.histogram bisa meleset satu bin karena edge float.
+    `counts`: jumlah kandidat per nilai `rates` (default 1 per nilai).
+    """
+    cents = np.rint(np.asarray(rates, dtype=float) * 100).astype(np.int64)
+    counts = np.ones(len(cents), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+    if len(cents) == 0:
+        return np.zeros(bins, dtype=int), np.linspace(0, 1, bins + 1)
+    lo, hi = int(cents.min()), int(cents.max())
+    if hi > lo:
+        buckets = np.minimum((cents - lo) * bins // (hi - lo), bins - 1)
+        edges = np.linspace(lo / 100, hi / 100, bins + 1)
+    else:
+        # Sama seperti np.histogram untuk data dengan satu nilai
+        buckets = np.full(len(cents), bins // 2)
+        edges = np.linspace(lo / 100 - 0.5, hi / 100 + 0.5, bins + 1)
+    return np.bincount(buckets, weights=counts, minlength=bins).astype(int), edges
+
+
+def normalize_weights(weights):
+    """Bobot TGV dinormalisasi agar jumlahnya 1 (semua nol / sama dengan default -> bobot default persis)"""
+    total = sum(max(float(weights.get(g, 0)), 0.0) for g in TGV_GROUPS)
+    if total <= 0:
+        return dict(TGV_WEIGHTS)
+    normalized = {g: max(float(weights.get(g, 0)), 0.0) / total for g in TGV_GROUPS}
+    if all(np.isclose(normalized[g], TGV_WEIGHTS[g], rtol=0, atol=1e-12) for g in TGV_GROUPS):
+        return dict(TGV_WEIGHTS)
+    return normalized
+
+
+def rerank(scores, weights=None, top_k=None, bins=15):
+    """Ranking ulang dari score frame dengan bobot TGV lain, tanpa query ulang.
+
+    `scores` = hasil build_score_frame / get_match_scores, diurutkan employee_id
+    (posisi baris = tie-break, sama seperti ORDER BY SQL). Semua langkah vektor:
+    TGV (n, 5) -> weighted sum -> lexsort; baris dekat batas pembulatan dihitung
+    ulang dari `scores.attrs["baseline"]` (ExactTGV), jadi dengan bobot default
+    hasilnya identik dengan MATCHING_QUERY. Histogram seluruh kandidat ada di
+    `df.attrs["histogram"]` seperti mode top-K.
+    """
+    baseline = scores.attrs.get("baseline")
+    tgv = compute_tgv(scores)
+    weights = normalize_weights(weights) if weights else TGV_WEIGHTS
+    exact = ExactTGV(scores, baseline) if baseline is not None else None
+    rates = final_match_rate(tgv, weights, exact)
+    order = np.lexsort((np.arange(len(rates)), -rates))
+    if top_k is not None:
+        order = order[:int(top_k)]
+
+    df = scores.iloc[order].reset_index(drop=True)
+    picked = tgv[order]
+    # ExactTGV kedua untuk baris terpilih saja (posisi baris = posisi di `picked`)
+    columns, top_tgv, gap_tgv = tgv_columns(picked, ExactTGV(df, baseline) if baseline is not None else None)
+    for i, group in enumerate(TGV_GROUPS):
+        df[f"score_{group}"] = columns[:, i]
+    df["final_match_rate"] = rates[order]
+    df["top_tgv"] = top_tgv
+    df["gap_tgv"] = gap_tgv
+
+    df = compact_frame(df[RESULT_COLUMNS])
+    df.attrs = {"histogram": match_rate_histogram(rates, bins), "total_candidates": len(rates)}
+    return df
+
+
+def rank_candidates(features, benchmark_ids):
+    """Hasil akhir dengan kolom & urutan yang sama seperti MATCHING_QUERY"""
+    baseline = compute_baseline(features, benchmark_ids)
+    cand = features[~features["employee_id"].isin(set(benchmark_ids))]
+    tgv = compute_tgv(match_score_arrays(cand, baseline))
+
+    df = build_result_frame(cand, tgv, baseline)
+    df = df.sort_values(["final_match_rate", "employee_id"], ascending=[False, True], kind="stable")
+    return df.reset_index(drop=True)
+
+
+def compare_rankings(df_a, df_b, atol=0.01):
+    """Parity check antara dua hasil ranking (mis. SQL vs in-memory).
+
+    Mengembalikan list pesan perbedaan; list kosong berarti identik dalam toleransi.
+    Urutan dibandingkan per skor karena kandidat dengan skor seri tidak punya urutan pasti di SQL.
+    """
+    problems = []
+    if set(df_a["employee_id"]) != set(df_b["employee_id"]):
+        problems.append("candidate sets differ")
+        return problems
+
+    a = df_a.set_index("employee_id")
+    b = df_b.set_index("employee_id").loc[a.index]
+    for col in ["final_match_rate"] + [f"score_{g}" for g in TGV_GROUPS]:
+        diff = np.abs(a[col].astype(float).to_numpy() - b[col].astype(float).to_numpy())
+        if np.nanmax(diff, initial=0) > atol:
+            problems.append(f"{col}: max abs diff {np.nanmax(diff):.4f}")
+    for col in ["top_tgv", "gap_tgv"]:
+        # astype(object): category dengan himpunan kategori berbeda tidak bisa dibandingkan langsung
+        mismatched = int((a[col].astype(object) != b[col].astype(object)).sum())
+        if mismatched:
+            problems.append(f"{col}: {mismatched} rows differ")
+
+    rates_a = df_a["final_match_rate"].astype(float).to_numpy()
+    rates_b = df_b["final_match_rate"].astype(float).to_numpy()
+    if len(rates_a) != len(rates_b) or np.nanmax(np.abs(rates_a - rates_b), initial=0) > atol:
+        problems.append("ranking order differs")
+    return problems
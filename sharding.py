@@ -0,0 +1,124 @@
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scoring import (
+    ExactTGV, build_result_frame, compact_frame, compute_baseline, compute_tgv, final_match_rate, match_rate_histogram,
+    match_score_arrays,
+)
+
+# --- SHARDED SCORING ---
+# Untuk organisasi ratusan ribu employee: kandidat dibagi ke N shard
+# (crc32(employee_id) mod N), tiap shard di-score di proses terpisah dengan
+# baseline yang dihitung SEKALI di parent, lalu hasilnya digabung:
+#   - top-K: k-way heap merge dari top-K tiap shard (urut rate DESC, employee_id)
+#   - histogram: final_match_rate dibulatkan 2 desimal (0..100), jadi tiap shard
+#     cukup mengirim jumlah kandidat per sen (10001 counter); histogram global
+#     dihitung dari counter gabungan dengan range min..max yang sama persis.
+# Hasilnya identik dengan rank_candidates / mode top-K satu proses.
+#
+# Worker adalah process pool spawn yang hidup selama proses (satu per jumlah
+# worker), bukan fork per panggilan: server Streamlit / API multithreaded, dan
+# fork dari proses multithreaded tidak aman. Frame tiap shard di-pickle ke
+# worker; yang dikirim balik hanya top-K + counter.
+
+RATE_CENTS = 100 * 100 + 1  # final_match_rate 0.00 .. 100.00
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def shard_of(employee_ids, shards):
+    """Nomor shard per employee; crc32 (bukan hash()) supaya stabil antar proses"""
+    return np.fromiter(
+        (zlib.crc32(str(e).encode("utf-8")) % shards for e in employee_ids),
+        dtype=np.int64, count=len(employee_ids),
+    )
+
+
+def score_shard(cand, baseline, top_k=None):
+    """Score satu shard -> (frame top-K urut seperti MATCHING_QUERY, jumlah kandidat per sen)"""
+    tgv = compute_tgv(match_score_arrays(cand, baseline))
+    rates = final_match_rate(tgv, exact=ExactTGV(cand, baseline))
+    counts = np.bincount(np.rint(rates * 100).astype(np.int64), minlength=RATE_CENTS)
+
+    # Frame hasil (string strengths, label TGV) hanya dibangun untuk kandidat
+    # yang bisa masuk top-K: rate >= rate ke-K (seri di batas ikut, dipotong setelah sort)
+    keep = np.arange(len(rates))
+    if top_k is not None and 0 < top_k < len(rates):
+        threshold = np.partition(rates, len(rates) - top_k)[len(rates) - top_k]
+        keep = np.flatnonzero(rates >= threshold)
+    df = build_result_frame(cand.iloc[keep], tgv[keep], baseline)
+    df = df.sort_values(["final_match_rate", "employee_id"], ascending=[False, True], kind="stable")
+    if top_k is not None:
+        df = df.head(int(top_k))
+    return df.reset_index(drop=True), counts
+
+
+def merge_top_k(frames, top_k=None):
+    """k-way heap merge frame per shard (masing-masing sudah urut) -> ranking global"""
+    keyed = [
+        zip(-f["final_match_rate"].to_numpy(dtype=float), f["employee_id"].to_numpy(), itertools.repeat(i), range(len(f)))
+        for i, f in enumerate(frames)
+    ]
+    picked = [(i, r) for _, _, i, r in itertools.islice(heapq.merge(*keyed), top_k)]
+
+    # Yang terpilih dari tiap shard selalu prefix frame shard tersebut
+    taken = [0] * len(frames)
+    for i, r in picked:
+        taken[i] = r + 1
+    offsets = np.concatenate([[0], np.cumsum(taken)[:-1]]).astype(int)
+    heads = pd.concat([f.head(n) for f, n in zip(frames, taken)], ignore_index=True)
+    return heads.iloc[[offsets[i] + r for i, r in picked]].reset_index(drop=True)
+
+
+def rate_histogram(counts, bins=15):
+    """match_rate_histogram(final_match_rate, bins) dari jumlah kandidat per sen"""
+    cents = np.flatnonzero(counts)
+    return match_rate_histogram(cents / 100.0, bins, counts=counts[cents])
+
+
+def shard_pool(workers):
+    """Process pool (spawn) bersama untuk `workers` proses; dibuat sekali per proses"""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return pool
+
+
+def rank_sharded(features, benchmark_ids, shards, top_k=None, workers=None, bins=15):
+    """Setara rank_candidates (+ histogram mode top-K), di-score per shard secara paralel.
+
+    workers: jumlah proses di shard_pool (default = jumlah CPU, maksimal `shards`);
+    1 = berurutan di proses ini. Histogram seluruh kandidat ada di `df.attrs["histogram"]` dan
+    jumlahnya di `df.attrs["total_candidates"]`.
+    """
+    shards = max(int(shards), 1)
+    # Baseline sekali untuk semua shard
+    baseline = compute_baseline(features, benchmark_ids)
+    assignment = shard_of(features["employee_id"], shards)
+    # Benchmark tidak ikut jadi kandidat
+    assignment[features["employee_id"].isin(set(benchmark_ids)).to_numpy()] = -1
+
+    workers = min(workers or os.cpu_count() or 1, shards)
+    frames = [features[assignment == s] for s in range(shards)]
+    if workers <= 1:
+        parts = [score_shard(frame, baseline, top_k) for frame in frames]
+    else:
+        pool = shard_pool(workers)
+        parts = list(pool.map(score_shard, frames, itertools.repeat(baseline), itertools.repeat(top_k)))
+
+    frames, counts = zip(*parts)
+    counts = np.sum(counts, axis=0)
+    df = compact_frame(merge_top_k(frames, top_k))
+    df.attrs["histogram"] = rate_histogram(counts, bins)
+    df.attrs["total_candidates"] = int(counts.sum())
+    return df
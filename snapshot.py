@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import time
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import create_engine, text
+from ingest import TABLE_SPECS
+from scoring import FEATURE_COLUMNS_SQL, prepare_features
+
+# --- LOCAL COLUMNAR SNAPSHOT ---
+# Salinan lokal tabel HR (+ feature matrix kandidat) sebagai file Arrow IPC
+# tanpa kompresi, jadi bisa dibuka memory-mapped (zero-copy): analisis
+# eksplorasi dan scoring berulang jalan dari disk lokal tanpa beban ke
+# Postgres, dan tetap jalan offline.
+#
+# Sync incremental per employee: server menghitung md5 semua baris milik
+# satu employee, hanya digest (~40 byte/employee) yang dikirim; employee yang
+# digest-nya berubah / baru diambil ulang barisnya, yang hilang dihapus.
+# Tabel dimensi (tanpa employee_id) kecil, cukup satu digest per tabel.
+# Semua tabel dibaca dalam satu transaksi REPEATABLE READ (snapshot konsisten).
+#
+#   python snapshot.py                 # sync ke SNAPSHOT_DIR (default ./snapshot)
+#   python snapshot.py --full          # ambil ulang semua
+#
+# File ditulis ke file sementara lalu os.replace, jadi pembaca yang sedang
+# memegang mmap file lama tidak terganggu.
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshot")
+DEFAULT_CHUNK_SIZE = 50_000
+ID_BATCH_SIZE = 10_000
+FORMAT_VERSION = 1
+
+# nama -> (select, kolom urutan/key, kolom grup sync incremental atau None = per tabel)
+SNAPSHOT_TABLES = {
+    table: (f"SELECT * FROM {table}", key, "employee_id" if "employee_id" in key else None)
+    for table, (key, _) in TABLE_SPECS.items()
+}
+# Feature matrix siap scoring (scoring.FEATURE_QUERY), lihat load_snapshot_features
+SNAPSHOT_TABLES["candidate_features"] = (FEATURE_COLUMNS_SQL, ["employee_id"], "employee_id")
+
+GROUP_DIGEST_SQL = """
+SELECT s.{group}::text as key, md5(string_agg(s::text, '|' ORDER BY {order})) as digest
+FROM ({select}) s
+GROUP BY 1
+"""
+
+TABLE_DIGEST_SQL = """
+SELECT md5(COALESCE(string_agg(s::text, '|' ORDER BY {order}), '')) as digest
+FROM ({select}) s
+"""
+
+ROWS_SQL = """
+SELECT * FROM ({select}) s
+{where}
+"""
+
+
+def _default_engine():
+    # Import lokal: snapshot yang sudah ada bisa dibaca tanpa .env Supabase
+    from config import get_db_engine
+    return get_db_engine()
+
+
+def _path(directory, name):
+    return os.path.join(directory or SNAPSHOT_DIR, f"{name}.arrow")
+
+
+def _digest_path(directory, name):
+    return os.path.join(directory or SNAPSHOT_DIR, f"{name}.digests.arrow")
+
+
+def _manifest_path(directory):
+    return os.path.join(directory or SNAPSHOT_DIR, "manifest.json")
+
+
+def _arrow_chunk(columns, rows):
+    """Baris hasil query -> pyarrow.Table (NUMERIC/Decimal -> float64, NULL tetap null)"""
+    data = {}
+    for name, values in zip(columns, zip(*rows)):
+        data[name] = pa.array([float(v) if isinstance(v, Decimal) else v for v in values])
+    return pa.table(data)
+
+
+def _fetch_table(conn, sql, params=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream hasil query (server-side cursor) per chunk ke satu pyarrow.Table"""
+    result = conn.execution_options(stream_results=True).execute(text(sql), params or {})
+    columns = list(result.keys())
+    parts = []
+    while True:
+        rows = result.fetchmany(chunk_size)
+        if not rows:
+            break
+        parts.append(_arrow_chunk(columns, rows))
+    if not parts:
+        return pa.table({name: pa.array([]) for name in columns})
+    # permissive: kolom yang NULL semua di satu chunk (tipe null) ikut tipe chunk lain
+    return pa.concat_tables(parts, promote_options="permissive")
+
+
+def _write(table, path):
+    """Tulis Arrow IPC file (tanpa kompresi -> bisa di-mmap) secara atomik"""
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def open_table(name, directory=None):
+    """Tabel snapshot sebagai pyarrow.Table yang memory-mapped (zero-copy, dibaca lazy oleh OS)"""
+    path = _path(directory, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No snapshot for '{name}' in {directory or SNAPSHOT_DIR}; run `python snapshot.py` first")
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def read_frame(name, columns=None, directory=None):
+    """Tabel snapshot sebagai DataFrame (hanya kolom yang diminta yang dikonversi)"""
+    table = open_table(name, directory)
+    if columns:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+def snapshot_info(directory=None):
+    """Isi manifest.json (waktu sync & statistik per tabel), None kalau belum ada snapshot"""
+    path = _manifest_path(directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _sorted(table, key):
+    return table.sort_by([(col, "ascending") for col in key])
+
+
+def _sync_grouped(conn, name, directory, full, chunk_size):
+    select, key, group = SNAPSHOT_TABLES[name]
+    order = ", ".join(f"s.{col}" for col in key)
+    remote = _fetch_table(conn, GROUP_DIGEST_SQL.format(select=select, group=group, order=order), chunk_size=chunk_size)
+    path, digest_path = _path(directory, name), _digest_path(directory, name)
+
+    if full or not (os.path.exists(path) and os.path.exists(digest_path)):
+        table = _sorted(_fetch_table(conn, ROWS_SQL.format(select=select, where=""), chunk_size=chunk_size), key)
+        _write(table, path)
+        _write(remote, digest_path)
+        return {"mode": "full", "rows": table.num_rows, "changed": remote.num_rows, "removed": 0}
+
+    local = open_table(f"{name}.digests", directory).to_pandas()
+    merged = remote.to_pandas().merge(local, on="key", how="outer", suffixes=("", "_local"), indicator=True)
+    changed = merged.loc[(merged["_merge"] != "right_only") & (merged["digest"] != merged["digest_local"]), "key"].tolist()
+    removed = merged.loc[merged["_merge"] == "right_only", "key"].tolist()
+    table = open_table(name, directory)
+    if not changed and not removed:
+        return {"mode": "unchanged", "rows": table.num_rows, "changed": 0, "removed": 0}
+
+    where = f"WHERE s.{group}::text = ANY(CAST(:ids AS text[]))"
+    fetched = [
+        _fetch_table(conn, ROWS_SQL.format(select=select, where=where), {"ids": changed[i:i + ID_BATCH_SIZE]}, chunk_size)
+        for i in range(0, len(changed), ID_BATCH_SIZE)
+    ]
+    stale = pc.is_in(pc.cast(table[group], pa.string()), value_set=pa.array(changed + removed, type=pa.string()))
+    kept = table.filter(pc.invert(stale))
+    table = _sorted(pa.concat_tables([kept] + fetched, promote_options="permissive"), key)
+    _write(table, path)
+    _write(remote, digest_path)
+    return {"mode": "incremental", "rows": table.num_rows, "changed": len(changed), "removed": len(removed)}
+
+
+def _sync_whole(conn, name, directory, full, previous, chunk_size):
+    select, key, _ = SNAPSHOT_TABLES[name]
+    order = ", ".join(f"s.{col}" for col in key)
+    digest = conn.execute(text(TABLE_DIGEST_SQL.format(select=select, order=order))).scalar()
+    path = _path(directory, name)
+    if not full and os.path.exists(path) and previous.get("digest") == digest:
+        return {"mode": "unchanged", "rows": previous.get("rows", 0), "digest": digest}
+    table = _sorted(_fetch_table(conn, ROWS_SQL.format(select=select, where=""), chunk_size=chunk_size), key)
+    _write(table, path)
+    return {"mode": "full", "rows": table.num_rows, "digest": digest}
+
+
+def sync_snapshot(engine=None, directory=None, tables=None, full=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Sync tabel ke snapshot lokal; mengembalikan manifest (statistik per tabel)"""
+    engine = engine or _default_engine()
+    directory = directory or SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    previous = (snapshot_info(directory) or {}).get("tables", {})
+    names = tables or list(SNAPSHOT_TABLES)
+
+    stats = {}
+    start = time.time()
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            for name in names:
+                if SNAPSHOT_TABLES[name][2]:
+                    stats[name] = _sync_grouped(conn, name, directory, full, chunk_size)
+                else:
+                    stats[name] = _sync_whole(conn, name, directory, full, previous.get(name, {}), chunk_size)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "synced_at": start,
+        "tables": {**previous, **stats},
+    }
+    tmp = _manifest_path(directory) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, _manifest_path(directory))
+    return manifest
+
+
+def load_snapshot_features(directory=None):
+    """Feature matrix kandidat dari snapshot (pengganti scoring.load_candidate_features, tanpa database)"""
+    df = prepare_features(read_frame("candidate_features", directory=directory))
+    # Data version untuk ranking cache jalur in-memory = waktu sync snapshot
+    df.attrs["loaded_at"] = (snapshot_info(directory) or {}).get("synced_at", time.time())
+    return df
+
+
+def fetch_all_data(directory=None):
+    """Frame yang sama dengan fetch_all_data() di data_transformation.ipynb, dibaca dari snapshot"""
+    employees = read_frame("employees", ["employee_id", "fullname", "years_of_service_months", "grade_id", "education_id"], directory)
+    grades = read_frame("dim_grades", directory=directory).rename(columns={"name": "grade_name"})
+    education = read_frame("dim_education", directory=directory).rename(columns={"name": "education_name"})
+    psych = read_frame("profiles_psych", ["employee_id", "iq", "pauli", "faxtor", "disc", "mbti"], directory)
+
+    df_main = (
+        read_frame("performance_yearly", ["employee_id", "year", "rating"], directory)
+        .rename(columns={"year": "rating_year"})
+        .merge(employees, on="employee_id", how="inner")
+        .merge(psych, on="employee_id", how="left")
+        .merge(grades, on="grade_id", how="left")
+        .merge(education, on="education_id", how="left")
+    )
+    df_main = df_main[[
+        "employee_id", "fullname", "years_of_service_months", "rating_year", "rating",
+        "iq", "pauli", "faxtor", "disc", "mbti", "grade_name", "education_name",
+    ]]
+
+    df_comp = (
+        read_frame("competencies_yearly", ["employee_id", "year", "pillar_code", "score"], directory)
+        .merge(read_frame("dim_competency_pillars", directory=directory), on="pillar_code", how="inner")
+        .rename(columns={"score": "competency_score"})
+    )[["employee_id", "year", "pillar_label", "competency_score"]]
+
+    df_papi = read_frame("papi_scores", ["employee_id", "scale_code", "score"], directory)
+    df_strength = read_frame("strengths", ["employee_id", "rank", "theme"], directory)
+    return df_main, df_comp, df_papi, df_strength
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync a local columnar snapshot of the HR tables")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="snapshot directory (default: $SNAPSHOT_DIR or ./snapshot)")
+    parser.add_argument("--database-url", help="source database (default: the app's Supabase connection)")
+    parser.add_argument("--tables", nargs="+", choices=list(SNAPSHOT_TABLES), help="only sync these tables")
+    parser.add_argument("--full", action="store_true", help="re-fetch everything instead of only changed employees")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url) if args.database_url else _default_engine()
+    start = time.perf_counter()
+    manifest = sync_snapshot(engine, args.dir, tables=args.tables, full=args.full, chunk_size=args.chunk_size)
+    for name in args.tables or SNAPSHOT_TABLES:
+        stats = manifest["tables"][name]
+        detail = f"  changed {stats['changed']:,}  removed {stats['removed']:,}" if "changed" in stats else ""
+        print(f"{name:<24} {stats['mode']:<12} {stats['rows']:>12,} rows{detail}")
+    print(f"✅ Snapshot synced to {args.dir}/ in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,280 @@
+import argparse
+import io
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+from feature_store import GALLUP_THEMES
+
+# --- SYNTHETIC HR DATASET ---
+# Seeded generator for every table the matcher reads, from 1k to 1M employees.
+# A latent "talent" factor drives ratings, psych scores, PAPI and strengths so
+# high performers really differ from the rest (otherwise every baseline looks
+# like the population mean and rankings are meaningless).
+#
+# Used by benchmark.py (scaling suite) and handy for local development:
+#   python synthetic.py --employees 10000 --database-url postgresql://...
+
+PAPI_CODES = ["G", "L", "I", "T", "V", "S", "R", "D", "C", "E", "N", "A", "P", "X", "B", "O", "Z", "K", "F", "W"]
+STRENGTH_RANKS = 14
+YEARS = [2021, 2022, 2023, 2024, 2025]
+MBTI_TYPES = ["INTJ", "INTP", "ENTJ", "ENTP", "INFJ", "INFP", "ENFJ", "ENFP",
+              "ISTJ", "ISFJ", "ESTJ", "ESFJ", "ISTP", "ISFP", "ESTP", "ESFP"]
+DISC_TYPES = ["D", "I", "S", "C", "DI", "IS", "SC", "CD"]
+
+# dim table -> (key column, names)
+DIMENSIONS = {
+    "dim_directorates": ("directorate_id", ["Technology", "Commercial", "Operations", "Finance", "People"]),
+    "dim_divisions": ("division_id", ["Data", "Product", "Sales", "Marketing", "Supply Chain", "Accounting", "HR Ops", "Engineering"]),
+    "dim_departments": ("department_id", [f"Department {i}" for i in range(1, 25)]),
+    "dim_positions": ("position_id", ["Data Analyst", "Data Engineer", "Product Manager", "Sales Executive",
+                                      "Marketing Specialist", "Supply Planner", "Accountant", "HR Generalist",
+                                      "Software Engineer", "Business Analyst"]),
+    "dim_grades": ("grade_id", ["I", "II", "III", "IV", "V", "VI"]),
+    "dim_education": ("education_id", ["High School", "Diploma", "Bachelor", "Master", "Doctorate"]),
+}
+COMPETENCY_PILLARS = [
+    ("FTC", "Forward Thinking & Clarity"), ("CEX", "Curiosity & Experimentation"),
+    ("CSI", "Commercial Savvy & Impact"), ("QDD", "Quality Delivery Discipline"),
+    ("STO", "Synergy & Team Orientation"), ("SEA", "Social Empathy & Awareness"),
+    ("VCU", "Value Creation for Users"), ("LIE", "Lead, Inspire & Empower"),
+    ("GDR", "Growth Drive & Resilience"), ("CPD", "Clarity of Purpose & Direction"),
+]
+
+# Themes that lean towards high performers (see the analysis notebook)
+HIGH_PERFORMER_THEMES = ["Learner", "Positivity", "Self-Assurance", "Strategic", "Futuristic"]
+
+# Tabel feature store / migration ikut di-DROP: bit dim_strength_themes tidak
+# pernah di-reclaim, jadi tema dari load sebelumnya tidak boleh menumpuk
+SYNTHETIC_SCHEMA_DDL = """
+DROP TABLE IF EXISTS competencies_yearly, strengths, papi_scores, profiles_psych,
+    performance_yearly, employees, dim_competency_pillars, dim_education, dim_grades,
+    dim_positions, dim_departments, dim_divisions, dim_directorates, schema_migrations,
+    employee_features, employee_features_dirty, dim_strength_themes, baseline_contributions,
+    cohort_baseline_agg, cohort_theme_counts, data_versions CASCADE;
+
+CREATE TABLE dim_directorates (directorate_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE dim_divisions (division_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE dim_departments (department_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE dim_positions (position_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE dim_grades (grade_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE dim_education (education_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE dim_competency_pillars (pillar_code TEXT PRIMARY KEY, pillar_label TEXT);
+
+CREATE TABLE employees (
+    employee_id TEXT PRIMARY KEY, fullname TEXT,
+    directorate_id INTEGER, division_id INTEGER, department_id INTEGER,
+    position_id INTEGER, grade_id INTEGER, education_id INTEGER,
+    years_of_service_months INTEGER
+);
+CREATE TABLE performance_yearly (employee_id TEXT, year INTEGER, rating INTEGER, PRIMARY KEY (employee_id, year));
+CREATE TABLE profiles_psych (
+    employee_id TEXT PRIMARY KEY, pauli NUMERIC, faxtor NUMERIC, disc TEXT, mbti TEXT, iq NUMERIC, gtq NUMERIC
+);
+CREATE TABLE papi_scores (employee_id TEXT, scale_code TEXT, score INTEGER, PRIMARY KEY (employee_id, scale_code));
+CREATE TABLE strengths (employee_id TEXT, rank INTEGER, theme TEXT, PRIMARY KEY (employee_id, rank));
+CREATE TABLE competencies_yearly (
+    employee_id TEXT, pillar_code TEXT, year INTEGER, score INTEGER, PRIMARY KEY (employee_id, pillar_code, year)
+);
+"""
+
+TABLE_ORDER = [
+    "dim_directorates", "dim_divisions", "dim_departments", "dim_positions", "dim_grades",
+    "dim_education", "dim_competency_pillars", "employees", "performance_yearly",
+    "profiles_psych", "papi_scores", "strengths", "competencies_yearly",
+]
+
+
+def generate_dataset(n_employees, seed=42, include_competencies=True, block_size=100_000):
+    """Generate semua tabel sebagai dict nama_tabel -> DataFrame (deterministik per seed)"""
+    rng = np.random.default_rng(seed)
+    tables = {}
+
+    for table, (key, names) in DIMENSIONS.items():
+        tables[table] = pd.DataFrame({key: np.arange(1, len(names) + 1), "name": names})
+    tables["dim_competency_pillars"] = pd.DataFrame(COMPETENCY_PILLARS, columns=["pillar_code", "pillar_label"])
+
+    idx = np.arange(n_employees)
+    employee_ids = np.array([f"EMP{100000 + i}" for i in idx], dtype=object)
+    talent = rng.standard_normal(n_employees)
+
+    employees = pd.DataFrame({
+        "employee_id": employee_ids,
+        "fullname": [f"Employee {100000 + i}" for i in idx],
+        "years_of_service_months": rng.integers(3, 240, n_employees),
+    })
+    for table, (key, names) in DIMENSIONS.items():
+        employees[key] = rng.integers(1, len(names) + 1, n_employees)
+    tables["employees"] = employees
+
+    # Rating 1..5; sekitar 10% baris rating 5
+    n_years = len(YEARS)
+    perf_emp = np.repeat(idx, n_years)
+    perf_year = np.tile(YEARS, n_employees)
+    raw = 3 + 0.9 * talent[perf_emp] + 0.7 * rng.standard_normal(len(perf_emp))
+    present = rng.random(len(perf_emp)) < 0.9
+    tables["performance_yearly"] = pd.DataFrame({
+        "employee_id": employee_ids[perf_emp[present]],
+        "year": perf_year[present],
+        "rating": np.clip(np.rint(raw[present]), 1, 5).astype(int),
+    })
+
+    has_psych = rng.random(n_employees) < 0.95
+    psych_idx = idx[has_psych]
+    t = talent[psych_idx]
+    tables["profiles_psych"] = pd.DataFrame({
+        "employee_id": employee_ids[psych_idx],
+        "pauli": np.clip(np.rint(50 + 4 * t + 10 * rng.standard_normal(len(t))), 10, 100),
+        "faxtor": np.clip(np.rint(50 + 8 * rng.standard_normal(len(t))), 10, 100),
+        "disc": rng.choice(DISC_TYPES, len(t)),
+        "mbti": rng.choice(MBTI_TYPES, len(t)),
+        "iq": np.clip(np.rint(105 + 3 * t + 10 * rng.standard_normal(len(t))), 70, 150),
+        "gtq": np.clip(np.rint(25 + 5 * rng.standard_normal(len(t))), 0, 50),
+    })
+
+    has_papi = rng.random(n_employees) < 0.92
+    papi_idx = idx[has_papi]
+    n_scales = len(PAPI_CODES)
+    papi_emp = np.repeat(papi_idx, n_scales)
+    scale = np.tile(np.arange(n_scales), len(papi_idx))
+    # Skala L & N sedikit lebih tinggi pada talent tinggi (lihat notebook)
+    lift = np.where(np.isin(scale, [PAPI_CODES.index("L"), PAPI_CODES.index("N")]), 1.2 * talent[papi_emp], 0)
+    tables["papi_scores"] = pd.DataFrame({
+        "employee_id": employee_ids[papi_emp],
+        "scale_code": np.array([f"Papi_{c}" for c in PAPI_CODES], dtype=object)[scale],
+        "score": np.clip(np.rint(5 + lift + 2 * rng.standard_normal(len(papi_emp))), 0, 9).astype(int),
+    })
+
+    # Strengths: sampling tanpa pengembalian via Gumbel top-k, dibias oleh talent
+    has_strengths = rng.random(n_employees) < 0.9
+    strength_idx = idx[has_strengths]
+    themes = np.array(GALLUP_THEMES, dtype=object)
+    bias_cols = np.array([GALLUP_THEMES.index(x) for x in HIGH_PERFORMER_THEMES])
+    blocks = []
+    for start in range(0, len(strength_idx), block_size):
+        block = strength_idx[start:start + block_size]
+        logits = rng.gumbel(size=(len(block), len(themes)))
+        logits[:, bias_cols] += 0.8 * talent[block, None]
+        top = np.argsort(-logits, axis=1)[:, :STRENGTH_RANKS]
+        blocks.append(pd.DataFrame({
+            "employee_id": np.repeat(employee_ids[block], STRENGTH_RANKS),
+            "rank": np.tile(np.arange(1, STRENGTH_RANKS + 1), len(block)),
+            "theme": themes[top.ravel()],
+        }))
+    tables["strengths"] = pd.concat(blocks, ignore_index=True) if blocks else pd.DataFrame(columns=["employee_id", "rank", "theme"])
+
+    if include_competencies:
+        perf = tables["performance_yearly"]
+        n_pillars = len(COMPETENCY_PILLARS)
+        comp_emp = np.repeat(perf["employee_id"].to_numpy(), n_pillars)
+        comp_year = np.repeat(perf["year"].to_numpy(), n_pillars)
+        comp_rating = np.repeat(perf["rating"].to_numpy(), n_pillars)
+        tables["competencies_yearly"] = pd.DataFrame({
+            "employee_id": comp_emp,
+            "pillar_code": np.tile([c for c, _ in COMPETENCY_PILLARS], len(perf)),
+            "year": comp_year,
+            "score": np.clip(np.rint(1 + 0.7 * comp_rating + 0.6 * rng.standard_normal(len(comp_emp))), 1, 5).astype(int),
+        })
+    return tables
+
+
+def features_from_tables(tables):
+    """Versi pandas dari FEATURE_SELECT (feature_store.py) + flag FEATURE_QUERY (scoring.py).
+
+    Hasilnya siap dipakai scoring.rank_candidates tanpa database sama sekali.
+    benchmark.py hanya memakainya di mode offline; dengan --database-url feature
+    matrix dibaca lewat FEATURE_QUERY dan versi ini dicek kolom per kolom terhadapnya.
+    """
+    employees = tables["employees"]
+    features = employees[["employee_id", "fullname"]].copy()
+
+    psych = tables["profiles_psych"][["employee_id", "iq", "pauli"]]
+    features = features.merge(psych, on="employee_id", how="left")
+    features["has_psych"] = features["employee_id"].isin(psych["employee_id"])
+
+    papi = tables["papi_scores"]
+    features = features.merge(papi.groupby("employee_id").size().rename("papi_rows"), on="employee_id", how="left")
+    pivot = papi.pivot_table(index="employee_id", columns="scale_code", values="score", aggfunc="max")
+    for code in ["N", "A", "L", "P", "I", "Z", "C"]:
+        col = f"Papi_{code}"
+        features = features.merge(
+            pivot[col].rename(f"papi_{code.lower()}") if col in pivot else pd.Series(dtype=float, name=f"papi_{code.lower()}"),
+            left_on="employee_id", right_index=True, how="left",
+        )
+
+    strengths = tables["strengths"].sort_values(["employee_id", "rank"])
+    top3 = strengths[strengths["rank"] <= 3].groupby("employee_id")["theme"].agg(list).rename("top_3_strengths")
+    bits = {theme: i for i, theme in enumerate(GALLUP_THEMES)}
+    top5 = strengths[strengths["rank"] <= 5]
+    masks = (np.int64(1) << top5["theme"].map(bits).to_numpy(dtype=np.int64))
+    # Tema per employee unik, jadi SUM dari bit = BIT_OR
+    top5_mask = pd.Series(masks, index=top5["employee_id"].to_numpy()).groupby(level=0).sum().rename("top5_mask")
+    features = features.merge(top3, left_on="employee_id", right_index=True, how="left")
+    features = features.merge(top5_mask, left_on="employee_id", right_index=True, how="left")
+
+    perf = tables["performance_yearly"]
+    features["has_performance"] = features["employee_id"].isin(perf["employee_id"])
+    features["is_high_performer"] = features["employee_id"].isin(perf.loc[perf["rating"] == 5, "employee_id"])
+
+    for table, column, key in [
+        ("dim_positions", "role", "position_id"), ("dim_divisions", "division", "division_id"),
+        ("dim_departments", "department", "department_id"), ("dim_directorates", "directorate", "directorate_id"),
+        ("dim_grades", "job_level", "grade_id"),
+    ]:
+        names = tables[table].set_index(key)["name"]
+        features[column] = employees[key].map(names).to_numpy()
+
+    # Kolom FK ikut dibawa (dipakai mode sharding / cohort per grade)
+    features["directorate_id"] = employees["directorate_id"].astype(str).to_numpy()
+    features["grade_id"] = employees["grade_id"].astype(str).to_numpy()
+    features["papi_rows"] = features["papi_rows"].fillna(0)
+    features["top_3_strengths"] = features["top_3_strengths"].apply(lambda v: v if isinstance(v, list) else [])
+    features["top5_mask"] = features["top5_mask"].fillna(0)
+    return features.sort_values("employee_id").reset_index(drop=True)
+
+
+def copy_frame(conn, table, df):
+    """Bulk load DataFrame ke tabel Postgres via COPY (jauh lebih cepat dari to_sql)"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def load_dataset(engine, tables):
+    """Buat ulang schema sintetis di database target lalu COPY semua tabel"""
+    with engine.begin() as conn:
+        conn.execute(text(SYNTHETIC_SCHEMA_DDL))
+        for table in TABLE_ORDER:
+            if table in tables:
+                copy_frame(conn, table, tables[table])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic HR dataset")
+    parser.add_argument("--employees", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="load into this (local/stand-in) Postgres; otherwise write CSVs")
+    parser.add_argument("--out-dir", default="synthetic_data", help="CSV directory when no database URL is given")
+    parser.add_argument("--no-competencies", action="store_true")
+    args = parser.parse_args()
+
+    data = generate_dataset(args.employees, seed=args.seed, include_competencies=not args.no_competencies)
+    if args.database_url:
+        from feature_store import ensure_feature_store, refresh_employee_features
+        from migrations import apply_migrations
+        target = create_engine(args.database_url)
+        load_dataset(target, data)
+        ensure_feature_store(target)
+        refresh_employee_features(target, full=True)
+        apply_migrations(target)
+        print(f"✅ Loaded {args.employees} synthetic employees into {target.url.render_as_string(hide_password=True)}")
+    else:
+        import os
+        os.makedirs(args.out_dir, exist_ok=True)
+        for name, frame in data.items():
+            frame.to_csv(os.path.join(args.out_dir, f"{name}.csv"), index=False)
+        print(f"✅ Wrote {len(data)} tables for {args.employees} employees to {args.out_dir}/")
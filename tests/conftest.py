@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+# Modul aplikasi ada di root repo (flat), bukan package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Test yang butuh Postgres lokal (database kosong; akan di-DROP & diisi data sintetis):
+#   TEST_DATABASE_URL=postgresql://localhost/talent_test python -m pytest tests
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    return TEST_DATABASE_URL
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import api
+import config
+from api import Limiter, SingleFlight, create_app
+
+
+def post_rankings(body):
+    """POST /v1/rankings ke app in-process -> (status, reason)"""
+    async def run():
+        async with TestClient(TestServer(create_app())) as client:
+            resp = await client.post("/v1/rankings", json=body)
+            return resp.status, resp.reason
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("body", [
+    {"benchmark_ids": ["E1"], "top_k": -3},
+    {"benchmark_ids": ["E1"], "top_k": 0},
+    {"benchmark_ids": ["E1"], "top_k": 2.5},
+    {"benchmark_ids": ["E1"], "top_k": "abc"},
+    {"benchmark_ids": ["E1"], "top_k": 10**9},
+    {"benchmark_ids": ["E1"], "weights": {"cognitive": "x"}},
+    {"benchmark_ids": ["E1"], "weights": {"cognitive": [1]}},
+    {"benchmark_ids": ["E1"], "weights": {"cognitive": -1}},
+    {"benchmark_ids": ["E1"], "weights": {"not_a_group": 1}},
+    {"benchmark_ids": ["E1"], "weights": [1, 2]},
+])
+def test_rankings_rejects_invalid_top_k_and_weights(body):
+    # Validasi terjadi sebelum query, jadi tidak butuh database
+    status, reason = post_rankings(body)
+    assert status == 400
+    assert reason
+
+
+def test_singleflight_coalesces_concurrent_identical_requests(monkeypatch):
+    pd = pytest.importorskip("pandas")
+    calls = []
+
+    def ranked_talent(ids, top_k=None, cohort=None, cohort_params=None):
+        calls.append(cohort)
+        time.sleep(0.2)
+        return pd.DataFrame({"employee_id": ["E2"], "final_match_rate": [90.0]}), False
+
+    monkeypatch.setattr(api, "get_ranked_talent", ranked_talent)
+
+    async def run():
+        app = create_app()
+        async with TestClient(TestServer(app)) as client:
+            responses = await asyncio.gather(*[
+                client.post("/v1/rankings", json={"benchmark_ids": ["E1"], "top_k": 5}) for _ in range(5)
+            ])
+            bodies = [await r.json() for r in responses]
+            return [r.status for r in responses], bodies, app["singleflight"].stats()
+
+    statuses, bodies, stats = asyncio.run(run())
+    assert statuses == [200] * 5
+    assert all(b["results"] == [{"employee_id": "E2", "final_match_rate": 90.0}] for b in bodies)
+    assert len(calls) == 1
+    assert stats == {"inflight": 0, "executed": 1, "coalesced": 4}
+
+
+def test_singleflight_runs_different_keys_separately():
+    async def run():
+        flight = SingleFlight()
+
+        async def value(v):
+            await asyncio.sleep(0.01)
+            return v
+
+        results = await asyncio.gather(flight.do("a", lambda: value(1)), flight.do("b", lambda: value(2)),
+                                       flight.do("a", lambda: value(3)))
+        return results, flight.stats()
+
+    results, stats = asyncio.run(run())
+    # Pemanggil ketiga menunggu eksekusi "a" yang sudah berjalan
+    assert results == [1, 2, 1]
+    assert stats == {"inflight": 0, "executed": 2, "coalesced": 1}
+
+
+def test_limiter_rejects_with_503_after_queue_timeout(monkeypatch):
+    monkeypatch.setattr(api, "API_QUEUE_TIMEOUT", 0.05)
+    release = threading.Event()
+
+    async def run():
+        limiter = Limiter("db", 1)
+        try:
+            busy = asyncio.ensure_future(limiter.run(release.wait, 5))
+            await asyncio.sleep(0.01)
+            with pytest.raises(web.HTTPServiceUnavailable):
+                await limiter.run(lambda: "late")
+            stats = limiter.stats()
+            release.set()
+            assert await busy
+            # Slot kembali setelah pekerjaan pertama selesai
+            assert await limiter.run(lambda: "ok") == "ok"
+            return stats, limiter.stats()
+        finally:
+            release.set()
+            limiter.shutdown()
+
+    during, after = asyncio.run(run())
+    assert during == {"limit": 1, "in_use": 1, "rejected": 1}
+    assert after == {"limit": 1, "in_use": 0, "rejected": 1}
+
+
+def test_readyz_without_database_config_is_unavailable(monkeypatch):
+    monkeypatch.setattr(config, "DB_URL", None)
+
+    async def run():
+        async with TestClient(TestServer(create_app())) as client:
+            resp = await client.get("/readyz")
+            return resp.status, await resp.json()
+
+    status, body = asyncio.run(run())
+    assert status == 503
+    assert body["status"] == "unavailable"
+    assert body["database"]["error"] == config.CONFIG_ERROR
@@ -0,0 +1,38 @@
+import time
+import pytest
+
+pytest.importorskip("streamlit")
+
+import config  # noqa: E402
+
+
+def wait_for_check(timeout=5):
+    deadline = time.monotonic() + timeout
+    while config.db_health()["status"] == "checking":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return config.db_health()
+
+
+def test_failed_health_check_is_retried_and_cleared(monkeypatch):
+    # Tanpa DB_URL get_db_engine() raise, jadi setiap cek gagal tanpa network
+    monkeypatch.setattr(config, "DB_URL", None)
+    monkeypatch.setattr(config, "_health", {"status": "unknown", "error": None, "checked_at": None})
+
+    config.start_health_check()
+    first = wait_for_check()
+    assert first["status"] == "error" and first["error"]
+
+    # Cek yang baru gagal tidak diulang setiap rerun
+    config.start_health_check()
+    assert config.db_health() == first
+
+    # Setelah DB_HEALTH_RETRY_SECONDS dicek ulang; error lama tetap ada selama cek berjalan
+    config._health["checked_at"] = time.time() - config.DB_HEALTH_RETRY_SECONDS - 1
+    config.start_health_check()
+    assert config.db_health()["error"]
+    assert wait_for_check()["checked_at"] > first["checked_at"]
+
+    # Koneksi yang berhasil (event checkout engine) menghapus error
+    config._mark_healthy()
+    assert config.db_health()["status"] == "ok" and config.db_health()["error"] is None
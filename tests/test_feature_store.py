@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from feature_store import ensure_feature_store, refresh_employee_features  # noqa: E402
+from synthetic import generate_dataset, load_dataset  # noqa: E402
+
+
+@pytest.fixture()
+def engine(database_url):
+    engine = create_engine(database_url)
+    load_dataset(engine, generate_dataset(200, seed=3, include_competencies=False))
+    ensure_feature_store(engine)
+    refresh_employee_features(engine, full=True)
+    yield engine
+    engine.dispose()
+
+
+def _mask_and_bit(conn, employee_id, theme):
+    mask = conn.execute(text("SELECT top5_mask FROM employee_features WHERE employee_id = :e"), {"e": employee_id}).scalar()
+    bit = conn.execute(text("SELECT bit FROM dim_strength_themes WHERE theme = :t"), {"t": theme}).scalar()
+    return mask, bit
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_refresh_seeds_new_strength_theme(engine, full):
+    # load_dataset membuat ulang dim_strength_themes, jadi tema ini tidak menumpuk antar run
+    theme = "Theme Under Test"
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE strengths SET theme = :t WHERE employee_id = 'EMP100007' AND rank = 1"), {"t": theme})
+    refresh_employee_features(engine, full=full)
+
+    with engine.connect() as conn:
+        mask, bit = _mask_and_bit(conn, "EMP100007", theme)
+        top3 = conn.execute(text("SELECT top_3_strengths FROM employee_features WHERE employee_id = 'EMP100007'")).scalar()
+    assert bit is not None
+    assert mask & (1 << bit)
+    assert bin(mask).count("1") == 5
+    assert top3[0] == theme
+
+
+def test_reload_resets_strength_themes(engine):
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE strengths SET theme = 'Theme Under Test' WHERE employee_id = 'EMP100007' AND rank = 1"))
+    refresh_employee_features(engine)
+    load_dataset(engine, generate_dataset(200, seed=3, include_competencies=False))
+    ensure_feature_store(engine)
+
+    with engine.connect() as conn:
+        themes = conn.execute(text("SELECT theme FROM dim_strength_themes")).scalars().all()
+        bits = conn.execute(text("SELECT MAX(bit) FROM dim_strength_themes")).scalar()
+    assert "Theme Under Test" not in themes
+    assert bits == len(themes) - 1
@@ -0,0 +1,196 @@
+import threading
+import time
+import pytest
+
+from insights import TokenBucket, call_with_retry, generate_shortlist_insights, is_retryable, shared_bucket
+
+
+class ResourceExhausted(Exception):
+    """Nama sama dengan google.api_core.exceptions.ResourceExhausted (429)"""
+
+
+def quota_exceeded(timeout):
+    raise ResourceExhausted("quota")
+
+
+def test_token_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=1000, capacity=3)
+    assert all(bucket.acquire() for _ in range(3))
+    start = time.monotonic()
+    assert bucket.acquire()
+    # Token ke-4 menunggu refill ~1 ms
+    assert time.monotonic() - start < 0.5
+
+
+def test_token_bucket_gives_up_at_deadline():
+    bucket = TokenBucket(rate=0.1, capacity=1)
+    assert bucket.acquire()
+    start = time.monotonic()
+    assert not bucket.acquire(deadline=start + 0.05)
+    # Tidak tidur 10 detik menunggu token yang tidak akan datang sebelum deadline
+    assert time.monotonic() - start < 0.5
+
+
+def test_is_retryable():
+    assert is_retryable(ResourceExhausted("429"))
+    assert is_retryable(TimeoutError())
+    assert is_retryable(type("HttpError", (Exception,), {"code": 503})())
+    assert not is_retryable(ValueError("bad prompt"))
+
+
+def test_call_with_retry_retries_transient_errors():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise ResourceExhausted("quota")
+        return "ok"
+
+    deadline = time.monotonic() + 5
+    assert call_with_retry(fn, deadline, retries=3, backoff=0.001) == "ok"
+    assert len(calls) == 3
+    # fn menerima sisa waktu sampai deadline sebagai timeout
+    assert all(0 < t <= 5 for t in calls)
+
+
+def test_call_with_retry_raises_fatal_errors_immediately():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        call_with_retry(fn, time.monotonic() + 5, retries=3, backoff=0.001)
+    assert len(calls) == 1
+
+
+def test_call_with_retry_gives_up_after_retries():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        quota_exceeded(timeout)
+
+    with pytest.raises(ResourceExhausted):
+        call_with_retry(fn, time.monotonic() + 5, retries=2, backoff=0.001)
+    assert len(calls) == 3
+
+
+def test_call_with_retry_respects_deadline():
+    with pytest.raises(TimeoutError):
+        call_with_retry(lambda timeout: "never", time.monotonic() - 1)
+
+    bucket = TokenBucket(rate=0.1, capacity=1)
+    bucket.acquire()
+    with pytest.raises(TimeoutError, match="Rate limit"):
+        call_with_retry(lambda timeout: "never", time.monotonic() + 0.05, bucket=bucket)
+
+    # Backoff yang melewati deadline tidak ditunggu: error terakhir langsung naik
+    start = time.monotonic()
+    with pytest.raises(ResourceExhausted):
+        call_with_retry(quota_exceeded, time.monotonic() + 0.05, retries=5, backoff=10, max_backoff=10)
+    assert time.monotonic() - start < 1
+
+
+def test_shortlist_insights_yield_in_completion_order():
+    release = threading.Event()
+
+    def generate(row, rank, timeout):
+        if row["rank"] == 1:
+            # Kandidat #1 baru selesai setelah #2 di-yield
+            assert release.wait(5)
+        return f"insight {row['rank']}"
+
+    rows = [{"rank": 1}, {"rank": 2}]
+    results = []
+    for index, text, ok in generate_shortlist_insights(rows, generate=generate, max_workers=2, rate_per_minute=6000):
+        results.append((index, text, ok))
+        release.set()
+    assert results == [(1, "insight 2", True), (0, "insight 1", True)]
+
+
+def test_shortlist_insights_report_failed_rows():
+    def generate(row, rank, timeout):
+        assert rank == row["rank"]
+        if row["rank"] == 2:
+            raise ValueError("blocked prompt")
+        return f"insight {row['rank']}"
+
+    rows = [{"rank": r} for r in (1, 2, 3)]
+    results = {index: (text, ok) for index, text, ok in
+               generate_shortlist_insights(rows, generate=generate, rate_per_minute=6000, burst=3)}
+    assert results == {
+        0: ("insight 1", True),
+        1: ("⚠️ Analysis Error: blocked prompt", False),
+        2: ("insight 3", True),
+    }
+
+
+def test_shortlist_insights_skip_rows_after_cancel():
+    cancel = threading.Event()
+    cancel.set()
+    results = list(generate_shortlist_insights([{"rank": 1}], generate=lambda row, rank, timeout: "x", cancel=cancel))
+    assert results == [(0, "⚠️ Analysis Error: Analysis cancelled", False)]
+
+
+def test_shortlist_insights_with_fake_model():
+    pytest.importorskip("google.generativeai")
+    pytest.importorskip("streamlit")
+
+    class Reply:
+        text = "fake insight"
+
+    class FakeModel:
+        def generate_content(self, final_prompt, request_options=None):
+            assert "Ada" in final_prompt
+            return Reply()
+
+    row = {"fullname": "Ada", "final_match_rate": 91.5, "strengths_list": "Achiever",
+           "score_cognitive": 80.0, "score_motivation": 70.0, "score_leadership": 60.0}
+    assert list(generate_shortlist_insights([row], model=FakeModel())) == [(0, "fake insight", True)]
+
+
+def test_shortlist_insights_prompt_is_rank_aware():
+    pytest.importorskip("google.generativeai")
+    pytest.importorskip("streamlit")
+    prompts = []
+
+    class Reply:
+        text = "fake insight"
+
+    class FakeModel:
+        def generate_content(self, final_prompt, request_options=None):
+            prompts.append(final_prompt)
+            return Reply()
+
+    rows = [{"fullname": name, "final_match_rate": rate, "strengths_list": "Achiever",
+             "score_cognitive": 80.0, "score_motivation": 70.0, "score_leadership": 60.0}
+            for name, rate in (("Bo", 88.25), ("Cy", 85.0))]
+    results = list(generate_shortlist_insights(rows, model=FakeModel(), first_rank=2, top_match_rate=91.5))
+    assert sorted(ok for _, _, ok in results) == [True, True]
+
+    by_name = {p.split("**")[1]: p for p in prompts}
+    # #2 dst bukan "top-ranked": rank + selisih ke #1
+    assert "ranked #2" in by_name["Bo"] and "3.25 points behind the #1 candidate at 91.5%" in by_name["Bo"]
+    assert "ranked #3" in by_name["Cy"] and "6.5 points behind" in by_name["Cy"]
+    assert not any("top-ranked candidate (" in p or "Why Top Rank" in p for p in prompts)
+
+    with pytest.raises(ValueError):
+        list(generate_shortlist_insights(rows, model=FakeModel(), first_rank=2))
+
+
+def test_shortlist_insights_share_one_rate_budget():
+    # Rate unik untuk test ini: bucket proses dipakai bersama per (rate, burst)
+    rate_per_minute, burst = 0.123, 2
+    assert shared_bucket(rate_per_minute, burst) is shared_bucket(rate_per_minute, burst)
+
+    def run(rows):
+        return sorted(ok for _, _, ok in generate_shortlist_insights(
+            rows, generate=lambda row, rank, timeout: "x",
+            rate_per_minute=rate_per_minute, burst=burst, timeout=0.2))
+
+    # Panggilan pertama menghabiskan burst; panggilan kedua (sesi lain) tidak dapat burst baru
+    assert run([{}, {}]) == [True, True]
+    assert run([{}]) == [False]
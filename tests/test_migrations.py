@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from feature_store import ensure_feature_store, refresh_employee_features  # noqa: E402
+from migrations import apply_migrations, check_plan, run_plan_checks  # noqa: E402
+from synthetic import generate_dataset, load_dataset  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def engine(database_url):
+    engine = create_engine(database_url)
+    load_dataset(engine, generate_dataset(1000, seed=5, include_competencies=False))
+    ensure_feature_store(engine)
+    refresh_employee_features(engine, full=True)
+    apply_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+def _versions(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text("SELECT source, version FROM data_versions")).fetchall())
+
+
+def test_data_version_bumps_only_on_real_changes(engine):
+    before = _versions(engine)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE performance_yearly SET rating = 5 WHERE false"))
+    assert _versions(engine) == before
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE performance_yearly SET rating = 5 WHERE employee_id = 'EMP100004'"))
+        conn.execute(text("UPDATE profiles_psych SET iq = iq + 1 WHERE employee_id = 'EMP100004'"))
+    after = _versions(engine)
+    assert after["performance_yearly"] == before["performance_yearly"] + 1
+
+    # Refresh employee dirty -> employee_features berubah; refresh kedua tanpa antrian tidak
+    assert refresh_employee_features(engine) == 1
+    refreshed = _versions(engine)
+    assert refreshed["employee_features"] > after["employee_features"]
+    assert refresh_employee_features(engine) == 0
+    assert _versions(engine) == refreshed
+
+
+def test_refresh_budget_excludes_per_row_subplans():
+    # Bentuk plan refresh: subplan strengths dibebankan ke tiap baris sebelum GROUP BY
+    subplan = {"Node Type": "Index Only Scan", "Relation Name": "strengths", "Index Name": "idx",
+               "Total Cost": 4.4, "Parent Relationship": "SubPlan", "Subplan Name": "SubPlan 1"}
+    rows = {"Node Type": "Index Scan", "Relation Name": "employees", "Index Name": "employees_pkey",
+            "Total Cost": 400.0, "Parent Relationship": "Outer"}
+    plan = {"Node Type": "Aggregate", "Total Cost": 32000.0, "Plans": [rows, subplan]}
+
+    summary, problems = check_plan("refresh", {"Plan": plan}, max_cost=5000, max_subplan_cost=100)
+    assert problems == []
+    assert summary["budgeted_cost"] == 400.0
+    # Tanpa batas subplan: total cost yang dibatasi (perilaku query matching)
+    assert check_plan("refresh", {"Plan": plan}, max_cost=5000)[1] == ["refresh: planner cost 32000 exceeds 5000"]
+
+    slow = {**subplan, "Node Type": "Seq Scan", "Total Cost": 5000.0}
+    _, problems = check_plan("refresh", {"Plan": {**plan, "Plans": [rows, slow]}}, ["strengths"], 5000, 100)
+    assert problems == ["refresh: Seq Scan on strengths", "refresh: SubPlan 1 cost 5000 exceeds 100"]
+
+
+def test_plan_checks_pass_on_synthetic_data(engine):
+    report, problems, _ = run_plan_checks(engine)
+    assert problems == []
+    assert set(report) == {"matching_default_aggregated", "matching_default_scan", "matching_custom", "feature_refresh"}
@@ -0,0 +1,60 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+
+from neighbors import ProfileIndex  # noqa: E402
+from scoring import compare_rankings, rank_candidates, rerank, build_score_frame, compute_baseline  # noqa: E402
+from synthetic import features_from_tables, generate_dataset  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def features():
+    return features_from_tables(generate_dataset(20000, seed=3, include_competencies=False))
+
+
+def _benchmarks(features):
+    hp = features.loc[features["is_high_performer"], "employee_id"].tolist()
+    rng = np.random.default_rng(0)
+    return [hp] + [list(rng.choice(hp, size=3, replace=False)) for _ in range(3)]
+
+
+def test_top_k_matches_exhaustive_ranking_and_prunes(features):
+    index = ProfileIndex(features)
+    for ids in _benchmarks(features):
+        top = index.top_k(ids, 10)
+        assert compare_rankings(top, rank_candidates(features, ids).head(10)) == []
+        assert top["employee_id"].tolist() == rank_candidates(features, ids).head(10)["employee_id"].tolist()
+        # Sub-linear: sebagian besar kandidat tidak pernah di-score
+        assert index.last_query["points_scored"] < 0.5 * index.last_query["points_total"]
+
+
+def test_top_k_with_custom_weights_matches_rerank(features):
+    index = ProfileIndex(features)
+    weights = {"cognitive": 10, "motivation": 10, "leadership": 50, "adaptability": 20, "reliability": 10}
+    for ids in _benchmarks(features)[1:]:
+        cand = features[~features["employee_id"].isin(ids)]
+        expected = rerank(build_score_frame(cand, compute_baseline(features, ids)), weights, top_k=10)
+        top = index.top_k(ids, 10, weights=weights)
+        assert top["employee_id"].tolist() == expected["employee_id"].tolist()
+        np.testing.assert_array_equal(top["final_match_rate"].to_numpy(dtype=float),
+                                      expected["final_match_rate"].to_numpy(dtype=float))
+
+
+def test_incremental_updates_match_rebuilt_index(features):
+    index = ProfileIndex(features, rebuild_ratio=1.0)
+    ids = _benchmarks(features)[1]
+    changed = features.sample(200, random_state=1).copy()
+    changed["top5_mask"] = np.int64(features.loc[features["employee_id"] == ids[0], "top5_mask"].iloc[0])
+    gone = features["employee_id"].sample(100, random_state=2).tolist()
+    gone = [emp for emp in gone if emp not in ids and emp not in set(changed["employee_id"])]
+
+    index.upsert(changed)
+    index.remove(gone)
+    assert index.delta  # belum rebuild: delta buffer + tombstone ikut dicari
+    updated = features.set_index("employee_id")
+    updated.update(changed.set_index("employee_id"))
+    updated = updated.drop(index=gone).reset_index()
+    updated["top5_mask"] = updated["top5_mask"].astype(np.int64)
+    assert compare_rankings(index.top_k(ids, 10), rank_candidates(updated, ids).head(10)) == []
@@ -0,0 +1,120 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("google.generativeai")
+pytest.importorskip("streamlit")
+
+import prompt
+from cache import PersistentResponseCache
+
+PROMPT = "### Context\n- **Role**: Data Analyst"
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Fake client: `generate_content` mengembalikan jawaban tetap dan mencatat panggilan"""
+
+    def __init__(self, answer, model_name=None, chunks=None):
+        self.answer = answer
+        self.chunks = chunks or [answer]
+        self.calls = []
+        if model_name is not None:
+            self.model_name = model_name
+
+    def generate_content(self, final_prompt, stream=False, request_options=None):
+        self.calls.append({"prompt": final_prompt, "stream": stream, "request_options": request_options})
+        if stream:
+            return [Reply(chunk) for chunk in self.chunks]
+        return Reply(self.answer)
+
+
+class FailingModel:
+    def generate_content(self, final_prompt, stream=False, request_options=None):
+        raise RuntimeError("quota exceeded")
+
+
+@pytest.fixture(autouse=True)
+def response_cache(tmp_path, monkeypatch):
+    cache = PersistentResponseCache(str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(prompt, "response_cache", cache)
+    return cache
+
+
+def test_injected_client_without_model_name_bypasses_cache(response_cache):
+    first, second = FakeModel("fake answer"), FakeModel("other answer")
+    assert prompt._generate(PROMPT, first) == "fake answer"
+    assert prompt._generate(PROMPT, first) == "fake answer"
+    assert len(first.calls) == 2
+    assert prompt._generate(PROMPT, second) == "other answer"
+    # Jawaban fake tidak boleh tersimpan sebagai jawaban model default
+    assert response_cache.get(prompt._cache_key(prompt.MODEL_NAME, PROMPT)) is None
+    assert response_cache.stats()["disk_entries"] == 0
+
+
+def test_injected_client_with_model_name_is_cached_under_its_name(response_cache):
+    model = FakeModel("named answer", model_name="models/fake-model")
+    assert prompt._generate(PROMPT, model) == "named answer"
+    assert prompt._generate(PROMPT, model) == "named answer"
+    assert len(model.calls) == 1
+    assert response_cache.get(prompt._cache_key("fake-model", PROMPT)) == "named answer"
+    assert response_cache.get(prompt._cache_key(prompt.MODEL_NAME, PROMPT)) is None
+
+
+def test_generate_passes_timeout_as_request_option():
+    model = FakeModel("answer")
+    prompt._generate(PROMPT, model, timeout=5)
+    assert model.calls[0]["request_options"] == {"timeout": 5}
+
+
+def test_stream_contract_with_fake_client(response_cache):
+    model = FakeModel("", chunks=["Hello", "", " world"])
+    assert list(prompt._generate_stream(PROMPT, model, timeout=7)) == ["Hello", " world"]
+    assert model.calls[0]["stream"] is True
+    assert model.calls[0]["request_options"] == {"timeout": 7}
+    assert response_cache.stats()["disk_entries"] == 0
+
+
+def test_stream_caches_complete_named_response(response_cache):
+    model = FakeModel("", model_name="fake-model", chunks=["a", "b"])
+    assert list(prompt._generate_stream(PROMPT, model)) == ["a", "b"]
+    # Dari cache: satu potongan utuh, tanpa panggilan baru
+    assert list(prompt._generate_stream(PROMPT, model)) == ["ab"]
+    assert len(model.calls) == 1
+
+
+def test_stream_cancelled_response_is_not_cached(response_cache):
+    model = FakeModel("", model_name="fake-model", chunks=["a", "b"])
+    cancel = threading.Event()
+    stream = prompt._generate_stream(PROMPT, model, cancel=cancel)
+    assert next(stream) == "a"
+    cancel.set()
+    assert list(stream) == []
+    assert response_cache.get(prompt._cache_key("fake-model", PROMPT)) is None
+
+
+def test_stream_timeout_is_total_generation_time(response_cache):
+    class SlowModel(FakeModel):
+        def generate_content(self, final_prompt, stream=False, request_options=None):
+            self.calls.append({"request_options": request_options})
+            for chunk in self.chunks:
+                time.sleep(0.05)
+                yield Reply(chunk)
+
+    model = SlowModel("", model_name="fake-model", chunks=["a", "b", "c"])
+    stream = prompt._generate_stream(PROMPT, model, timeout=0.01)
+    with pytest.raises(TimeoutError):
+        list(stream)
+    assert response_cache.get(prompt._cache_key("fake-model", PROMPT)) is None
+
+
+def test_errors_are_reported_and_not_cached(response_cache):
+    row = {"fullname": "A", "final_match_rate": 90.0, "strengths_list": "Achiever",
+           "score_cognitive": 80.0, "score_motivation": 70.0, "score_leadership": 60.0}
+    assert prompt.generate_candidate_analysis(row, FailingModel()).startswith("⚠️ Analysis Error: quota exceeded")
+    assert "".join(prompt.stream_candidate_analysis(row, FailingModel())).endswith("⚠️ Analysis Error: quota exceeded")
+    assert response_cache.stats()["disk_entries"] == 0
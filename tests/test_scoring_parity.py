@@ -0,0 +1,284 @@
+from decimal import Decimal
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+
+from scoring import (  # noqa: E402
+    FLOAT32_COLUMNS, FLOAT64_COLUMNS, RESULT_COLUMNS, ExactTGV, TGV_GROUPS, TGV_WEIGHTS, build_score_frame,
+    compact_frame, compute_baseline, match_rate_histogram, numeric_div, numeric_round, rank_candidates, rerank,
+)
+from synthetic import features_from_tables, generate_dataset  # noqa: E402
+
+# Nilai referensi dari Postgres 16 (SELECT ...)
+NUMERIC_DIV_CASES = [
+    ("1", "3.0", "0.33333333333333333333"),
+    ("10", "4", "2.5000000000000000"),
+    ("266.7", "3.0", "88.9000000000000000"),
+    ("0", "5.0", "0.00000000000000000000"),
+    ("4", "5.0", "0.80000000000000000000"),
+    ("12345.678", "0.003", "4115226.000000000000"),
+    ("0.0001", "7", "0.000014285714285714285714"),
+    ("5.5", "92.5", "0.05945945945945945946"),
+]
+
+CUSTOM_ID_SETS = [
+    ["EMP100005", "EMP100017", "EMP100099"],
+    ["EMP100001", "EMP100002"],
+    ["EMP100042"],
+    ["EMP100003", "EMP100010", "EMP100020", "EMP100030", "EMP100040"],
+]
+
+
+@pytest.mark.parametrize("a, b, expected", NUMERIC_DIV_CASES)
+def test_numeric_div_matches_postgres_scale(a, b, expected):
+    result = numeric_div(Decimal(a), Decimal(b))
+    assert f"{result:f}" == expected
+
+
+def test_numeric_round_is_half_away_from_zero():
+    assert str(numeric_round(Decimal("2.345"), 2)) == "2.35"
+    assert str(numeric_round(Decimal("-2.345"), 2)) == "-2.35"
+    assert str(numeric_round(Decimal("13.3349999999999999999"), 2)) == "13.33"
+
+
+@pytest.fixture(scope="module")
+def tables():
+    return generate_dataset(1000, seed=7, include_competencies=False)
+
+
+@pytest.fixture(scope="module")
+def features(tables):
+    return features_from_tables(tables)
+
+
+def _cohorts(features):
+    hp = features.loc[features["is_high_performer"], "employee_id"].tolist()
+    return [hp] + CUSTOM_ID_SETS
+
+
+def _exact_ranking(features, benchmark_ids):
+    """Referensi: setiap baris dihitung penuh dengan Decimal (tanpa jalur float)"""
+    baseline = compute_baseline(features, benchmark_ids)
+    cand = features[~features["employee_id"].isin(set(benchmark_ids))].reset_index(drop=True)
+    exact = ExactTGV(cand, baseline)
+    rows = []
+    for i in range(len(cand)):
+        tgv = exact.tgv(i)
+        rows.append([cand["employee_id"][i], float(exact.rate(i, TGV_WEIGHTS))]
+                    + [float(numeric_round(t, 1)) for t in tgv])
+    df = pd.DataFrame(rows, columns=["employee_id", "final_match_rate"] + [f"score_{g}" for g in TGV_GROUPS])
+    return df.sort_values(["final_match_rate", "employee_id"], ascending=[False, True], kind="stable").reset_index(drop=True)
+
+
+def test_vectorized_ranking_equals_full_decimal_ranking(features):
+    for ids in _cohorts(features):
+        expected = _exact_ranking(features, ids)
+        actual = rank_candidates(features, ids)
+        assert actual["employee_id"].tolist() == expected["employee_id"].tolist()
+        for col in expected.columns[1:]:
+            np.testing.assert_array_equal(actual[col].to_numpy(dtype=float), expected[col].to_numpy(), err_msg=col)
+
+
+TEXT_COLUMNS = ["employee_id", "fullname", "strengths_list", "top_tgv", "gap_tgv",
+                "role", "division", "department", "directorate", "job_level"]
+
+
+def _assert_same_ranking(actual, expected):
+    assert actual["employee_id"].tolist() == expected["employee_id"].tolist()
+    for col in RESULT_COLUMNS:
+        if col in TEXT_COLUMNS:
+            assert actual[col].astype(object).tolist() == expected[col].astype(object).tolist(), col
+        else:
+            # Kolom float32 (compact_frame) dibandingkan dalam float32
+            dtype = actual[col].dtype if actual[col].dtype == np.float32 else float
+            np.testing.assert_array_equal(actual[col].to_numpy(dtype=dtype),
+                                          expected[col].to_numpy(dtype=float).astype(dtype), err_msg=col)
+
+
+def test_rerank_default_weights_equals_ranking(features):
+    for ids in _cohorts(features):
+        cand = features[~features["employee_id"].isin(ids)]
+        scores = compact_frame(build_score_frame(cand, compute_baseline(features, ids)))
+        expected = rank_candidates(features, ids)
+        _assert_same_ranking(rerank(scores), expected)
+        # Bobot default dari slider (persen) = bobot default persis
+        top = rerank(scores, {g: w * 100 for g, w in TGV_WEIGHTS.items()}, top_k=10, bins=15)
+        _assert_same_ranking(top, expected.head(10))
+        counts, edges = top.attrs["histogram"]
+        expected_counts, expected_edges = match_rate_histogram(expected["final_match_rate"], 15)
+        np.testing.assert_array_equal(counts, expected_counts)
+        np.testing.assert_array_equal(edges, expected_edges)
+
+
+def test_match_rate_histogram_uses_width_bucket_edges():
+    # 10.00 .. 40.00 dalam 3 bin: 20.00 & 30.00 tepat di batas -> bin atas (width_bucket)
+    counts, edges = match_rate_histogram(np.array([10.0, 19.99, 20.0, 30.0, 40.0]), 3)
+    assert counts.tolist() == [2, 1, 2]
+    np.testing.assert_allclose(edges, [10, 20, 30, 40])
+    counts, edges = match_rate_histogram(np.array([55.5, 55.5]), 3)
+    assert counts.tolist() == [0, 2, 0]
+
+
+def test_compact_frame_keeps_scoring_inputs_float64(features):
+    ids = CUSTOM_ID_SETS[0]
+    cand = features[~features["employee_id"].isin(ids)]
+    scores = build_score_frame(cand, compute_baseline(features, ids))
+    compact = compact_frame(scores)
+    ranking = compact_frame(rank_candidates(features, ids))
+    for df in (compact, ranking):
+        for col in df.columns.intersection(FLOAT64_COLUMNS):
+            assert df[col].dtype == np.float64, col
+        for col in df.columns.intersection(FLOAT32_COLUMNS):
+            assert df[col].dtype == np.float32, col
+    for col in compact.columns.intersection(FLOAT64_COLUMNS):
+        np.testing.assert_array_equal(compact[col].to_numpy(), scores[col].to_numpy(dtype=float), err_msg=col)
+
+
+# --- PARITY DENGAN POSTGRES (TEST_DATABASE_URL, lihat conftest.py) ---
+@pytest.fixture(scope="module")
+def database(database_url, tables):
+    from sqlalchemy import create_engine
+    from feature_store import ensure_feature_store, refresh_employee_features
+    from synthetic import load_dataset
+
+    engine = create_engine(database_url)
+    load_dataset(engine, tables)
+    ensure_feature_store(engine)
+    refresh_employee_features(engine, full=True)
+    yield engine
+    engine.dispose()
+
+
+SQL_COHORTS = [
+    ("high_performers", {}),
+    ("rating5_year", {"cohort_year": 2024}),
+    ("consistent_high_performers", {}),
+] + [("custom", {"benchmark_ids": ids}) for ids in CUSTOM_ID_SETS]
+
+
+@pytest.mark.parametrize("cohort, cohort_params", SQL_COHORTS)
+def test_memory_ranking_matches_postgres(database, cohort, cohort_params):
+    from sqlalchemy import text
+    from cohorts import resolve_cohort
+    from query import build_matching_query
+    from scoring import RESULT_COLUMNS, load_candidate_features
+
+    cohort_sql, params = resolve_cohort(cohort, cohort_params)
+    with database.connect() as conn:
+        sql = pd.read_sql(text(build_matching_query(cohort_sql)), conn, params=params)
+        ids = [row[0] for row in conn.execute(text(cohort_sql), params)]
+        features = load_candidate_features(conn)
+    memory = rank_candidates(features, ids)
+
+    assert memory["employee_id"].tolist() == sql["employee_id"].tolist()
+    for col in RESULT_COLUMNS:
+        if col in ("top_tgv", "gap_tgv", "fullname", "strengths_list", "role", "division", "department", "directorate", "job_level"):
+            assert memory[col].astype(object).tolist() == sql[col].astype(object).tolist(), col
+        elif col != "employee_id":
+            np.testing.assert_array_equal(memory[col].to_numpy(dtype=float), sql[col].to_numpy(dtype=float), err_msg=col)
+
+
+@pytest.mark.parametrize("cohort, cohort_params", SQL_COHORTS)
+def test_rerank_of_sql_score_frame_matches_postgres(database, monkeypatch, cohort, cohort_params):
+    """Satu query score frame + rerank = MATCHING_QUERY penuh dan TOP_K_QUERY (urutan, skor, histogram)"""
+    from sqlalchemy import text
+    import query
+    from cohorts import resolve_cohort
+
+    monkeypatch.setattr(query, "get_db_engine", lambda: database)
+    query.ranking_cache.clear()
+    ids = cohort_params.get("benchmark_ids", [])
+    cohort_arg = None if ids else cohort
+    params_arg = None if ids else cohort_params
+    scores, _ = query.get_match_scores(ids, scoring_engine="sql", cohort=cohort_arg, cohort_params=params_arg)
+    top, _ = query.get_ranked_talent(ids, scoring_engine="sql", top_k=10, cohort=cohort_arg, cohort_params=params_arg)
+
+    cohort_sql, params = resolve_cohort(cohort, cohort_params)
+    with database.connect() as conn:
+        full = pd.read_sql(text(query.build_matching_query(cohort_sql)), conn, params=params)
+
+    _assert_same_ranking(rerank(scores), full)
+    reranked = rerank(scores, top_k=10, bins=query.HISTOGRAM_BINS)
+    _assert_same_ranking(reranked, top)
+    for actual, expected in zip(reranked.attrs["histogram"], top.attrs["histogram"]):
+        np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.parametrize("top_k", [10, None])
+def test_sql_sharded_ranking_with_prepared_statements(database, monkeypatch, top_k):
+    """Shard lewat PREPARE/EXECUTE (DB_PREPARED_STATEMENTS) = query biasa = TOP_K_QUERY satu koneksi"""
+    import query
+    from cohorts import DEFAULT_COHORT
+
+    prepared = []
+    execute_prepared = query.execute_prepared
+
+    def spy(conn, sql, params):
+        prepared.append(params["shard"])
+        return execute_prepared(conn, sql, params)
+
+    monkeypatch.setattr(query, "execute_prepared", spy)
+    monkeypatch.setattr(query, "DB_PREPARED_STATEMENTS", True)
+    sharded, _ = query._get_ranked_talent_sql_sharded(database, DEFAULT_COHORT, None, top_k, shards=3)
+    assert sorted(prepared) == [0, 1, 2]
+
+    monkeypatch.setattr(query, "DB_PREPARED_STATEMENTS", False)
+    plain, _ = query._get_ranked_talent_sql_sharded(database, DEFAULT_COHORT, None, top_k, shards=3)
+    with database.connect() as conn:
+        single, _ = query._get_ranked_talent_sql(conn, DEFAULT_COHORT, None, top_k)
+
+    _assert_same_ranking(sharded, plain)
+    _assert_same_ranking(sharded, single)
+    if top_k is not None:
+        assert sharded.attrs["total_candidates"] == single.attrs["total_candidates"]
+
+
+def test_rank_sharded_process_pool_matches_single_shot(features):
+    from sharding import rank_sharded, shard_pool
+
+    hp = features.loc[features["is_high_performer"], "employee_id"].tolist()
+    expected = rank_candidates(features, hp).head(10)
+    for _ in range(2):
+        sharded = rank_sharded(features, hp, 4, top_k=10, workers=2)
+        _assert_same_ranking(sharded, expected)
+    # Pool spawn hidup selama proses, tidak dibuat (di-fork) per panggilan
+    assert shard_pool(2) is shard_pool(2)
+
+
+def test_concurrent_sharded_sql_rankings_do_not_starve_the_pool(database_url, database, monkeypatch):
+    """Probe versi dilepas sebelum shard jalan: `shards` request bersamaan cukup dengan pool `shards` koneksi"""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import create_engine
+    import query
+    from cohorts import DEFAULT_COHORT
+
+    shards = 3
+    engine = create_engine(database_url, pool_size=shards, max_overflow=0, pool_timeout=3)
+    # Semua request masuk jalur sharded bersamaan (kalau masih memegang koneksi, pool habis)
+    barrier = threading.Barrier(shards, timeout=10)
+    sharded_sql = query._get_ranked_talent_sql_sharded
+
+    def synchronized(*args, **kwargs):
+        barrier.wait()
+        return sharded_sql(*args, **kwargs)
+
+    monkeypatch.setattr(query, "get_db_engine", lambda: engine)
+    monkeypatch.setattr(query, "SCORING_SHARDS", shards)
+    monkeypatch.setattr(query, "_get_ranked_talent_sql_sharded", synchronized)
+    query.ranking_cache.clear()
+    try:
+        with ThreadPoolExecutor(max_workers=shards) as pool:
+            results = list(pool.map(
+                lambda _: query.get_ranked_talent([], scoring_engine="sql", top_k=10, cohort=DEFAULT_COHORT)[0],
+                range(shards),
+            ))
+        with database.connect() as conn:
+            single, _ = query._get_ranked_talent_sql(conn, DEFAULT_COHORT, None, 10)
+    finally:
+        query.ranking_cache.clear()
+        engine.dispose()
+    for sharded in results:
+        _assert_same_ranking(sharded, single)
@@ -0,0 +1,147 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# --- LATENCY INSTRUMENTATION ---
+# `span("name")` mengukur durasi satu tahap. Setiap span:
+#   - di-append ke buffer lalu ditulis sebagai JSON line ke TRACE_PATH
+#   - masuk histogram latency per nama span (format teks Prometheus)
+# Tag trace (mis. vacancy_id) dibawa lewat contextvars, jadi span di dalam
+# get_ranked_talent / Gemini ikut ter-tag tanpa mengoper parameter.
+# Overhead per span: dua perf_counter + satu lock, aman untuk produksi.
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") != "0"
+TRACE_PATH = os.getenv("TRACE_PATH", "traces.jsonl")
+METRICS_PATH = os.getenv("METRICS_PATH", "metrics.prom")
+FLUSH_EVERY = 256
+
+# Bucket histogram (detik), gaya Prometheus
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+_trace_tags = contextvars.ContextVar("trace_tags", default={})
+_lock = threading.Lock()
+_buffer = []
+_histograms = {}  # span name -> [bucket counts..., +Inf count], sum
+
+
+def current_tags():
+    return _trace_tags.get()
+
+
+@contextmanager
+def trace(**tags):
+    """Set tag trace (mis. vacancy_id) untuk semua span di dalam blok ini"""
+    token = _trace_tags.set({**_trace_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _trace_tags.reset(token)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit yang membawa tag trace ke worker thread"""
+    ctx = contextvars.copy_context()
+    return pool.submit(ctx.run, fn, *args, **kwargs)
+
+
+def _record(name, start_wall, duration, status, tags):
+    with _lock:
+        counts, total = _histograms.get(name, ([0] * (len(BUCKETS) + 1), 0.0))
+        counts[bisect_left(BUCKETS, duration)] += 1
+        _histograms[name] = (counts, total + duration)
+
+        _buffer.append({
+            "ts": round(start_wall, 6),
+            "span": name,
+            "duration_ms": round(duration * 1000, 3),
+            "status": status,
+            **tags,
+        })
+        should_flush = len(_buffer) >= FLUSH_EVERY
+    if should_flush:
+        flush()
+
+
+@contextmanager
+def span(name, **tags):
+    """Ukur durasi blok kode sebagai satu span"""
+    if not TRACE_ENABLED:
+        yield
+        return
+
+    start_wall = time.time()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _record(name, start_wall, time.perf_counter() - start, status, {**_trace_tags.get(), **tags})
+
+
+def observe(name, seconds, **tags):
+    """Catat durasi yang diukur sendiri (mis. time-to-first-token) sebagai span"""
+    if TRACE_ENABLED:
+        _record(name, time.time() - seconds, seconds, "ok", {**_trace_tags.get(), **tags})
+
+
+def traced(name):
+    """Decorator versi `span`; main.py juga memakainya untuk tahap pipeline di worker thread"""
+    def decorator(fn):
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        return wrapper
+    return decorator
+
+
+def flush(path=None):
+    """Tulis span yang masih di buffer ke file JSON lines"""
+    with _lock:
+        records, _buffer[:] = list(_buffer), []
+    if not records:
+        return 0
+    with open(path or TRACE_PATH, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(r, default=str) + "\n" for r in records))
+    return len(records)
+
+
+def prometheus_text():
+    """Snapshot histogram latency dalam format teks Prometheus"""
+    lines = [
+        "# HELP talent_span_duration_seconds Latency of instrumented analysis stages.",
+        "# TYPE talent_span_duration_seconds histogram",
+    ]
+    with _lock:
+        snapshot = {name: (list(counts), total) for name, (counts, total) in _histograms.items()}
+    for name in sorted(snapshot):
+        counts, total = snapshot[name]
+        cumulative = 0
+        for bound, count in zip(BUCKETS, counts):
+            cumulative += count
+            lines.append(f'talent_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'talent_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {cumulative}')
+        lines.append(f'talent_span_duration_seconds_sum{{span="{name}"}} {total:.6f}')
+        lines.append(f'talent_span_duration_seconds_count{{span="{name}"}} {cumulative}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_snapshot(path=None):
+    """Flush trace + tulis ulang snapshot Prometheus (atomic replace)"""
+    if not TRACE_ENABLED:
+        return
+    flush()
+    path = path or METRICS_PATH
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)